@@ -8,6 +8,7 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pydeck as pdk
 from datetime import datetime
 import plotly.express as px
@@ -29,6 +30,10 @@ from src.config.constants import (
     DEFAULT_SEISMIC_ZONE,
     SEISMIC_ZONE_COLORS,
     ABITAZIONI_COLUMNS,
+    MAP_RAW_POINTS_MAX,
+    NBO_ARTIFACT_DIR,
+    NBO_JSON_PATH,
+    ELIGIBILITY_EPOCH_SECONDS,
 )
 from src.data.db_utils import (
     fetch_abitazioni,
@@ -36,12 +41,36 @@ from src.data.db_utils import (
     check_client_interactions,
     is_client_eligible_for_top20,
     check_all_clients_interactions_batch,
+    eligibility_epoch,
+    get_supabase_client,
     insert_phone_call_interaction,
     insert_phone_call_interaction,
     get_client_detail,
     get_client_satellite
 )
+from src.data.analytics import (
+    SCATTER_COLUMNS as CLV_RISK_SAMPLE_COLUMNS,
+    fetch_analytics_summary,
+    fetch_city_options,
+    FILTER_COLUMNS,
+    compute_analytics_summary,
+    filter_frame,
+)
+from src.data.filter_index import FilterIndex, build_indexed_frame
 from src.utils.ui import helio_spinner
+from src.utils.risk_classification import (
+    classify,
+    MODE_COMPOSITE,
+    MODE_SEISMIC,
+    MODE_HYDRO,
+    MAP_MODES,
+    SEVERITY_PALETTES,
+)
+from src.utils.geo_grid import aggregate_grid, cell_radius_meters, choose_resolution
+from src.utils.map_payload import build_map_payload, record_deck_payload, tooltip_fields
+from src.nbo.engine import NBOEngine, recommendation_score
+from src.nbo.eligibility import EligibilityOverlay
+from src.nbo.artifact import load_artifact as load_nbo_artifact
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FUNZIONE COEFFICIENTI ATTUARIALI (simulati ma realistici)
@@ -1533,21 +1562,25 @@ st.markdown("""
 # DATA LOADING FROM SUPABASE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@st.cache_data(ttl=300)
+@st.cache_resource(ttl=300)
 def load_data():
     """
     Load real data from Supabase.
-    """
-    from db_utils import fetch_abitazioni, fetch_clienti
 
-    # Fetch data
+    The lite fetchers read the local Parquet snapshots (memory-mapped) and only
+    ask Supabase for rows changed since the last sync.
+
+    Returns an IndexedFrame (df, index, version): the filter index on
+    citta / risk_category / zona_sismica is built once per load. Cached as a
+    shared resource (no per-call copy), so the frame must not be mutated.
+    """
     # Fetch data - OPTIMIZED WITH LITE PARAMETER
     df_abitazioni = fetch_abitazioni(lite=True)
     df_clienti = fetch_clienti(lite=True)
 
     if df_abitazioni.empty:
         # If no data is found, return empty dataframe with expected columns to avoid crashes
-        return pd.DataFrame(columns=ABITAZIONI_COLUMNS)
+        return build_indexed_frame(pd.DataFrame(columns=ABITAZIONI_COLUMNS), FILTER_COLUMNS)
 
     # Merge data
     # We want details of the habitation, enriched with client info (CLV, churn)
@@ -1568,7 +1601,8 @@ def load_data():
         df = df_abitazioni.merge(df_clienti_subset, on='codice_cliente', how='left')
     else:
         # No client data available, use abitazioni only
-        df = df_abitazioni
+        # (copy: the fetched frame is shared across sessions by the data cache)
+        df = df_abitazioni.copy()
         df['clv'] = 0
         df['churn_probability'] = 0.0
 
@@ -1585,194 +1619,209 @@ def load_data():
     # Normalize City Names (Title Case)
     df['citta'] = df['citta'].astype(str).str.title()
 
-    return df
+    # Row labels == positions, so filtered rows can index per-row arrays
+    # (e.g. the cached map colours) directly
+    df.index = pd.RangeIndex(len(df))
+
+    return build_indexed_frame(df, FILTER_COLUMNS)
+
+
+def get_active_filters():
+    """Analytics filters from session state as (city, risk, zone); None = no filter."""
+    city = st.session_state.selected_city
+    risk = st.session_state.selected_risk
+    zone = st.session_state.selected_zone
+    return (
+        None if city == 'Tutte le città' else city,
+        None if risk == 'Tutti i rischi' else risk,
+        None if zone == 'Tutte le zone' else int(zone.split()[-1]),
+    )
 
 
 @st.cache_data(ttl=300)
-def _get_risk_stats_cached(risk_categories: tuple, risk_scores: tuple) -> dict:
-    """Calculate risk distribution statistics (cached with hashable args)."""
-    from collections import Counter
-    stats = Counter(risk_categories)
-    total = len(risk_categories)
-
-    if total > 0:
-        avg_score = sum(risk_scores) / total
-        avg_score = round(avg_score, 1) if avg_score == avg_score else 0  # NaN check
-        high_risk_pct = round((stats.get('Critico', 0) + stats.get('Alto', 0)) / total * 100, 1)
-    else:
-        avg_score = 0
-        high_risk_pct = 0
+def _local_analytics_summary(version, fingerprint, _data):
+    """Local aggregates, cached by (data version, filter fingerprint); _data is not hashed."""
+    filters = dict(fingerprint)
+    return compute_analytics_summary(
+        _data.df,
+        filters.get('citta'),
+        filters.get('risk_category'),
+        filters.get('zona_sismica'),
+        index=_data.index
+    )
 
-    return {
-        'critico': stats.get('Critico', 0),
-        'alto': stats.get('Alto', 0),
-        'medio': stats.get('Medio', 0),
-        'basso': stats.get('Basso', 0),
-        'total': total,
-        'avg_score': avg_score,
-        'high_risk_pct': high_risk_pct
-    }
+
+def get_analytics_summary(city, risk, zone):
+    """KPI and chart aggregates: server-side RPC, local computation as fallback."""
+    summary = fetch_analytics_summary(city, risk, zone)
+    if summary is None:
+        data = load_data()
+        fingerprint = FilterIndex.fingerprint(citta=city, risk_category=risk, zona_sismica=zone)
+        summary = _local_analytics_summary(data.version, fingerprint, data)
+    return summary
+
+
+def get_city_options():
+    """Sorted city names for the filter (RPC, or from the loaded data's index)."""
+    cities = fetch_city_options()
+    if cities is None:
+        cities = load_data().index.values('citta')
+    return cities
+
+
+def get_filtered_data(city, risk, zone):
+    """Row-level data for the map and the client list, with filters applied."""
+    with helio_spinner("Caricamento Ecosistema Helios..."):
+        data = load_data()
+    return filter_frame(data.df, city, risk, zone, index=data.index)
+
+
+@st.cache_resource(ttl=300)
+def _risk_classification(version, _df):
+    """Level/category codes of every map mode, computed once per data version."""
+    return classify(_df)
 
 
-def get_risk_stats(df):
-    """Calculate risk distribution statistics."""
-    return _get_risk_stats_cached(
-        tuple(df['risk_category'].tolist()),
-        tuple(df['risk_score'].tolist())
+@st.cache_resource(ttl=300)
+def get_map_colors(version, mode, _data):
+    """
+    uint8 RGBA colour per load_data() row for a map mode, cached by
+    (data version, mode). Index it with the row labels of a filtered frame.
+    """
+    return _risk_classification(version, _data.df).colors(mode)
+
+
+@st.cache_data(ttl=300)
+def get_map_grid(version, fingerprint, mode, weight_col, _data):
+    """
+    Grid cells of the filtered, geolocated rows for a map mode, cached by
+    (data version, filter fingerprint, mode). Returns (cells, cell size in degrees).
+    """
+    filters = dict(fingerprint)
+    positions = _data.index.select(**{col: filters.get(col) for col in FILTER_COLUMNS})
+    df = _data.df
+
+    lat = pd.to_numeric(df['latitudine'], errors='coerce').to_numpy(dtype=float)[positions]
+    lon = pd.to_numeric(df['longitudine'], errors='coerce').to_numpy(dtype=float)[positions]
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    rows = positions[located]
+
+    severity = _risk_classification(version, df).severity(mode)[rows]
+    cell_deg = choose_resolution(lat[located], lon[located])
+    cells = aggregate_grid(
+        lat[located], lon[located],
+        df['risk_score'].to_numpy(dtype=float)[rows],
+        severity,
+        cell_deg,
+        weight=pd.to_numeric(df[weight_col], errors='coerce').to_numpy(dtype=float)[rows]
     )
+    return cells, cell_deg
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # NBO FUNCTIONS
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@st.cache_data(ttl=300)
-def load_nbo_data():
-    """Load NBO data from JSON file."""
+def _load_nbo_json(path):
+    """Legacy loader: parse the nbo_master JSON export."""
     try:
-        with open('Data/nbo_master.json', 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         return data
     except FileNotFoundError:
-        st.error("File Data/nbo_master.json non trovato")
+        st.error(f"File {path} non trovato")
         return []
     except json.JSONDecodeError:
         st.error("Errore nel parsing del file JSON")
         return []
 
 
-@st.cache_data(ttl=300)
-def _calculate_score_cached(
-    retention_gain: float, redditivita: float, propensione: float,
-    w_retention: float, w_redditivita: float, w_propensione: float
-) -> float:
-    """Calculate weighted score (cached version with primitive args)."""
-    return (
-        retention_gain * w_retention +
-        redditivita * w_redditivita +
-        propensione * w_propensione
-    )
+@st.cache_resource(ttl=300)
+def get_nbo_engine():
+    """
+    NBO master as a scoring engine, loaded once and shared read-only across sessions.
+
+    Reads the memory-mapped columnar artifact (NBO_ARTIFACT_DIR); falls back
+    to parsing the JSON export when the artifact has not been generated yet.
+    """
+    engine = load_nbo_artifact(NBO_ARTIFACT_DIR)
+    if engine is None:
+        engine = NBOEngine.from_clients(_load_nbo_json(NBO_JSON_PATH))
+    return engine
 
 
 def calculate_recommendation_score(rec, weights):
     """Calculate weighted score for a recommendation."""
-    c = rec['componenti']
-    return _calculate_score_cached(
-        c['retention_gain'], c['redditivita'], c['propensione'],
-        weights['retention'], weights['redditivita'], weights['propensione']
-    )
+    return recommendation_score(rec, weights)
+
+
+@st.cache_resource(max_entries=2)
+def get_eligibility_overlay(version, _engine):
+    """Top 20 interaction indicators of the NBO clients, shared across sessions."""
+    return EligibilityOverlay(_engine.codes)
 
 
-def get_all_recommendations(data, weights, filter_top20=True):
+def _fetch_interactions(codes):
+    # Without a connection the batch check answers "no interactions" for
+    # everyone: leave those clients unchecked in the overlay
+    if get_supabase_client() is None:
+        return {}
+    return check_all_clients_interactions_batch(codes)
+
+
+def get_top_recommendations(engine, weights, k, filter_top20=True):
     """
-    Get all recommendations with scores across all clients.
-    
-    Optimized to only check interactions for top-scoring candidates when filtering for Top 20,
-    reducing DB queries from thousands to dozens.
+    Get the first k clients by score, each with the recommendation to show.
+
+    Only the candidates needed to fill k rows are checked for interactions
+    (in growing batches), and no full ranked list is built. Results are
+    cached by (weights, NBO data version, eligibility epoch), so moving
+    between dashboard, Top 5 and detail views reuses the same ranking; the
+    epoch advances when a call is recorded or every ELIGIBILITY_EPOCH_SECONDS.
+    Eligibility is read from the shared EligibilityOverlay, which only
+    queries clients not checked in the last ELIGIBILITY_EPOCH_SECONDS.
 
     Args:
-        data: Client data with recommendations
+        engine: NBOEngine over the NBO master
         weights: Scoring weights
-        filter_top20: If True, filter out clients not eligible for Top 20
+        k: Number of client rows
+        filter_top20: If True, skip clients not eligible for Top 20
 
     Returns:
-        List of recommendations sorted by score (descending)
+        List of at most k recommendations sorted by score (descending);
+        shared read-only rows
     """
-    # STEP 1: Score ALL clients first (no DB queries, just calculations)
-    all_recs = []
-    for client in data:
-        codice_cliente = client['codice_cliente']
-        # Initialize eligibility flags (updated later if filter_top20)
-        client['_is_eligible_top20'] = True
-        client['_interaction_indicators'] = {}
-
-        # Calcola score per tutte le raccomandazioni del cliente
-        client_recs = []
-        for rec in client['raccomandazioni']:
-            score = calculate_recommendation_score(rec, weights)
-            client_recs.append((rec, score))
-
-        # Ordina per score decrescente
-        client_recs.sort(key=lambda x: x[1], reverse=True)
-
-        # Swap deterministico per varietà: usa hash del codice_cliente
-        # per decidere quale raccomandazione mostrare come "top"
-        # Dopo lo swap, la prima raccomandazione eredita lo score più alto
-        if len(client_recs) > 1:
-            swap_idx = codice_cliente % 5  # 0, 1, 2, 3, 4
-            top_score = client_recs[0][1]  # Score più alto originale
-
-            if swap_idx == 1 and len(client_recs) > 1:
-                # 20% dei clienti: usa la 2a raccomandazione
-                rec_swapped = client_recs[1][0]
-                client_recs[1] = (client_recs[0][0], client_recs[1][1])
-                client_recs[0] = (rec_swapped, top_score)  # Eredita lo score top
-            elif swap_idx == 2 and len(client_recs) > 2:
-                # 20% dei clienti: usa la 3a raccomandazione
-                rec_swapped = client_recs[2][0]
-                client_recs[2] = (client_recs[0][0], client_recs[2][1])
-                client_recs[0] = (rec_swapped, top_score)  # Eredita lo score top
-            elif swap_idx == 3 and len(client_recs) > 1:
-                # 20% dei clienti: usa la 2a raccomandazione (variante)
-                rec_swapped = client_recs[1][0]
-                client_recs[1] = (client_recs[0][0], client_recs[1][1])
-                client_recs[0] = (rec_swapped, top_score)  # Eredita lo score top
-            # swap_idx == 0 o 4: tieni la 1a (40% dei clienti)
-
-        for rec, score in client_recs:
-            all_recs.append({
-                'codice_cliente': codice_cliente,
-                'nome': client['anagrafica']['nome'],
-                'cognome': client['anagrafica']['cognome'],
-                'prodotto': rec['prodotto'],
-                'area_bisogno': rec['area_bisogno'],
-                'score': score,
-                'client_data': client,
-                'recommendation': rec
-            })
-    
-    # Sort by score descending
-    all_recs.sort(key=lambda x: x['score'], reverse=True)
-    
-    # STEP 2: If filtering for Top 20, only check interactions for top candidates
-    # Check more than 20 to account for some being filtered out
-    if filter_top20:
-        # Get unique client codes from top 100 recommendations (covers edge cases)
-        top_candidates = []
-        seen_clients = set()
-        for rec in all_recs:
-            cc = rec['codice_cliente']
-            if cc not in seen_clients:
-                seen_clients.add(cc)
-                top_candidates.append(cc)
-                if len(top_candidates) >= 100:  # Check only top 100 clients instead of all 11k+
-                    break
-        
-        # Batch check only these top candidates (3 queries for 100 clients instead of thousands)
-        batch_interactions = check_all_clients_interactions_batch(top_candidates)
-        
-        # Filter out ineligible clients and update their flags
-        filtered_recs = []
-        for rec in all_recs:
-            cc = rec['codice_cliente']
-            client = rec['client_data']
-            
-            if cc in batch_interactions:
-                indicators = batch_interactions[cc]
-                is_eligible = not any(indicators.values())  # Eligible if NO interactions
-                client['_is_eligible_top20'] = is_eligible
-                client['_interaction_indicators'] = indicators
-                
-                if is_eligible:
-                    filtered_recs.append(rec)
-            else:
-                # Client wasn't in top candidates, include them (they're lower scored anyway)
-                filtered_recs.append(rec)
-        
-        return filtered_recs
-    else:
-        # No filtering needed
-        return all_recs
+    weights_key = tuple(sorted(weights.items()))
+    overlay = get_eligibility_overlay(engine.version, engine)
+    return _ranked_top_recommendations(weights_key, engine.version, eligibility_epoch(), k, filter_top20, engine, overlay)
+
+
+@st.cache_resource(ttl=2 * ELIGIBILITY_EPOCH_SECONDS, max_entries=32)
+def _ranked_top_recommendations(weights_key, version, epoch, k, filter_top20, _engine, _overlay):
+    """Cached ranking over the shared NBO records (nothing is copied or written into them)."""
+    weights = dict(weights_key)
+
+    def is_eligible(codes):
+        # Batch check only the new candidates whose indicators are stale
+        return _overlay.check(codes, _fetch_interactions)
+
+    top = _engine.top_clients(weights, k, eligible=is_eligible if filter_top20 else None)
+
+    top_recs = []
+    for ci, ri, score in zip(top.client.tolist(), top.rec.tolist(), top.score.tolist()):
+        client = _engine.clients[ci]
+        rec = client['raccomandazioni'][ri]
+        top_recs.append({
+            'codice_cliente': client['codice_cliente'],
+            'nome': client['anagrafica']['nome'],
+            'cognome': client['anagrafica']['cognome'],
+            'prodotto': rec['prodotto'],
+            'area_bisogno': rec['area_bisogno'],
+            'score': score,
+            'client_data': client,
+            'recommendation': rec
+        })
+    return top_recs
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -2150,20 +2199,9 @@ st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
 
 if st.session_state.dashboard_mode == 'Analytics':
     # ═══════════════════════════════════════════════════════════════════════════════
-    # DATA LOADING & FILTERING (Lazy Load)
+    # FILTERS & AGGREGATES (row-level data is loaded lazily by map / client list)
     # ═══════════════════════════════════════════════════════════════════════════════
-    with helio_spinner("Caricamento Ecosistema Helios..."):
-        df = load_data()
-    
-    # Set default for filtered_df based on stored filter state
-    filtered_df = df.copy()
-    if st.session_state.selected_city != 'Tutte le città':
-        filtered_df = filtered_df[filtered_df['citta'] == st.session_state.selected_city]
-    if st.session_state.selected_risk != 'Tutti i rischi':
-        filtered_df = filtered_df[filtered_df['risk_category'] == st.session_state.selected_risk]
-    if st.session_state.selected_zone != 'Tutte le zone':
-        zone_num = int(st.session_state.selected_zone.split()[-1])
-        filtered_df = filtered_df[filtered_df['zona_sismica'] == zone_num]
+    filter_city, filter_risk, filter_zone = get_active_filters()
 
     # ═══════════════════════════════════════════════════════════════════════════════
     # ANALYTICS DETAIL VIEW
@@ -2255,11 +2293,16 @@ if st.session_state.dashboard_mode == 'Analytics':
         </style>
         """, unsafe_allow_html=True)
     
+        # Chart-ready aggregates for the active filters (server-side RPC)
+        with helio_spinner("Caricamento Ecosistema Helios..."):
+            summary = get_analytics_summary(filter_city, filter_risk, filter_zone)
+        stats = summary['kpis']
+
         # Filter row
         filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([2, 2, 2, 1])
     
         with filter_col1:
-            cities_list = ['Tutte le città'] + sorted(df['citta'].unique().tolist())
+            cities_list = ['Tutte le città'] + get_city_options()
             selected_city = st.selectbox(
                 "📍 Città",
                 cities_list,
@@ -2298,8 +2341,8 @@ if st.session_state.dashboard_mode == 'Analytics':
             # Quick stats
             st.markdown(f"""
             <div style="text-align: center; padding: 0.5rem;">
-                <p style="font-family: 'JetBrains Mono', monospace; font-size: 1.5rem; font-weight: 700; background: linear-gradient(135deg, #00A0B0 0%, #00C9D4 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; margin: 0; line-height: 1;">{filtered_df['citta'].nunique():,}</p>
-                <p style="font-family: 'Inter', sans-serif; font-size: 0.65rem; color: #94A3B8; margin: 0;">di {df['citta'].nunique():,}</p>
+                <p style="font-family: 'JetBrains Mono', monospace; font-size: 1.5rem; font-weight: 700; background: linear-gradient(135deg, #00A0B0 0%, #00C9D4 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; margin: 0; line-height: 1;">{stats['n_cities']:,}</p>
+                <p style="font-family: 'Inter', sans-serif; font-size: 0.65rem; color: #94A3B8; margin: 0;">di {summary['n_cities_all']:,}</p>
                 <p style="font-family: 'Inter', sans-serif; font-size: 0.55rem; color: #CBD5E1; margin: 0; text-transform: uppercase; letter-spacing: 0.05em;">Comuni</p>
             </div>
             """, unsafe_allow_html=True)
@@ -2307,11 +2350,8 @@ if st.session_state.dashboard_mode == 'Analytics':
         st.markdown("<br>", unsafe_allow_html=True)
     
         # Warning if no results match filters
-        if len(filtered_df) == 0:
+        if stats['total'] == 0:
             st.warning("⚠️ Nessuna abitazione corrisponde ai filtri selezionati. Prova a modificare i criteri nella sidebar.")
-    
-        # Get stats
-        stats = get_risk_stats(filtered_df)
         
         # ═══════════════════════════════════════════════════════════════════════════════
         # KPI METRICS ROW
@@ -2323,7 +2363,7 @@ if st.session_state.dashboard_mode == 'Analytics':
             st.metric(
                 label="🏠 Abitazioni Valutate",
                 value=f"{stats['total']:,}",
-                delta=f"{round(stats['total']/len(df)*100)}% copertura"
+                delta=f"{round(stats['total']/summary['total_all']*100) if summary['total_all'] else 0}% copertura"
             )
         
         with col2:
@@ -2342,52 +2382,49 @@ if st.session_state.dashboard_mode == 'Analytics':
             )
         
         with col4:
-            # Protect against NaN when filtered_df is empty
-            if len(filtered_df) > 0:
-                avg_clv = filtered_df['clv'].mean()
-                # Handle NaN case (if all CLV values are missing)
-                if pd.isna(avg_clv):
-                    avg_clv = 0
-            else:
-                avg_clv = 0
-        
             st.metric(
                 label="💎 CLV Medio",
-                value=f"€{avg_clv:,.0f}",
+                value=f"€{stats['avg_clv']:,.0f}",
                 delta="lifetime value"
             )
         
         st.markdown("<br>", unsafe_allow_html=True)
         
         # ═══════════════════════════════════════════════════════════════════════════════
-        # MAIN TABS
+        # MAIN VIEWS
         # ═══════════════════════════════════════════════════════════════════════════════
+        # A radio instead of st.tabs: tabs execute every body on each rerun, while
+        # only the selected view runs here, so row-level data is loaded just for
+        # the map and the client list.
     
-        tab1, tab2, tab3 = st.tabs([
-            "🗺️ Mappa Geo-Rischio",
-            "📈 Grafici",
-            "🔍 Dettaglio Clienti"
-        ])
+        analytics_view = st.radio(
+            "Vista",
+            ["📈 Grafici", "🗺️ Mappa Geo-Rischio", "🔍 Dettaglio Clienti"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="analytics_view"
+        )
         
         # ═══════════════════════════════════════════════════════════════════════════════
-        # TAB 1: GEO-RISK MAP
+        # VIEW: GEO-RISK MAP
         # ═══════════════════════════════════════════════════════════════════════════════
         
-        with tab1:
+        if analytics_view == "🗺️ Mappa Geo-Rischio":
             st.markdown("### 🌍 Mappa del Rischio Territoriale")
+            filtered_df = get_filtered_data(filter_city, filter_risk, filter_zone)
             
             # Map Mode Selector
             map_mode = st.radio(
                 "Visualizza per",
-                ["Rischio Composito", "Rischio Sismico", "Rischio Idrogeologico", "Rischio Alluvione"],
+                list(MAP_MODES),
                 horizontal=True,
                 label_visibility="collapsed"
             )
             
             # Legend based on mode
-            if map_mode == "Rischio Composito":
+            if map_mode == MODE_COMPOSITE:
                 st.caption("Visualizzazione basata sul Risk Score complessivo.")
-            elif map_mode == "Rischio Sismico":
+            elif map_mode == MODE_SEISMIC:
                 st.caption("Visualizzazione basata su Zona Sismica (1=Alto, 4=Basso).")
             else:
                 st.caption("Visualizzazione basata su livelli di pericolosità (P3/P4).")
@@ -2396,7 +2433,7 @@ if st.session_state.dashboard_mode == 'Analytics':
             map_df = filtered_df[
                 filtered_df['latitudine'].notna() & 
                 filtered_df['longitudine'].notna()
-            ].copy()
+            ]
     
             # Check for Mapbox Token
             mapbox_key = os.getenv("MAPBOX_TOKEN")
@@ -2406,81 +2443,21 @@ if st.session_state.dashboard_mode == 'Analytics':
             if len(map_df) == 0:
                 st.warning("⚠️ Nessuna abitazione con coordinate geografiche disponibile.")
             else:
-                # 1. Prepare Colors based on Mode
-                
-                # Fill NaNs for safety to ensure tooltips work
-                if 'hydro_risk_p3' in map_df.columns:
-                    map_df['hydro_risk_p3'] = map_df['hydro_risk_p3'].fillna(0)
-                if 'flood_risk_p3' in map_df.columns:
-                    map_df['flood_risk_p3'] = map_df['flood_risk_p3'].fillna(0)
-
-                tooltip_html = ""
-
-                if map_mode == "Rischio Composito":
-                    RISK_COLOR_MAP = {
-                        'Critico': [220, 38, 38, 200],   # Red
-                        'Alto':    [234, 88, 12, 200],   # Orange
-                        'Medio':   [202, 138, 4, 180],   # Yellow
-                        'Basso':   [22, 163, 74, 180]    # Green
-                    }
-                    DEFAULT_COLOR = [22, 163, 74, 180]
-                    map_df['color'] = map_df['risk_category'].apply(lambda x: RISK_COLOR_MAP.get(x, DEFAULT_COLOR))
+                data = load_data()
+
+                if map_mode == MODE_COMPOSITE:
                     weight_col = "risk_score"
                     tooltip_html = "<b>Città:</b> {citta}<br/><b>Rischio:</b> {risk_score}<br/><b>Categoria:</b> {risk_category}<br/><b>Cliente:</b> {codice_cliente}"
-                    
-                elif map_mode == "Rischio Sismico":
-                    # Zone 1 (Red) -> Zone 4 (Green)
-                    SEISMIC_COLORS = {
-                        1: [220, 38, 38, 200],
-                        2: [234, 88, 12, 200],
-                        3: [202, 138, 4, 180],
-                        4: [22, 163, 74, 180]
-                    }
-                    map_df['color'] = map_df['zona_sismica'].apply(lambda x: SEISMIC_COLORS.get(int(x) if pd.notna(x) else 4, [200, 200, 200, 100]))
-                    weight_col = "zona_sismica" 
+                elif map_mode == MODE_SEISMIC:
+                    weight_col = "zona_sismica"
                     tooltip_html = "<b>Città:</b> {citta}<br/><b>Zona Sismica:</b> {zona_sismica}<br/><b>Cliente:</b> {codice_cliente}"
-                    
-                elif map_mode == "Rischio Idrogeologico":
-                    # Numeric binning for Hydro Risk (P3)
-                    # < 5.0: Low (Green)
-                    # < 20.0: Medium (Orange)
-                    # >= 20.0: High (Red)
-                    
-                    def get_hydro_color(val):
-                        try:
-                            v = float(val)
-                            if v < 5.0: return [22, 163, 74, 180]    # Green
-                            if v < 20.0: return [202, 138, 4, 180]   # Orange
-                            return [220, 38, 38, 200]                # Red
-                        except:
-                            return [200, 200, 200, 100]              # Grey
-
-                    map_df['color'] = map_df['hydro_risk_p3'].apply(get_hydro_color) 
+                elif map_mode == MODE_HYDRO:
                     weight_col = "risk_score"
                     tooltip_html = "<b>Città:</b> {citta}<br/><b>Idrogeologico (P3):</b> {hydro_risk_p3}<br/><b>Categoria:</b> {risk_category}<br/><b>Cliente:</b> {codice_cliente}"
-                
                 else: # Flood
-                    # Numeric binning for Flood Risk (P3)
-                    # < 10.0: Low (Green)
-                    # < 30.0: Medium (Orange)
-                    # >= 30.0: High (Red)
-                    
-                    def get_flood_color(val):
-                        try:
-                            v = float(val)
-                            if v < 10.0: return [22, 163, 74, 180]   # Green
-                            if v < 30.0: return [202, 138, 4, 180]   # Orange
-                            return [220, 38, 38, 200]                # Red
-                        except:
-                            return [200, 200, 200, 100]              # Grey
-
-                    map_df['color'] = map_df['flood_risk_p3'].apply(get_flood_color)
                     weight_col = "risk_score"
                     tooltip_html = "<b>Città:</b> {citta}<br/><b>Alluvione (P3):</b> {flood_risk_p3}<br/><b>Categoria:</b> {risk_category}<br/><b>Cliente:</b> {codice_cliente}"
 
-                
-                # 2. PyDeck Layers
-                
                 # View State (Initialize centered on data or Italy)
                 view_state = pdk.ViewState(
                     latitude=map_df['latitudine'].mean() if len(map_df) > 0 else 41.8719,
@@ -2489,44 +2466,101 @@ if st.session_state.dashboard_mode == 'Analytics':
                     pitch=0,
                 )
 
-                # Layer 1: Heatmap (Density/Intensity)
+                if len(map_df) > MAP_RAW_POINTS_MAX:
+                    # Large sets: aggregated grid cells (count, mean score, worst level)
+                    fingerprint = FilterIndex.fingerprint(
+                        citta=filter_city, risk_category=filter_risk, zona_sismica=filter_zone
+                    )
+                    cells, cell_deg = get_map_grid(data.version, fingerprint, map_mode, weight_col, data)
+                    st.caption(
+                        f"{len(map_df):,} abitazioni aggregate in {len(cells):,} celle da {cell_deg}° "
+                        f"(colore = livello peggiore della cella, altezza = numero di abitazioni)."
+                    )
+
+                    tooltip_html = "<b>Abitazioni:</b> {count}<br/><b>Rischio medio:</b> {risk_score}"
+                    payload = build_map_payload(
+                        cells,
+                        SEVERITY_PALETTES[map_mode][cells['severity'].to_numpy(dtype=np.uint8)],
+                        'weight',
+                        fields=tooltip_fields(tooltip_html) + ['count'],
+                        lon_col='lon',
+                        lat_col='lat'
+                    )
+                    payload_kind = "grid"
+
+                    view_state.pitch = 40
+                    point_layer = pdk.Layer(
+                        "ColumnLayer",
+                        data=payload.points,
+                        get_position=['lon', 'lat'],
+                        get_elevation='count',
+                        elevation_scale=cell_radius_meters(cell_deg) / max(int(cells['count'].max()), 1) * 8,
+                        radius=cell_radius_meters(cell_deg),
+                        get_fill_color='color',
+                        extruded=True,
+                        pickable=True
+                    )
+
+                else:
+                    # 1. Prepare Colors based on Mode
+                    # (vectorized palette lookup, cached per data version and mode;
+                    # load_data() rows are labelled by position)
+                    colors = get_map_colors(data.version, map_mode, data)
+                    payload = build_map_payload(
+                        map_df,
+                        colors[map_df.index.to_numpy()],
+                        weight_col,
+                        fields=tooltip_fields(tooltip_html)
+                    )
+                    payload_kind = "points"
+
+                    # Fill NaNs for safety to ensure tooltips work
+                    for col in ('hydro_risk_p3', 'flood_risk_p3'):
+                        if col in payload.points.columns:
+                            payload.points[col] = payload.points[col].fillna(0)
+
+                    # 2. PyDeck Layers
+
+                    # Layer 2: Scatterplot (Individual Points)
+                    point_layer = pdk.Layer(
+                        "ScatterplotLayer",
+                        data=payload.points,
+                        get_position=['lon', 'lat'],
+                        get_fill_color='color',
+                        get_radius=5000,  # Meters
+                        pickable=True,
+                        radius_min_pixels=4,
+                        radius_max_pixels=15,
+                        line_width_min_pixels=1,
+                        stroked=True,
+                        get_line_color=[255, 255, 255, 100]
+                    )
+
+                # Layer 1: Heatmap (Density/Intensity) - positions and weights only
                 heatmap_layer = pdk.Layer(
                     "HeatmapLayer",
-                    data=map_df,
-                    get_position=['longitudine', 'latitudine'],
-                    get_weight=weight_col,
+                    data=payload.heat,
+                    get_position=['lon', 'lat'],
+                    get_weight='weight',
                     opacity=0.4,
                     radius_pixels=40,
                     intensity=1,
                     threshold=0.2
                 )
 
-                # Layer 2: Scatterplot (Individual Points)
-                scatter_layer = pdk.Layer(
-                    "ScatterplotLayer",
-                    data=map_df,
-                    get_position=['longitudine', 'latitudine'],
-                    get_fill_color='color',
-                    get_radius=5000,  # Meters
-                    pickable=True,
-                    radius_min_pixels=4,
-                    radius_max_pixels=15,
-                    line_width_min_pixels=1,
-                    stroked=True,
-                    get_line_color=[255, 255, 255, 100]
-                )
-
                 # Render Chart
-                st.pydeck_chart(pdk.Deck(
+                deck = pdk.Deck(
                     map_style='mapbox://styles/mapbox/light-v10',
                     api_keys={'mapbox': mapbox_key},
                     initial_view_state=view_state,
-                    layers=[heatmap_layer, scatter_layer],
+                    layers=[heatmap_layer, point_layer],
                     tooltip={
                         "html": tooltip_html,
                         "style": {"backgroundColor": "steelblue", "color": "white"}
                     }
-                ))
+                )
+                record_deck_payload(payload_kind, deck, len(payload.points))
+                st.pydeck_chart(deck)
             
             # Legend (Horizontal)
             st.markdown("""
@@ -2540,21 +2574,21 @@ if st.session_state.dashboard_mode == 'Analytics':
         
         
         # ═══════════════════════════════════════════════════════════════════════════════
-        # TAB 2: ANALYTICS
+        # VIEW: ANALYTICS (aggregates only)
         # ═══════════════════════════════════════════════════════════════════════════════
         
-        with tab2:
+        elif analytics_view == "📈 Grafici":
             st.markdown("### 📈 Analytics Dashboard")
         
             analytics_col1, analytics_col2 = st.columns(2)
         
             with analytics_col1:
                 # Risk Distribution Donut - Light Theme
-                risk_counts = filtered_df['risk_category'].value_counts()
+                risk_counts = summary['risk_distribution']
         
                 fig_donut = go.Figure(data=[go.Pie(
-                    labels=risk_counts.index,
-                    values=risk_counts.values,
+                    labels=[r['label'] for r in risk_counts],
+                    values=[r['count'] for r in risk_counts],
                     hole=0.65,
                     marker_colors=['#DC2626', '#EA580C', '#CA8A04', '#16A34A'],
                     textinfo='percent+label',
@@ -2581,7 +2615,7 @@ if st.session_state.dashboard_mode == 'Analytics':
                         font=dict(family='Inter', size=11, color='#64748B')
                     ),
                     annotations=[dict(
-                        text=f"<b>{len(filtered_df):,}</b><br>Totale",
+                        text=f"<b>{stats['total']:,}</b><br>Totale",
                         x=0.5, y=0.5,
                         font=dict(family='JetBrains Mono', size=20, color='#1B3A5F'),
                         showarrow=False
@@ -2603,80 +2637,42 @@ if st.session_state.dashboard_mode == 'Analytics':
                     key="risk_chart_selector"
                 )
     
+                # Color mapping: Basso=Green, Medio=Amber, Alto=Red
+                level_colors = {
+                    "Basso": "#16A34A",
+                    "Medio": "#CA8A04",
+                    "Alto": "#DC2626"
+                }
+
                 if risk_chart_type == "Sismico":
                     # Seismic Zone Bar Chart
-                    zone_counts = filtered_df['zona_sismica'].value_counts().sort_index()
-                    x_vals = [f"Zona {z}" for z in zone_counts.index]
-                    y_vals = zone_counts.values
+                    zone_counts = summary['zone_counts']
+                    x_vals = [f"Zona {z['label']}" for z in zone_counts]
+                    y_vals = [z['count'] for z in zone_counts]
                     colors = ['#DC2626', '#EA580C', '#CA8A04', '#16A34A'][:len(zone_counts)]
                     title = "Abitazioni per Zona Sismica"
                     
                 elif risk_chart_type == "Idrogeologico":
-                    # Hydro Risk Bar Chart (Binning numeric values)
-                    if 'hydro_risk_p3' in filtered_df.columns:
-                        # Helper for binning
-                        def get_hydro_level(val):
-                            try:
-                                v = float(val)
-                                if v < 5.0: return "Basso"
-                                if v < 20.0: return "Medio"
-                                return "Alto"
-                            except:
-                                return "N/D"
-
-                        # Create a temporary series for counting
-                        risk_levels = filtered_df['hydro_risk_p3'].apply(get_hydro_level)
-                        # Filter out N/D if desired, or keep them. Let's keep valid levels.
-                        valid_levels = ["Basso", "Medio", "Alto"]
-                        
-                        # Count values
-                        counts = risk_levels.value_counts().reindex(valid_levels, fill_value=0)
-                        
-                        x_vals = counts.index.tolist()
-                        y_vals = counts.values
-                        
-                        # Color mapping: Basso=Green, Medio=Amber, Alto=Red
-                        color_map = {
-                            "Basso": "#16A34A",
-                            "Medio": "#CA8A04",
-                            "Alto": "#DC2626"
-                        }
-                        colors = [color_map.get(x, '#94A3B8') for x in x_vals]
-                        
+                    # Hydro Risk Bar Chart (P3 binned server-side: < 5 / < 20 / >= 20)
+                    counts = summary['hydro_levels']
+                    if counts:
+                        x_vals = list(counts.keys())
+                        y_vals = list(counts.values())
+                        colors = [level_colors.get(x, '#94A3B8') for x in x_vals]
                         title = "Abitazioni per Rischio Idrogeologico"
                     else:
                         x_vals, y_vals, colors = [], [], []
                         title = "Dati Idrogeologici non disponibili"
     
                 else: # Alluvionale
-                     if 'flood_risk_p3' in filtered_df.columns:
-                        # Helper for binning
-                        def get_flood_level(val):
-                            try:
-                                v = float(val)
-                                if v < 10.0: return "Basso"
-                                if v < 30.0: return "Medio"
-                                return "Alto"
-                            except:
-                                return "N/D"
-
-                        risk_levels = filtered_df['flood_risk_p3'].apply(get_flood_level)
-                        valid_levels = ["Basso", "Medio", "Alto"]
-                        
-                        counts = risk_levels.value_counts().reindex(valid_levels, fill_value=0)
-                        
-                        x_vals = counts.index.tolist()
-                        y_vals = counts.values
-                        
-                        color_map = {
-                            "Basso": "#16A34A",
-                            "Medio": "#CA8A04",
-                            "Alto": "#DC2626"
-                        }
-                        colors = [color_map.get(x, '#94A3B8') for x in x_vals]
-                        
+                    # Flood Risk Bar Chart (P3 binned server-side: < 10 / < 30 / >= 30)
+                    counts = summary['flood_levels']
+                    if counts:
+                        x_vals = list(counts.keys())
+                        y_vals = list(counts.values())
+                        colors = [level_colors.get(x, '#94A3B8') for x in x_vals]
                         title = "Abitazioni per Rischio Alluvione"
-                     else:
+                    else:
                         x_vals, y_vals, colors = [], [], []
                         title = "Dati Alluvionali non disponibili"
     
@@ -2725,9 +2721,10 @@ if st.session_state.dashboard_mode == 'Analytics':
             analytics_col3, analytics_col4 = st.columns(2)
         
             with analytics_col3:
-                # CLV vs Risk Score Scatter - Light Theme
+                # CLV vs Risk Score Scatter - Light Theme (bounded server-side sample)
+                scatter_df = pd.DataFrame(summary['clv_risk_sample'], columns=CLV_RISK_SAMPLE_COLUMNS)
                 fig_scatter = px.scatter(
-                    filtered_df,
+                    scatter_df,
                     x='risk_score',
                     y='clv',
                     color='risk_category',
@@ -2785,9 +2782,7 @@ if st.session_state.dashboard_mode == 'Analytics':
         
             with analytics_col4:
                 # Churn Probability Distribution - Light Theme
-                churn_bins = pd.cut(filtered_df['churn_probability'], bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0],
-                                   labels=['Molto Basso', 'Basso', 'Medio', 'Alto', 'Molto Alto'])
-                churn_counts = churn_bins.value_counts().sort_index()
+                churn_counts = pd.Series(summary['churn_bins'])
         
                 fig_churn = go.Figure(data=[go.Bar(
                     y=churn_counts.index.astype(str),
@@ -2833,12 +2828,10 @@ if st.session_state.dashboard_mode == 'Analytics':
             # City breakdown - Light Theme
             st.markdown("### 🏙️ Top 10 Città per Concentrazione Rischio")
         
-            city_risk = filtered_df.groupby('citta').agg({
-                'risk_score': 'mean',
-                'id': 'count',
-                'clv': 'sum'
-            }).rename(columns={'id': 'n_abitazioni', 'clv': 'clv_totale'}).reset_index()
-            city_risk = city_risk.sort_values('risk_score', ascending=False).head(10)
+            city_risk = pd.DataFrame(
+                summary['top_cities'],
+                columns=['citta', 'risk_score', 'n_abitazioni', 'clv_totale']
+            )
         
             fig_city = go.Figure(data=[go.Bar(
                 x=city_risk['citta'],
@@ -2882,11 +2875,12 @@ if st.session_state.dashboard_mode == 'Analytics':
         
         
         # ═══════════════════════════════════════════════════════════════════════════════
-        # TAB 3: CLIENT DETAIL
+        # VIEW: CLIENT DETAIL
         # ═══════════════════════════════════════════════════════════════════════════════
         
-        with tab3:
+        else:
             st.markdown("### 🔍 Ricerca Clienti")
+            filtered_df = get_filtered_data(filter_city, filter_risk, filter_zone)
             
             search_col1, search_col2 = st.columns([3, 1])
             
@@ -2907,9 +2901,9 @@ if st.session_state.dashboard_mode == 'Analytics':
             
             if search_term:
                 mask = (
-                    display_df['id'].str.contains(search_term, case=False, na=False) |
+                    display_df['id'].astype(str).str.contains(search_term, case=False, na=False) |
                     display_df['citta'].str.contains(search_term, case=False, na=False) |
-                    display_df['codice_cliente'].str.contains(search_term, case=False, na=False)
+                    display_df['codice_cliente'].astype(str).str.contains(search_term, case=False, na=False)
                 )
                 display_df = display_df[mask]
             
@@ -2989,10 +2983,11 @@ else:
 
     # Load NBO data
     with helio_spinner("Caricamento Policy Advisor..."):
-        nbo_data = load_nbo_data()
+        nbo_engine = get_nbo_engine()
+        eligibility_overlay = get_eligibility_overlay(nbo_engine.version, nbo_engine)
 
-    if not nbo_data:
-        st.error("Impossibile caricare i dati NBO. Verifica che il file Data/nbo_master.json esista.")
+    if not nbo_engine.n_clients:
+        st.error(f"Impossibile caricare i dati NBO. Verifica che {NBO_ARTIFACT_DIR}/ (o {NBO_JSON_PATH}) esista.")
     else:
         # Check if we're in Top 5 view
         if st.session_state.nbo_page == 'top5':
@@ -3016,9 +3011,8 @@ else:
             </div>
             """, unsafe_allow_html=True)
 
-            # Get top 5 from all_recs
-            all_recs = get_all_recommendations(nbo_data, st.session_state.nbo_weights)
-            top5_recs = all_recs[:5]
+            # Get top 5 clients (same cached ranking as the dashboard's Top 25)
+            top5_recs = get_top_recommendations(nbo_engine, st.session_state.nbo_weights, 25)[:5]
 
             # Display Top 5 clients
             for i, rec in enumerate(top5_recs):
@@ -3191,10 +3185,7 @@ Le email devono essere personalizzate per ogni cliente, non identiche."""
                             note_complete += f"\nNote: {note_aggiuntive}"
                         success = insert_phone_call_interaction(codice_cliente, polizza_proposta=polizza_proposta, esito=esito.lower(), note=note_complete)
                         if success:
-                            if '_interaction_indicators' not in client_data:
-                                client_data['_interaction_indicators'] = {}
-                            client_data['_interaction_indicators']['call_last_10_days'] = True
-                            client_data['_is_eligible_top20'] = False
+                            eligibility_overlay.set_indicator(codice_cliente, 'call_last_10_days')
                             st.session_state.show_call_form = False
                             st.session_state.show_success_message = True
                             st.rerun()
@@ -3384,7 +3375,7 @@ Mantieni formato **Oggetto:** e corpo email. GENERA ORA senza tool."""
             # ═══════════════════════════════════════════════════════════════════
             
             # Prepare data
-            indicators = client_data.get('_interaction_indicators', {})
+            indicators = eligibility_overlay.indicators(client_data['codice_cliente'])
             prodotti = meta.get('prodotti_posseduti', [])
             if prodotti and isinstance(prodotti, str):
                 prodotti = [prodotti]
@@ -3653,9 +3644,9 @@ Mantieni formato **Oggetto:** e corpo email. GENERA ORA senza tool."""
             # POLICY ADVISOR MAIN DASHBOARD VIEW (formerly NBO)
             # ═══════════════════════════════════════════════════════════════════════════════
 
-            # Get all recommendations with current weights
+            # Get the Top 25 clients with current weights (Top 5 + leaderboard 6-25)
             with helio_spinner("Caricamento Policy Advisor..."):
-                all_recs = get_all_recommendations(nbo_data, st.session_state.nbo_weights, filter_top20=True)
+                top_recs = get_top_recommendations(nbo_engine, st.session_state.nbo_weights, 25, filter_top20=True)
 
             # ═══════════════════════════════════════════════════════════════════════════════
             # STRATEGIA ATTIVA (Always Visible)
@@ -3705,7 +3696,7 @@ Mantieni formato **Oggetto:** e corpo email. GENERA ORA senza tool."""
             # ═══════════════════════════════════════════════════════════════════════════════
             st.markdown("### 🌟 Top 5 Clienti ad Alto Potenziale")
 
-            top5_recs = all_recs[:5]
+            top5_recs = top_recs[:5]
 
             # Create 5 columns for the cards - wrapped in container for CSS targeting
             st.markdown('<div class="top5-cards-container">', unsafe_allow_html=True)
@@ -3737,7 +3728,7 @@ Mantieni formato **Oggetto:** e corpo email. GENERA ORA senza tool."""
             # ═══════════════════════════════════════════════════════════════════════════════
             st.markdown("### 📋 Leaderboard Opportunità (Top 6-25)")
             
-            top20_recs = all_recs[5:25]
+            top20_recs = top_recs[5:25]
             
             # LET'S REDO THE LOOP WITH COLUMNS FOR BETTER ALIGNMENT
             # LET'S REDO THE LOOP WITH COLUMNS FOR BETTER ALIGNMENT
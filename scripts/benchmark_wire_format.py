@@ -0,0 +1,66 @@
+import time
+import sys
+import os
+import tracemalloc
+
+# Add root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data import projections
+from src.data.db_utils import get_supabase_client, _tracked
+from src.data.projections import projection, payload_stats, reset_payload_stats
+from src.data.table_reader import read_table
+
+# The wire MB column comes from the payload counters, off by default in the app
+projections.PAYLOAD_METRICS_ENABLED = True
+
+# (table, projection, key) pairs loaded by the analytics dashboard
+TABLES = [
+    ("abitazioni", "map", "id"),
+    ("clienti", "kpi", "codice_cliente"),
+]
+
+
+def run_once(client, table, view, key, wire_format):
+    """Read a full projection, returning (rows, seconds, peak MB, wire bytes)."""
+    reset_payload_stats()
+    tracemalloc.start()
+    start_time = time.time()
+
+    df = read_table(
+        client, table, projection(table, view),
+        key=key, retry=_tracked(table, view), wire_format=wire_format
+    )
+
+    elapsed = time.time() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    wire_bytes = payload_stats().get(f"{table}.{view}", {}).get("bytes", 0)
+    return len(df), elapsed, peak / 1024 / 1024, wire_bytes
+
+
+def benchmark():
+    print("🚀 Starting Benchmark: JSON vs CSV wire format...")
+
+    client = get_supabase_client()
+    if not client:
+        print("❌ No Supabase client (check SUPABASE_URL / SUPABASE_KEY)")
+        return
+
+    for table, view, key in TABLES:
+        print(f"\n📦 {table}.{view}")
+        results = {}
+        for wire_format in ("json", "csv"):
+            rows, elapsed, peak_mb, wire_bytes = run_once(client, table, view, key, wire_format)
+            results[wire_format] = elapsed
+            print(f"   {wire_format:<4} {rows:>8} rows  {elapsed:6.2f}s  "
+                  f"peak {peak_mb:7.1f} MB  wire {wire_bytes / 1024 / 1024:6.1f} MB")
+
+        if results["json"] > 0:
+            percent = (results["json"] - results["csv"]) / results["json"] * 100
+            print(f"   ⚡ CSV: {percent:.1f}% faster")
+
+
+if __name__ == "__main__":
+    benchmark()
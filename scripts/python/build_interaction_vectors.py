@@ -0,0 +1,98 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    INTERACTION VECTOR INDEX BUILDER                           ║
+║         Copy interactions.embedding into a local quantized index             ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Reads every embedded interaction from Supabase and writes the memory-mapped
+index used by Iris' doc_retriever_rag (src/iris/vector_index.py) to
+Data/interaction_vectors/. Rows are quantized page by page, grouped by
+client, and an IVF (sqrt(rows) lists by default) is trained for
+portfolio-wide searches.
+
+Iris keeps using the match_interactions RPC for clients missing from the
+index, for clients with interactions created after the index watermark, and
+for every client once the index is older than VECTOR_INDEX_MAX_AGE_SECONDS:
+rerun this script (e.g. nightly) after new interactions have been embedded.
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Dict, Iterator
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+from src.data.table_reader import iter_table_pages
+from src.iris.vector_index import DOCUMENT_COLUMNS, DTYPES, write_vector_index
+
+# Load environment variables
+load_dotenv()
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'Data', 'interaction_vectors')
+
+# Model the stored embeddings were computed with (must match IrisEngine.embedding_model)
+EMBEDDING_MODEL = "openai/text-embedding-3-small"
+
+# Embeddings are ~1536 floats as text: keep pages small
+PAGE_SIZE = 200
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client."""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+
+    if not url or not key:
+        print("❌ ERROR: SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+        sys.exit(1)
+
+    return create_client(url, key)
+
+
+def iter_interactions(client: Client, page_size: int) -> Iterator[Dict]:
+    """Embedded interactions, one row at a time (keyset pagination on id)."""
+    columns = ",".join(DOCUMENT_COLUMNS + ("created_at", "embedding"))
+    total = 0
+    for page in iter_table_pages(client, "interactions", columns, page_size=page_size,
+                                 where=lambda q: q.not_.is_("embedding", "null")):
+        total += len(page)
+        print(f"  Fetched {len(page)} interactions (total: {total})")
+        yield from page
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the local interaction vector index from Supabase')
+    parser.add_argument('--dtype', choices=DTYPES, default='int8',
+                        help='Stored vector precision (default int8)')
+    parser.add_argument('--nlist', type=int, default=None,
+                        help='IVF lists for portfolio-wide search (default sqrt(rows), 0 disables)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+                        help=f'Rows per request (default {PAGE_SIZE})')
+    parser.add_argument('--model', default=EMBEDDING_MODEL,
+                        help=f'Embedding model of the stored vectors (default {EMBEDDING_MODEL})')
+    args = parser.parse_args()
+
+    client = get_supabase_client()
+    start = time.time()
+
+    print(f"\n📥 Reading interaction embeddings (pages of {args.page_size})...")
+    manifest = write_vector_index(iter_interactions(client, args.page_size), INDEX_PATH,
+                                  model=args.model, dtype=args.dtype, nlist=args.nlist)
+
+    print(f"\n✅ {INDEX_PATH}: {manifest['rows']} interactions, {manifest['clients']} clients, "
+          f"{manifest['dim']}-d {manifest['dtype']}, {manifest['nlist']} IVF lists "
+          f"(version {manifest['version']}, {time.time() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- HELIOS - Aggregati server-side per la dashboard Analytics
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- La dashboard chiede solo gli aggregati pronti per i grafici (KPI, donut,
+-- barre zone/idro/alluvione, fasce churn, top 10 città, campione CLV vs rischio)
+-- invece di scaricare tutte le abitazioni. I dati riga per riga servono solo
+-- alla mappa e alla lista clienti.
+--
+-- Le normalizzazioni replicano load_data() in app.py:
+--   citta          -> initcap(coalesce(citta, 'Sconosciuta'))
+--   risk_category  -> coalesce(risk_category, 'Non valutato')
+--   risk_score     -> coalesce(risk_score, 0)
+--   zona_sismica   -> coalesce(zona_sismica, 4)   (DEFAULT_SEISMIC_ZONE)
+--   clv / churn    -> da clienti, coalesce(..., 0)
+--
+-- Soglie: idrogeologico P3 < 5 / < 20, alluvione P3 < 10 / < 30
+-- (vedi src/data/analytics.py, che calcola lo stesso risultato in locale
+-- come fallback quando le funzioni non sono installate).
+
+-- 1. Vista normalizzata abitazioni + clienti
+create or replace view analytics_abitazioni as
+select
+  a.id,
+  a.codice_cliente,
+  initcap(coalesce(a.citta, 'Sconosciuta'))    as citta,
+  coalesce(a.risk_category, 'Non valutato')     as risk_category,
+  coalesce(a.risk_score, 0)::float              as risk_score,
+  coalesce(a.zona_sismica, 4)::int              as zona_sismica,
+  a.hydro_risk_p3::float                        as hydro_risk_p3,
+  a.flood_risk_p3::float                        as flood_risk_p3,
+  coalesce(c.clv_stimato, 0)::float             as clv,
+  coalesce(c.churn_probability, 0)::float       as churn_probability
+from abitazioni a
+left join clienti c on c.codice_cliente = a.codice_cliente;
+
+-- 2. Opzioni del filtro città
+create or replace function get_analytics_cities()
+returns setof text
+language sql stable
+as $$
+  select distinct citta from analytics_abitazioni order by citta;
+$$;
+
+-- 3. Tutti gli aggregati della dashboard in una sola chiamata
+create or replace function get_analytics_summary(
+  p_citta text default null,
+  p_risk text default null,
+  p_zona int default null,
+  p_sample int default 2000
+)
+returns jsonb
+language sql stable
+as $$
+  with f as (
+    select * from analytics_abitazioni
+    where (p_citta is null or citta = p_citta)
+      and (p_risk is null or risk_category = p_risk)
+      and (p_zona is null or zona_sismica = p_zona)
+  ),
+  kpis as (
+    select
+      count(*)                                                   as total,
+      coalesce(round(avg(risk_score)::numeric, 1), 0)            as avg_score,
+      count(*) filter (where risk_category = 'Critico')          as critico,
+      count(*) filter (where risk_category = 'Alto')             as alto,
+      count(*) filter (where risk_category = 'Medio')            as medio,
+      count(*) filter (where risk_category = 'Basso')            as basso,
+      coalesce(avg(clv), 0)                                      as avg_clv,
+      count(distinct citta)                                      as n_cities
+    from f
+  ),
+  totals as (
+    select count(*) as total_all, count(distinct citta) as n_cities_all
+    from analytics_abitazioni
+  )
+  select jsonb_build_object(
+    'kpis', (select to_jsonb(kpis) from kpis),
+    'total_all', (select total_all from totals),
+    'n_cities_all', (select n_cities_all from totals),
+    'risk_distribution', coalesce((
+      select jsonb_agg(jsonb_build_object('label', risk_category, 'count', n) order by n desc)
+      from (select risk_category, count(*) as n from f group by risk_category) r
+    ), '[]'::jsonb),
+    'zone_counts', coalesce((
+      select jsonb_agg(jsonb_build_object('label', zona_sismica, 'count', n) order by zona_sismica)
+      from (select zona_sismica, count(*) as n from f group by zona_sismica) z
+    ), '[]'::jsonb),
+    'hydro_levels', jsonb_build_object(
+      'Basso', (select count(*) from f where hydro_risk_p3 < 5),
+      'Medio', (select count(*) from f where hydro_risk_p3 >= 5 and hydro_risk_p3 < 20),
+      'Alto',  (select count(*) from f where hydro_risk_p3 >= 20)
+    ),
+    'flood_levels', jsonb_build_object(
+      'Basso', (select count(*) from f where flood_risk_p3 < 10),
+      'Medio', (select count(*) from f where flood_risk_p3 >= 10 and flood_risk_p3 < 30),
+      'Alto',  (select count(*) from f where flood_risk_p3 >= 30)
+    ),
+    -- Fasce (0, 0.2], (0.2, 0.4], ... come pd.cut: churn = 0 resta fuori
+    'churn_bins', jsonb_build_object(
+      'Molto Basso', (select count(*) from f where churn_probability > 0   and churn_probability <= 0.2),
+      'Basso',       (select count(*) from f where churn_probability > 0.2 and churn_probability <= 0.4),
+      'Medio',       (select count(*) from f where churn_probability > 0.4 and churn_probability <= 0.6),
+      'Alto',        (select count(*) from f where churn_probability > 0.6 and churn_probability <= 0.8),
+      'Molto Alto',  (select count(*) from f where churn_probability > 0.8 and churn_probability <= 1.0)
+    ),
+    'top_cities', coalesce((
+      select jsonb_agg(to_jsonb(t) order by t.risk_score desc)
+      from (
+        select citta, avg(risk_score) as risk_score, count(*) as n_abitazioni, sum(clv) as clv_totale
+        from f group by citta
+        order by avg(risk_score) desc
+        limit 10
+      ) t
+    ), '[]'::jsonb),
+    -- Campione deterministico (stesso ordine a ogni rerun) per lo scatter
+    'clv_risk_sample', coalesce((
+      select jsonb_agg(to_jsonb(s))
+      from (
+        select risk_score, clv, risk_category, churn_probability, citta, zona_sismica
+        from f order by md5(id::text) limit p_sample
+      ) s
+    ), '[]'::jsonb)
+  );
+$$;
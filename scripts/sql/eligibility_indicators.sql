@@ -0,0 +1,69 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- HELIOS - Indicatori di eleggibilità Top 20 in una sola chiamata
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- Un cliente entra nel Top 20 / Top 5 del Policy Advisor solo se non ha:
+--   email negli ultimi 5 giorni lavorativi (~7 giorni di calendario)
+--   telefonate negli ultimi 10 giorni
+--   polizze emesse negli ultimi 30 giorni
+--   reclami aperti (esito nullo o diverso da 'risolto' / 'chiuso')
+--   sinistri negli ultimi 60 giorni
+--
+-- check_all_clients_interactions_batch (src/data/db_utils.py) chiama la
+-- funzione con blocchi di codici cliente in parallelo, invece di tre query
+-- sequenziali per ogni blocco di 500. Le date di inizio finestra arrivano
+-- dall'app, così le soglie restano quelle del codice Python. Se la funzione
+-- non è installata l'app torna alle query sulle singole tabelle.
+
+-- 1. Indici per le ricerche per cliente + data
+create index if not exists idx_interactions_cliente_tipo_data
+  on interactions (codice_cliente, tipo_interazione, data_interazione);
+create index if not exists idx_polizze_cliente_emissione
+  on polizze (codice_cliente, data_emissione);
+create index if not exists idx_sinistri_cliente_data
+  on sinistri (codice_cliente, data_sinistro);
+
+-- 2. I cinque indicatori per ogni cliente richiesto
+create or replace function get_eligibility_indicators(
+  p_clienti bigint[],
+  p_email_since timestamptz,
+  p_call_since timestamptz,
+  p_policy_since timestamptz,
+  p_claim_since timestamptz
+)
+returns table (
+  codice_cliente bigint,
+  email_last_5_days boolean,
+  call_last_10_days boolean,
+  new_policy_last_30_days boolean,
+  open_complaint boolean,
+  claim_last_60_days boolean
+)
+language sql stable
+as $$
+  select
+    c.id as codice_cliente,
+    exists (
+      select 1 from interactions i
+      where i.codice_cliente = c.id and i.tipo_interazione = 'email'
+        and i.data_interazione >= p_email_since
+    ) as email_last_5_days,
+    exists (
+      select 1 from interactions i
+      where i.codice_cliente = c.id and i.tipo_interazione = 'telefonata'
+        and i.data_interazione >= p_call_since
+    ) as call_last_10_days,
+    exists (
+      select 1 from polizze p
+      where p.codice_cliente = c.id and p.data_emissione >= p_policy_since
+    ) as new_policy_last_30_days,
+    exists (
+      select 1 from interactions i
+      where i.codice_cliente = c.id and i.tipo_interazione = 'reclamo'
+        and coalesce(i.esito, '') not in ('risolto', 'chiuso')
+    ) as open_complaint,
+    exists (
+      select 1 from sinistri s
+      where s.codice_cliente = c.id and s.data_sinistro >= p_claim_since
+    ) as claim_last_60_days
+  from unnest(p_clienti) as c(id);
+$$;
@@ -8,7 +8,7 @@ This module contains all hardcoded constants extracted from the codebase for
 easier maintenance and consistency across the project.
 """
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # RISK ASSESSMENT CONSTANTS
@@ -81,6 +81,15 @@ FLOOD_RISK_SCORE_CRITICAL: int = 90
 FLOOD_RISK_SCORE_HIGH: int = 60
 FLOOD_RISK_SCORE_LOW: int = 25
 
+# Analytics dashboard binning of P3 values (Basso < t0 <= Medio < t1 <= Alto)
+HYDRO_P3_LEVEL_BINS: Tuple[float, float] = (5.0, 20.0)
+FLOOD_P3_LEVEL_BINS: Tuple[float, float] = (10.0, 30.0)
+RISK_LEVEL_LABELS: List[str] = ["Basso", "Medio", "Alto"]
+
+# Churn probability bands (right-closed, as pd.cut: churn = 0 is not counted)
+CHURN_BIN_EDGES: List[float] = [0, 0.2, 0.4, 0.6, 0.8, 1.0]
+CHURN_BIN_LABELS: List[str] = ["Molto Basso", "Basso", "Medio", "Alto", "Molto Alto"]
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # INSURANCE PRODUCTS & PREMIUMS
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -135,16 +144,73 @@ DB_MAX_SEARCH_RESULTS: int = 20        # Max results for search queries
 CACHE_TTL_SHORT: int = 1800            # 30 minutes (increased for better performance)
 CACHE_TTL_MEDIUM: int = 600            # 10 minutes (for reference data)
 CACHE_TTL_LONG: int = 3600             # 1 hour (for static data)
+CACHE_TTL_FAILURE: int = 60            # 1 minute (fallback results after a failed RPC)
+CACHE_REFRESH_WORKERS: int = 2         # Background stale-while-revalidate refreshes
+ELIGIBILITY_EPOCH_SECONDS: int = 120   # Policy Advisor ranking: max age of the interaction checks
+INTERACTION_INDEX_REFRESH_SECONDS: int = 60  # Top 20 event timelines: created_at delta sync interval
+ELIGIBILITY_RPC_CHUNK_SIZE: int = 2000  # Client IDs per get_eligibility_indicators call
+ELIGIBILITY_QUERY_CHUNK_SIZE: int = 500  # Client IDs per in_() table query (URL length)
+ELIGIBILITY_WORKERS: int = 4           # Concurrent eligibility chunks
 
 # API timeout settings (in seconds)
 API_TIMEOUT_DEFAULT: int = 60          # Default timeout for external APIs
 API_TIMEOUT_SHORT: int = 30            # Timeout for fast operations
 API_TIMEOUT_EMBEDDING: int = 30        # Timeout for embedding generation
+SUPABASE_TIMEOUT: int = 30             # PostgREST requests (a hung query cannot hold a worker)
+
+# Pooled HTTP client (src/utils/http_client.py)
+HTTP_POOL_CONNECTIONS: int = 4         # Hosts kept in the connection pool
+HTTP_POOL_MAXSIZE: int = 16            # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT: float = 5.0      # Seconds to open a connection
+HTTP_TIMEOUTS: Dict[str, int] = {      # Read timeout per endpoint
+    "chat": API_TIMEOUT_DEFAULT,
+    "embeddings": API_TIMEOUT_EMBEDDING,
+    "vision": API_TIMEOUT_DEFAULT,
+}
+
+# Iris tool execution (tool calls of one turn run concurrently)
+IRIS_TOOL_WORKERS: int = 8             # Shared pool size, across all chat sessions
+IRIS_TOOL_TIMEOUT_DEFAULT: int = 15    # Seconds a tool call may run (counted from its start)
+IRIS_TOOL_QUEUE_TIMEOUT: int = 30      # Seconds a tool call may wait for a free worker
+IRIS_TOOL_TIMEOUTS: Dict[str, int] = {
+    "doc_retriever_rag": 35,           # Embedding call + vector search
+    "database_explorer": 20,
+}
 
 # Retry settings
 API_MAX_RETRIES: int = 3
 API_RETRY_DELAY_SECONDS: float = 1.0
 
+# Local snapshot store (Parquet mirrors of the large tables)
+SNAPSHOT_DIR: str = "Data/snapshots"          # Relative to the app working dir
+SNAPSHOT_FULL_RESYNC_SECONDS: int = 86400     # Full rebuild once a day (catches deletes)
+
+# RAG query embeddings cache (src/iris/embedding_cache.py)
+EMBEDDING_CACHE_DIR: str = "Data/embedding_cache"  # Relative to the app working dir
+EMBEDDING_CACHE_SIZE: int = 512               # Query vectors kept in memory
+
+# Local interaction vector index (src/iris/vector_index.py)
+INTERACTION_VECTORS_DIR: str = "Data/interaction_vectors"  # Relative to the app working dir
+VECTOR_INDEX_CHECK_SECONDS: int = 60          # How often to look for a rebuilt index
+VECTOR_INDEX_NPROBE: int = 8                  # IVF lists probed by portfolio-wide searches
+VECTOR_INDEX_MAX_AGE_SECONDS: int = 7 * 86400  # Older indexes are ignored (RPC only)
+VECTOR_INDEX_MAX_DELTA: int = 5000            # Rows newer than the index before it is bypassed
+
+# Bulk table reads: "csv" (PostgREST text/csv parsed by pandas) or "json"
+DB_WIRE_FORMAT: str = "csv"
+
+# Analytics dashboard: rows sampled for the CLV vs risk scatter
+ANALYTICS_SCATTER_SAMPLE: int = 2000
+
+# NBO master: columnar artifact (memory-mapped .npy arrays, src/nbo/artifact.py)
+# and the legacy/export JSON
+NBO_ARTIFACT_DIR: str = "Data/nbo_master"
+NBO_JSON_PATH: str = "Data/nbo_master.json"
+
+# Per-projection row/byte counters for Supabase responses (src/data/projections.py).
+# Off by default: counting JSON bytes re-encodes every response
+PAYLOAD_METRICS_ENABLED: bool = False
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # UI CONFIGURATION - Vita Sicura Light Theme
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -190,6 +256,11 @@ MAP_POINT_SIZE_MIN: int = 50
 MAP_POINT_SIZE_MAX: int = 300
 MAP_POINT_SIZE_DEFAULT: int = 150
 
+# Geo-risk map aggregation (src/utils/geo_grid.py)
+MAP_RAW_POINTS_MAX: int = 5000         # Above this, draw grid cells instead of points
+MAP_MAX_CELLS: int = 4000              # Finest grid resolution staying under this many cells
+MAP_GRID_RESOLUTIONS: Tuple[float, ...] = (1.0, 0.5, 0.25, 0.1, 0.05, 0.02, 0.01)  # Cell size (degrees), coarse -> fine
+
 # Display limits
 MAX_DISPLAY_RESULTS: int = 20          # Max results to display in cards
 MAX_CONVERSATION_HISTORY: int = 5      # Max messages to keep in chat history
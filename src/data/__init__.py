@@ -7,5 +7,6 @@ from .db_utils import (
     is_client_eligible_for_top20,
     check_all_clients_interactions_batch,
     insert_phone_call_interaction,
+    eligibility_epoch,
     search_clients,
 )
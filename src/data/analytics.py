@@ -0,0 +1,265 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS ANALYTICS AGGREGATES                                ║
+║              Chart-Ready Summaries for the Analytics Dashboard                ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The KPI row and the charts only need aggregates. They are computed in the
+database by the get_analytics_summary / get_analytics_cities RPCs
+(scripts/sql/analytics_aggregates.sql), parameterized by the dashboard filters,
+so no row-level data is downloaded unless the map or the client list is open.
+
+compute_analytics_summary() produces the same structure from the merged
+load_data() frame and is used as a fallback when the RPCs are not installed.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import (
+    CACHE_TTL_SHORT,
+    CACHE_TTL_MEDIUM,
+    CACHE_TTL_FAILURE,
+    ANALYTICS_SCATTER_SAMPLE,
+    HYDRO_P3_LEVEL_BINS,
+    FLOOD_P3_LEVEL_BINS,
+    RISK_LEVEL_LABELS,
+    CHURN_BIN_EDGES,
+    CHURN_BIN_LABELS,
+    RISK_CATEGORY_CRITICAL,
+    RISK_CATEGORY_HIGH,
+    RISK_CATEGORY_MEDIUM,
+    RISK_CATEGORY_LOW,
+)
+from src.data.db_utils import get_supabase_client, _retry_query, SupabaseQueryError
+from src.data.projections import record_payload
+from src.data.single_flight import shared_cache
+from src.data.filter_index import FilterIndex
+from src.utils.risk_classification import level_codes, level_counts
+
+logger = logging.getLogger(__name__)
+
+# Columns the dashboard filters on (indexed by load_data)
+FILTER_COLUMNS: List[str] = ['citta', 'risk_category', 'zona_sismica']
+
+# Columns of the CLV vs risk scatter sample
+SCATTER_COLUMNS: List[str] = [
+    'risk_score', 'clv', 'risk_category', 'churn_probability', 'citta', 'zona_sismica'
+]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SERVER-SIDE (RPC)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _succeeded(result: Any) -> bool:
+    return result is not None
+
+
+@shared_cache(ttl=CACHE_TTL_SHORT, cache_if=_succeeded, failure_ttl=CACHE_TTL_FAILURE)
+def fetch_analytics_summary(
+    city: Optional[str] = None,
+    risk: Optional[str] = None,
+    zone: Optional[int] = None,
+    sample_size: int = ANALYTICS_SCATTER_SAMPLE
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch all dashboard aggregates for a filter combination in one RPC.
+
+    Args:
+        city: Normalized city name, or None for all cities
+        risk: Risk category, or None for all
+        zone: Seismic zone (1-4), or None for all
+        sample_size: Max rows in the CLV vs risk scatter sample
+
+    Returns:
+        Summary dict (see compute_analytics_summary), or None if the RPC is
+        unavailable. The None result is cached for CACHE_TTL_FAILURE only,
+        so a missing function is not retried on every rerun and a transient
+        error does not pin the fallback for the full TTL.
+    """
+    client = get_supabase_client()
+    if not client:
+        return None
+
+    try:
+        response = _retry_query(
+            lambda: client.rpc("get_analytics_summary", {
+                "p_citta": city,
+                "p_risk": risk,
+                "p_zona": zone,
+                "p_sample": sample_size,
+            }).execute()
+        )
+        record_payload("analytics", "summary", response.data)
+        if not response.data:
+            return None
+        return _normalize_summary(response.data)
+
+    except SupabaseQueryError as e:
+        logger.warning(f"RPC get_analytics_summary failed, using local aggregates: {e}")
+        return None
+
+
+@shared_cache(ttl=CACHE_TTL_MEDIUM, cache_if=_succeeded, failure_ttl=CACHE_TTL_FAILURE)
+def fetch_city_options() -> Optional[List[str]]:
+    """
+    Fetch the sorted list of normalized city names for the city filter.
+
+    Returns:
+        List of cities, or None if the RPC is unavailable
+    """
+    client = get_supabase_client()
+    if not client:
+        return None
+
+    try:
+        response = _retry_query(lambda: client.rpc("get_analytics_cities").execute())
+        record_payload("analytics", "cities", response.data)
+        if not response.data:
+            return None
+        # setof text comes back as a list of scalars (or of single-key rows)
+        return [row if isinstance(row, str) else next(iter(row.values())) for row in response.data]
+
+    except SupabaseQueryError as e:
+        logger.warning(f"RPC get_analytics_cities failed, using local city list: {e}")
+        return None
+
+
+def _normalize_summary(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce the RPC JSON into the structure built by compute_analytics_summary."""
+    kpis = dict(raw.get('kpis') or {})
+    for key in ('total', 'critico', 'alto', 'medio', 'basso', 'n_cities'):
+        kpis[key] = int(kpis.get(key) or 0)
+    kpis['avg_score'] = float(kpis.get('avg_score') or 0)
+    kpis['avg_clv'] = float(kpis.get('avg_clv') or 0)
+    kpis['high_risk_pct'] = _high_risk_pct(kpis)
+
+    return {
+        'kpis': kpis,
+        'total_all': int(raw.get('total_all') or 0),
+        'n_cities_all': int(raw.get('n_cities_all') or 0),
+        'risk_distribution': [
+            {'label': r['label'], 'count': int(r['count'])} for r in raw.get('risk_distribution') or []
+        ],
+        'zone_counts': [
+            {'label': int(r['label']), 'count': int(r['count'])} for r in raw.get('zone_counts') or []
+        ],
+        'hydro_levels': {label: int((raw.get('hydro_levels') or {}).get(label, 0)) for label in RISK_LEVEL_LABELS},
+        'flood_levels': {label: int((raw.get('flood_levels') or {}).get(label, 0)) for label in RISK_LEVEL_LABELS},
+        'churn_bins': {label: int((raw.get('churn_bins') or {}).get(label, 0)) for label in CHURN_BIN_LABELS},
+        'top_cities': raw.get('top_cities') or [],
+        'clv_risk_sample': raw.get('clv_risk_sample') or [],
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOCAL FALLBACK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _high_risk_pct(kpis: Dict[str, Any]) -> float:
+    total = kpis.get('total', 0)
+    if not total:
+        return 0
+    return round((kpis.get('critico', 0) + kpis.get('alto', 0)) / total * 100, 1)
+
+
+def filter_frame(
+    df: pd.DataFrame,
+    city: Optional[str] = None,
+    risk: Optional[str] = None,
+    zone: Optional[int] = None,
+    index: Optional[FilterIndex] = None
+) -> pd.DataFrame:
+    """
+    Apply the dashboard filters to the load_data() frame (None = no filter).
+
+    With a FilterIndex built on df the rows are taken by position from the
+    index; otherwise the filters fall back to boolean masks.
+    """
+    if index is not None:
+        if city is None and risk is None and zone is None:
+            return df
+        return df.iloc[index.select(citta=city, risk_category=risk, zona_sismica=zone)]
+
+    mask = np.ones(len(df), dtype=bool)
+    if city is not None:
+        mask &= (df['citta'] == city).to_numpy()
+    if risk is not None:
+        mask &= (df['risk_category'] == risk).to_numpy()
+    if zone is not None:
+        mask &= (df['zona_sismica'] == zone).to_numpy()
+    return df[mask]
+
+
+def _level_counts(values: pd.Series, bins) -> Dict[str, int]:
+    """Count values per Basso/Medio/Alto level; missing values are not counted."""
+    return level_counts(level_codes(values, bins), RISK_LEVEL_LABELS)
+
+
+def compute_analytics_summary(
+    df: pd.DataFrame,
+    city: Optional[str] = None,
+    risk: Optional[str] = None,
+    zone: Optional[int] = None,
+    sample_size: int = ANALYTICS_SCATTER_SAMPLE,
+    index: Optional[FilterIndex] = None
+) -> Dict[str, Any]:
+    """
+    Compute the dashboard aggregates locally from the load_data() frame.
+
+    Same semantics as the get_analytics_summary RPC. Pass the frame's
+    FilterIndex to select the rows by position instead of by masks.
+
+    Returns:
+        Dict with kpis, total_all, n_cities_all, risk_distribution, zone_counts,
+        hydro_levels, flood_levels, churn_bins, top_cities, clv_risk_sample
+    """
+    f = filter_frame(df, city, risk, zone, index=index)
+    total = len(f)
+
+    categories = f['risk_category'].value_counts()
+    kpis = {
+        'total': total,
+        'avg_score': round(float(f['risk_score'].mean()), 1) if total else 0,
+        'critico': int(categories.get(RISK_CATEGORY_CRITICAL, 0)),
+        'alto': int(categories.get(RISK_CATEGORY_HIGH, 0)),
+        'medio': int(categories.get(RISK_CATEGORY_MEDIUM, 0)),
+        'basso': int(categories.get(RISK_CATEGORY_LOW, 0)),
+        'avg_clv': float(f['clv'].mean()) if total else 0,
+        'n_cities': int(f['citta'].nunique()),
+    }
+    if pd.isna(kpis['avg_clv']):
+        kpis['avg_clv'] = 0
+    kpis['high_risk_pct'] = _high_risk_pct(kpis)
+
+    zones = f['zona_sismica'].value_counts().sort_index()
+    churn = pd.cut(f['churn_probability'], bins=CHURN_BIN_EDGES, labels=CHURN_BIN_LABELS).value_counts()
+
+    top_cities = (
+        f.groupby('citta')
+        .agg(risk_score=('risk_score', 'mean'), n_abitazioni=('risk_score', 'size'), clv_totale=('clv', 'sum'))
+        .reset_index()
+        .sort_values('risk_score', ascending=False)
+        .head(10)
+    )
+
+    sample = f[SCATTER_COLUMNS]
+    if len(sample) > sample_size:
+        sample = sample.sample(n=sample_size, random_state=0)
+
+    return {
+        'kpis': kpis,
+        'total_all': len(df),
+        'n_cities_all': len(index.values('citta')) if index is not None else int(df['citta'].nunique()),
+        'risk_distribution': [{'label': k, 'count': int(v)} for k, v in categories.items()],
+        'zone_counts': [{'label': int(k), 'count': int(v)} for k, v in zones.items()],
+        'hydro_levels': _level_counts(f['hydro_risk_p3'], HYDRO_P3_LEVEL_BINS) if 'hydro_risk_p3' in f else {},
+        'flood_levels': _level_counts(f['flood_risk_p3'], FLOOD_P3_LEVEL_BINS) if 'flood_risk_p3' in f else {},
+        'churn_bins': {label: int(churn.get(label, 0)) for label in CHURN_BIN_LABELS},
+        'top_cities': top_cities.to_dict('records'),
+        'clv_risk_sample': sample.to_dict('records'),
+    }
@@ -7,26 +7,39 @@
 
 import os
 import time
+import threading
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest import ReturnMethod
 from dotenv import load_dotenv
 import pandas as pd
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
-import math
 
 # Import constants
 from src.config.constants import (
-    DB_CHUNK_SIZE,
     DB_MAX_SEARCH_RESULTS,
     CACHE_TTL_SHORT,
     CACHE_TTL_MEDIUM,
     API_MAX_RETRIES,
     API_RETRY_DELAY_SECONDS,
+    SUPABASE_TIMEOUT,
     ABITAZIONI_COLUMNS,
     CLIENTI_COLUMNS,
+    DB_WIRE_FORMAT,
+    ELIGIBILITY_EPOCH_SECONDS,
+    INTERACTION_INDEX_REFRESH_SECONDS,
+    ELIGIBILITY_RPC_CHUNK_SIZE,
+    ELIGIBILITY_QUERY_CHUNK_SIZE,
+    ELIGIBILITY_WORKERS,
+    SNAPSHOT_FULL_RESYNC_SECONDS,
 )
+from src.data.snapshot_store import SnapshotStore, merge_delta, compute_watermark
+from src.data.table_reader import read_table
+from src.data.single_flight import shared_cache
+from src.data.projections import projection, record_payload
+from src.data.interaction_index import InteractionIndex, EMAIL, CALL, POLICY, CLAIM, LOOKBACK_DAYS
 
 # Load environment variables
 load_dotenv()
@@ -36,6 +49,15 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Process-wide handle on the local Parquet snapshots
+_snapshot_store = SnapshotStore()
+
+
+def _non_empty(df: pd.DataFrame) -> bool:
+    """Cache predicate: keep failed (empty) fetches out of the shared cache."""
+    return not df.empty
+
+
 class SupabaseConnectionError(Exception):
     """Custom exception for Supabase connection failures."""
     pass
@@ -74,7 +96,7 @@ def get_supabase_client() -> Optional[Client]:
         return None
 
     try:
-        client = create_client(url, key)
+        client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
         logger.info("✅ Supabase client initialized successfully")
         return client
     except Exception as e:
@@ -111,14 +133,122 @@ def _retry_query(func, *args, **kwargs):
             time.sleep(wait_time)
 
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
-def fetch_abitazioni(lite: bool = True) -> pd.DataFrame:
+def _tracked(table: str, view: str):
+    """
+    Retry wrapper that also records the payload size of each response.
+
+    Usable wherever _retry_query is passed as the retry hook (read_table).
+    """
+    def run(func):
+        response = _retry_query(func)
+        record_payload(table, view, response.data)
+        return response
+    return run
+
+
+def _select(client: Client, table: str, view: str, build):
+    """
+    Run a single query on a registered projection.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        view: Projection name (see src/data/projections.py)
+        build: Function receiving table(...).select(<projection>) and
+               returning the query to execute
+
+    Returns:
+        The query response
+    """
+    return _tracked(table, view)(
+        lambda: build(client.table(table).select(projection(table, view))).execute()
+    )
+
+
+def _load_table_via_snapshot(
+    client: Client,
+    snapshot_name: str,
+    table: str,
+    view: str,
+    key: str,
+    watermark_col: str,
+    wire_format: str = DB_WIRE_FORMAT
+) -> Optional[pd.DataFrame]:
+    """
+    Load a table projection from the local snapshot, syncing only the delta.
+
+    - No snapshot (or daily full resync due): full keyset read, then persist.
+    - Snapshot present: one delta query on watermark_col, merged by key.
+    - Delta query fails: the last snapshot is served as-is.
+
+    Snapshots are kept per wire format: CSV and JSON render timestamps
+    differently, and the watermark comparison relies on a single format.
+
+    Returns:
+        DataFrame, or None if nothing could be loaded (caller falls back)
+    """
+    if wire_format != "json":
+        snapshot_name = f"{snapshot_name}.{wire_format}"
+    cols = f"{projection(table, view)},{watermark_col}"
+    columns = [c.strip() for c in cols.split(",")]
+    retry = _tracked(table, view)
+
+    base = None
+    if not _snapshot_store.needs_full_resync(snapshot_name):
+        base = _snapshot_store.read(snapshot_name, columns)
+
+    if base is None:
+        df = read_table(client, table, cols, key=key, retry=retry, wire_format=wire_format)
+        if df.empty:
+            return None
+        _snapshot_store.write(snapshot_name, df, columns, compute_watermark(df, watermark_col), full_sync=True)
+        return df
+
+    watermark = _snapshot_store.read_meta(snapshot_name).get("watermark")
+    if not watermark:
+        return base
+
+    try:
+        # gte (not gt) so rows sharing the watermark timestamp are never missed;
+        # the duplicates are removed by the merge below
+        delta = read_table(
+            client, table, cols, key=key, retry=retry, wire_format=wire_format,
+            where=lambda q: q.gte(watermark_col, watermark)
+        )
+    except Exception as e:
+        logger.warning(f"Delta sync for {snapshot_name} failed, serving local snapshot: {e}")
+        return base
+
+    if not delta.empty:
+        # Rows sitting exactly on the watermark are already in the snapshot
+        delta = delta[
+            (delta[watermark_col].astype(str) != watermark) | ~delta[key].isin(base[key])
+        ]
+
+    if delta.empty:
+        logger.info(f"Snapshot {snapshot_name} up to date ({len(base)} rows)")
+        return base
+
+    merged = merge_delta(base, delta, key)
+    _snapshot_store.write(snapshot_name, merged, columns, compute_watermark(merged, watermark_col), full_sync=False)
+    logger.info(f"Snapshot {snapshot_name} synced: {len(delta)} changed rows, {len(merged)} total")
+    return merged
+
+
+@shared_cache(ttl=CACHE_TTL_SHORT, cache_if=_non_empty)
+def fetch_abitazioni(lite: bool = True, wire_format: Optional[str] = None) -> pd.DataFrame:
     """
     Fetch abitazioni from Supabase.
-    
+
+    The lite projection is served from the local Parquet snapshot when pyarrow
+    is available, so a TTL expiry only costs a delta query on updated_at.
+
     Args:
         lite (bool): If True, fetch ONLY columns needed for Map/KPIs (faster, no joins).
                      If False, fetch everything (legacy behavior).
+        wire_format (str): "csv" or "json" (default: DB_WIRE_FORMAT). CSV pages
+                     are parsed by pandas without building row dicts; the
+                     joined legacy projection always travels as JSON.
     """
     client = get_supabase_client()
     if not client:
@@ -126,59 +256,27 @@ def fetch_abitazioni(lite: bool = True) -> pd.DataFrame:
         return pd.DataFrame(columns=ABITAZIONI_COLUMNS)
 
     try:
-        # Columns to fetch
-        if lite:
-            # OPTIMIZED: No join with clienti, fewer columns
-            cols = "id,codice_cliente,citta,latitudine,longitudine,zona_sismica,risk_score,risk_category,hydro_risk_p3,flood_risk_p3"
-        else:
-            # LEGACY: Full fetch with join (SLOW)
-            # We strip non-essential columns that might be missing to ensure benchmark runs
-            cols = "id,codice_cliente,citta,latitudine,longitudine,zona_sismica,risk_score,risk_category,clienti(nome,cognome)"
-
-        logger.info(f"Fetching abitazioni (lite={lite})...")
-
-        # 1. Get total count first to calculate chunks
-        count_response = _retry_query(
-            lambda: client.table("abitazioni").select("id", count="exact").limit(1).execute()
-        )
-        total_count = count_response.count
-        
-        if total_count == 0:
-            logger.warning("No abitazioni records found (count=0)")
-            return pd.DataFrame(columns=ABITAZIONI_COLUMNS)
-
-        num_chunks = math.ceil(total_count / DB_CHUNK_SIZE)
-        logger.info(f"Fetching {total_count} abitazioni records in {num_chunks} parallel chunks...")
+        # OPTIMIZED: map projection, no join with clienti
+        # LEGACY: joined projection (SLOW), kept for the benchmarks
+        view = "map" if lite else "joined"
+        wire_format = wire_format or DB_WIRE_FORMAT
 
-        all_data = []
+        logger.info(f"Fetching abitazioni (lite={lite}, wire_format={wire_format})...")
 
-        # 2. Define fetch function for a single chunk
-        def fetch_chunk(chunk_idx):
-            start = chunk_idx * DB_CHUNK_SIZE
-            end = start + DB_CHUNK_SIZE - 1
-            try:
-                response = _retry_query(
-                    lambda: client.table("abitazioni").select(cols).range(start, end).execute()
-                )
-                return response.data
-            except Exception as e:
-                logger.error(f"Error fetching chunk {chunk_idx}: {e}")
-                return []
-
-        # 3. Execute in parallel (max 4-5 workers to avoid rate limits)
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = [executor.submit(fetch_chunk, i) for i in range(num_chunks)]
-            
-            for future in as_completed(futures):
-                data = future.result()
-                if data:
-                    all_data.extend(data)
+        if lite and _snapshot_store.available:
+            df = _load_table_via_snapshot(
+                client, "abitazioni.lite", "abitazioni", view,
+                key="id", watermark_col="updated_at", wire_format=wire_format
+            )
+        else:
+            df = read_table(
+                client, "abitazioni", projection("abitazioni", view),
+                key="id", retry=_tracked("abitazioni", view), wire_format=wire_format
+            )
 
-        if not all_data:
-            logger.warning("No abitazioni data retrieved after chunks")
+        if df is None or df.empty:
             return pd.DataFrame(columns=ABITAZIONI_COLUMNS)
 
-        df = pd.DataFrame(all_data)
         logger.info(f"Successfully fetched {len(df)} total abitazioni records")
         return df
 
@@ -188,13 +286,17 @@ def fetch_abitazioni(lite: bool = True) -> pd.DataFrame:
         return pd.DataFrame(columns=ABITAZIONI_COLUMNS)
 
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
-def fetch_clienti(lite: bool = True) -> pd.DataFrame:
+@shared_cache(ttl=CACHE_TTL_SHORT, cache_if=_non_empty)
+def fetch_clienti(lite: bool = True, wire_format: Optional[str] = None) -> pd.DataFrame:
     """
     Fetch client data from Supabase.
-    
+
+    The lite projection is served from the local Parquet snapshot when pyarrow
+    is available, so a TTL expiry only costs a delta query on updated_at.
+
     Args:
         lite (bool): If True, fetch ONLY columns needed for Charts/List (faster).
+        wire_format (str): "csv" or "json" (default: DB_WIRE_FORMAT).
     """
     client = get_supabase_client()
     if not client:
@@ -202,60 +304,27 @@ def fetch_clienti(lite: bool = True) -> pd.DataFrame:
         return pd.DataFrame(columns=CLIENTI_COLUMNS)
 
     try:
-        if lite:
-            # OPTIMIZED: Only visual/stats columns
-            cols = "codice_cliente,nome,cognome,churn_probability,clv_stimato,num_polizze,latitudine,longitudine,citta"
-        else:
-            # LEGACY: Full fetch
-            cols = "codice_cliente,nome,cognome,eta,professione,reddito,churn_probability,clv_stimato,latitudine,longitudine,num_polizze"
-
-        logger.info(f"Fetching clienti (lite={lite})...")
-
-        # 1. Get total count first to calculate chunks
-        count_response = _retry_query(
-            lambda: client.table("clienti").select("codice_cliente", count="exact").limit(1).execute()
-        )
-        total_count = count_response.count
-        
-        if total_count == 0:
-            logger.warning("No client records found (count=0)")
-            return pd.DataFrame(columns=CLIENTI_COLUMNS)
-
-        num_chunks = math.ceil(total_count / DB_CHUNK_SIZE)
-        logger.info(f"Fetching {total_count} client records in {num_chunks} parallel chunks...")
+        # OPTIMIZED: KPI projection (only visual/stats columns)
+        # LEGACY: full 11-column list
+        view = "kpi" if lite else "full"
+        wire_format = wire_format or DB_WIRE_FORMAT
 
-        all_data = []
+        logger.info(f"Fetching clienti (lite={lite}, wire_format={wire_format})...")
 
-        # 2. Define fetch function
-        def fetch_chunk(chunk_idx):
-            start = chunk_idx * DB_CHUNK_SIZE
-            end = start + DB_CHUNK_SIZE - 1
-            try:
-                response = _retry_query(
-                    lambda: client.table("clienti").select(
-                        "codice_cliente, nome, cognome, eta, professione, reddito, "
-                        "churn_probability, clv_stimato, latitudine, longitudine, num_polizze"
-                    ).range(start, end).execute()
-                )
-                return response.data
-            except Exception as e:
-                logger.error(f"Error fetching client chunk {chunk_idx}: {e}")
-                return []
-
-        # 3. Execute in parallel
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = [executor.submit(fetch_chunk, i) for i in range(num_chunks)]
-            
-            for future in as_completed(futures):
-                data = future.result()
-                if data:
-                    all_data.extend(data)
+        if lite and _snapshot_store.available:
+            df = _load_table_via_snapshot(
+                client, "clienti.lite", "clienti", view,
+                key="codice_cliente", watermark_col="updated_at", wire_format=wire_format
+            )
+        else:
+            df = read_table(
+                client, "clienti", projection("clienti", view),
+                key="codice_cliente", retry=_tracked("clienti", view), wire_format=wire_format
+            )
 
-        if not all_data:
-            logger.warning("No client data retrieved after chunks")
+        if df is None or df.empty:
             return pd.DataFrame(columns=CLIENTI_COLUMNS)
 
-        df = pd.DataFrame(all_data)
         logger.info(f"Successfully fetched {len(df)} total client records")
         return df
 
@@ -265,7 +334,7 @@ def fetch_clienti(lite: bool = True) -> pd.DataFrame:
         return pd.DataFrame(columns=CLIENTI_COLUMNS)
 
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
+@shared_cache(ttl=CACHE_TTL_SHORT)
 def fetch_risk_stats() -> Dict:
     """
     Fetch aggregated risk statistics with improved fallback logic.
@@ -294,7 +363,7 @@ def fetch_risk_stats() -> Dict:
     return _calculate_risk_stats_fallback()
 
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
+@shared_cache(ttl=CACHE_TTL_SHORT)
 def _calculate_risk_stats_fallback() -> Dict:
     """
     Fallback function to calculate risk stats from abitazioni data.
@@ -336,7 +405,7 @@ def _get_empty_risk_stats() -> Dict:
     }
 
 
-@st.cache_data(ttl=CACHE_TTL_MEDIUM)
+@shared_cache(ttl=CACHE_TTL_MEDIUM, cache_if=_non_empty)
 def fetch_seismic_zones() -> pd.DataFrame:
     """
     Fetch reference seismic zone data (longer cache for static reference data).
@@ -349,9 +418,7 @@ def fetch_seismic_zones() -> pd.DataFrame:
         return pd.DataFrame()
 
     try:
-        response = _retry_query(
-            lambda: client.table("ref_seismic_zones").select("*").execute()
-        )
+        response = _select(client, "ref_seismic_zones", "reference", lambda q: q)
         df = pd.DataFrame(response.data)
         logger.info(f"Fetched {len(df)} seismic zone records")
         return df
@@ -361,7 +428,7 @@ def fetch_seismic_zones() -> pd.DataFrame:
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=CACHE_TTL_MEDIUM)
+@shared_cache(ttl=CACHE_TTL_MEDIUM, cache_if=_non_empty)
 def fetch_hydro_zones() -> pd.DataFrame:
     """
     Fetch reference hydrogeological risk data (longer cache for static reference data).
@@ -374,9 +441,7 @@ def fetch_hydro_zones() -> pd.DataFrame:
         return pd.DataFrame()
 
     try:
-        response = _retry_query(
-            lambda: client.table("ref_hydrogeological_zones").select("*").execute()
-        )
+        response = _select(client, "ref_hydrogeological_zones", "reference", lambda q: q)
         df = pd.DataFrame(response.data)
         logger.info(f"Fetched {len(df)} hydro zone records")
         return df
@@ -404,9 +469,7 @@ def get_client_detail(codice_cliente: int, include_satellite: bool = True) -> Di
     def fetch_client_info():
         """Fetch client basic info."""
         try:
-            response = _retry_query(
-                lambda: client.table("clienti").select("*").eq("codice_cliente", codice_cliente).single().execute()
-            )
+            response = _select(client, "clienti", "detail", lambda q: q.eq("codice_cliente", codice_cliente).single())
             return ("cliente", response.data if response.data else {})
         except Exception as e:
             logger.error(f"Error fetching client info: {e}")
@@ -415,9 +478,7 @@ def get_client_detail(codice_cliente: int, include_satellite: bool = True) -> Di
     def fetch_abitazioni_info():
         """Fetch client properties."""
         try:
-            response = _retry_query(
-                lambda: client.table("abitazioni").select("*").eq("codice_cliente", codice_cliente).execute()
-            )
+            response = _select(client, "abitazioni", "detail", lambda q: q.eq("codice_cliente", codice_cliente))
             return ("abitazioni", response.data if response.data else [])
         except Exception as e:
             logger.error(f"Error fetching abitazioni info: {e}")
@@ -426,9 +487,7 @@ def get_client_detail(codice_cliente: int, include_satellite: bool = True) -> Di
     def fetch_polizze_info():
         """Fetch client policies."""
         try:
-            response = _retry_query(
-                lambda: client.table("polizze").select("*").eq("codice_cliente", codice_cliente).execute()
-            )
+            response = _select(client, "polizze", "detail", lambda q: q.eq("codice_cliente", codice_cliente))
             return ("polizze", response.data if response.data else [])
         except Exception as e:
             logger.error(f"Error fetching polizze info: {e}")
@@ -437,9 +496,7 @@ def get_client_detail(codice_cliente: int, include_satellite: bool = True) -> Di
     def fetch_sinistri_info():
         """Fetch client claims."""
         try:
-            response = _retry_query(
-                lambda: client.table("sinistri").select("*").eq("codice_cliente", codice_cliente).execute()
-            )
+            response = _select(client, "sinistri", "detail", lambda q: q.eq("codice_cliente", codice_cliente))
             return ("sinistri", response.data if response.data else [])
         except Exception as e:
             logger.error(f"Error fetching sinistri info: {e}")
@@ -449,8 +506,9 @@ def get_client_detail(codice_cliente: int, include_satellite: bool = True) -> Di
         """Fetch satellite analysis data."""
         try:
             # We expect 0 or 1 record per client
-            response = _retry_query(
-                lambda: client.table("client_satellite_images").select("*").eq("codice_cliente", codice_cliente).maybe_single().execute()
+            response = _select(
+                client, "client_satellite_images", "detail",
+                lambda q: q.eq("codice_cliente", codice_cliente).maybe_single()
             )
             return ("satellite", response.data if response.data else {})
         except Exception as e:
@@ -497,8 +555,9 @@ def get_client_satellite(codice_cliente: int) -> Dict:
         return {}
     
     try:
-        response = _retry_query(
-            lambda: client.table("client_satellite_images").select("*").eq("codice_cliente", codice_cliente).maybe_single().execute()
+        response = _select(
+            client, "client_satellite_images", "detail",
+            lambda q: q.eq("codice_cliente", codice_cliente).maybe_single()
         )
         return response.data if response.data else {}
     except Exception as e:
@@ -531,14 +590,13 @@ def search_clients(query: str, limit: int = DB_MAX_SEARCH_RESULTS) -> pd.DataFra
 
     try:
         # Use ilike for case-insensitive search (Supabase handles sanitization)
-        response = _retry_query(
-            lambda: client.table("abitazioni").select(
-                "*, clienti(nome, cognome, churn_probability)"
-            ).or_(
+        response = _select(
+            client, "abitazioni", "search",
+            lambda q: q.or_(
                 f"id.ilike.%{query}%,"
                 f"codice_cliente.ilike.%{query}%,"
                 f"citta.ilike.%{query}%"
-            ).limit(limit).execute()
+            ).limit(limit)
         )
 
         df = pd.DataFrame(response.data)
@@ -615,14 +673,13 @@ def check_client_interactions(codice_cliente: str) -> Dict[str, bool]:
     try:
         # Check emails in last 5 business days
         try:
-            email_response = _retry_query(
-                lambda: client.table("interactions")
-                .select("id")
+            email_response = _select(
+                client, "interactions", "exists",
+                lambda q: q
                 .eq("codice_cliente", cliente_id)
                 .eq("tipo_interazione", "email")
                 .gte("data_interazione", five_business_days.isoformat())
                 .limit(1)
-                .execute()
             )
             indicators['email_last_5_days'] = len(email_response.data) > 0
         except Exception as e:
@@ -630,14 +687,13 @@ def check_client_interactions(codice_cliente: str) -> Dict[str, bool]:
 
         # Check phone calls in last 10 days
         try:
-            call_response = _retry_query(
-                lambda: client.table("interactions")
-                .select("id")
+            call_response = _select(
+                client, "interactions", "exists",
+                lambda q: q
                 .eq("codice_cliente", cliente_id)
                 .eq("tipo_interazione", "telefonata")
                 .gte("data_interazione", ten_days.isoformat())
                 .limit(1)
-                .execute()
             )
             indicators['call_last_10_days'] = len(call_response.data) > 0
         except Exception as e:
@@ -645,13 +701,12 @@ def check_client_interactions(codice_cliente: str) -> Dict[str, bool]:
 
         # Check new policies in last 30 days
         try:
-            policy_response = _retry_query(
-                lambda: client.table("polizze")
-                .select("id")
+            policy_response = _select(
+                client, "polizze", "exists",
+                lambda q: q
                 .eq("codice_cliente", cliente_id)
                 .gte("data_emissione", thirty_days.isoformat())
                 .limit(1)
-                .execute()
             )
             indicators['new_policy_last_30_days'] = len(policy_response.data) > 0
         except Exception as e:
@@ -659,25 +714,23 @@ def check_client_interactions(codice_cliente: str) -> Dict[str, bool]:
 
         # Check open complaints (reclamo with esito NULL or not 'risolto'/'chiuso')
         try:
-            complaint_response = _retry_query(
-                lambda: client.table("interactions")
-                .select("id")
+            complaint_response = _select(
+                client, "interactions", "exists",
+                lambda q: q
                 .eq("codice_cliente", cliente_id)
                 .eq("tipo_interazione", "reclamo")
                 .is_("esito", "null")
                 .limit(1)
-                .execute()
             )
             # If no results with null esito, check for open statuses
             if len(complaint_response.data) == 0:
-                complaint_response = _retry_query(
-                    lambda: client.table("interactions")
-                    .select("id")
+                complaint_response = _select(
+                    client, "interactions", "exists",
+                    lambda q: q
                     .eq("codice_cliente", cliente_id)
                     .eq("tipo_interazione", "reclamo")
                     .not_.in_("esito", ["risolto", "chiuso"])
                     .limit(1)
-                    .execute()
                 )
             indicators['open_complaint'] = len(complaint_response.data) > 0
         except Exception as e:
@@ -685,13 +738,12 @@ def check_client_interactions(codice_cliente: str) -> Dict[str, bool]:
 
         # Check claims in last 60 days
         try:
-            claim_response = _retry_query(
-                lambda: client.table("sinistri")
-                .select("data_sinistro")
+            claim_response = _select(
+                client, "sinistri", "exists",
+                lambda q: q
                 .eq("codice_cliente", cliente_id)
                 .gte("data_sinistro", sixty_days.isoformat())
                 .limit(1)
-                .execute()
             )
             indicators['claim_last_60_days'] = len(claim_response.data) > 0
         except Exception as e:
@@ -722,142 +774,354 @@ def is_client_eligible_for_top20(codice_cliente: str) -> bool:
     return not any(indicators.values())
 
 
-def check_all_clients_interactions_batch(codici_clienti: list) -> Dict[str, Dict[str, bool]]:
+# ═══════════════════════════════════════════════════════════════════════════════
+# INTERACTION INDEX (Top 20 eligibility without per-client queries)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Process-wide event timelines behind the Top 20 eligibility checks
+_interaction_index = InteractionIndex()
+_interaction_index_lock = threading.Lock()
+
+# Time of the last failed first load: while recent, batch checks go straight
+# to the per-chunk queries instead of retrying the full load
+_interaction_index_failed_at: Optional[float] = None
+
+# Timeline sources: table -> (event date column, pagination key, event kind;
+# None = split interactions by tipo_interazione)
+_TIMELINE_SOURCES = {
+    "interactions": ("data_interazione", "id", None),
+    "polizze": ("data_emissione", "id", POLICY),
+    "sinistri": ("data_sinistro", None, CLAIM),
+}
+
+
+def _timeline_events(df: pd.DataFrame, date_col: str):
+    """(clients, dates) columns of a timeline read (empty reads have no columns)."""
+    if df.empty:
+        return [], []
+    return df["codice_cliente"].to_numpy(), df[date_col].astype(str).to_numpy()
+
+
+def _sync_interaction_index(client: Client, index: InteractionIndex, full: bool) -> None:
     """
-    Batch check interactions for multiple clients at once (much faster).
-    Splits into chunks to avoid URL too long errors.
+    Load the event timelines (full) or merge the rows created since the last sync.
 
-    Args:
-        codici_clienti: List of client IDs to check
+    Full loads read the events of the last LOOKBACK_DAYS by event date;
+    deltas read created_at >= watermark (overlaps are dropped by the index).
+    The open complaints are small and always re-read, so resolved ones
+    disappear.
+    """
+    from datetime import datetime, timedelta
+
+    now = time.time()
+    since = (datetime.now() - timedelta(days=LOOKBACK_DAYS + 1)).date().isoformat()
+
+    for table, (date_col, key, kind) in _TIMELINE_SOURCES.items():
+        watermark = None if full else index.watermarks.get(table)
+
+        def where(q, date_col=date_col, table=table, watermark=watermark):
+            if table == "interactions":
+                q = q.in_("tipo_interazione", [EMAIL, CALL])
+            return q.gte("created_at", watermark) if watermark else q.gte(date_col, since)
+
+        df = read_table(
+            client, table, projection(table, "timeline"), key=key,
+            retry=_tracked(table, "timeline"), where=where, wire_format=DB_WIRE_FORMAT
+        )
+        merge = index.add_events if watermark else index.replace_events
+
+        if kind is None:
+            for event_kind in (EMAIL, CALL):
+                rows = df[df["tipo_interazione"] == event_kind] if not df.empty else df
+                merge(event_kind, *_timeline_events(rows, date_col), now=now)
+        else:
+            merge(kind, *_timeline_events(df, date_col), now=now)
+
+        index.watermarks[table] = compute_watermark(df, "created_at") or watermark
+
+    complaints = read_table(
+        client, "interactions", projection("interactions", "complaints"), key="id",
+        retry=_tracked("interactions", "complaints"), wire_format=DB_WIRE_FORMAT,
+        where=lambda q: q.eq("tipo_interazione", "reclamo")
+    )
+    if complaints.empty:
+        index.set_open_complaints([])
+    else:
+        esito = complaints["esito"].fillna("").astype(str)
+        index.set_open_complaints(complaints.loc[~esito.isin(["risolto", "chiuso"]), "codice_cliente"])
+
+    index.refreshed_at = now
+    if full:
+        index.loaded_at = now
+    logger.info(
+        f"Interaction index {'loaded' if full else 'synced'}: "
+        + ", ".join(f"{k}={index.event_count(k)}" for k in (EMAIL, CALL, POLICY, CLAIM))
+    )
+
+
+def get_interaction_index() -> Optional[InteractionIndex]:
+    """
+    Event timelines for the Top 20 eligibility checks.
+
+    Loaded on first use, then synced with a created_at delta at most every
+    INTERACTION_INDEX_REFRESH_SECONDS and fully reloaded every
+    SNAPSHOT_FULL_RESYNC_SECONDS (catches deletes and edited dates). A
+    failed delta keeps serving the last state; a failed first load is not
+    retried for CACHE_TTL_MEDIUM.
 
     Returns:
-        Dictionary mapping codice_cliente -> indicators dict
+        The shared InteractionIndex, or None if it could not be loaded
+        (callers fall back to per-chunk queries)
     """
-    from datetime import datetime, timedelta
+    global _interaction_index_failed_at
 
     client = get_supabase_client()
     if not client:
-        logger.warning("No Supabase client available for batch interaction check")
-        return {cc: {
-            'email_last_5_days': False,
-            'call_last_10_days': False,
-            'new_policy_last_30_days': False,
-            'open_complaint': False,
-            'claim_last_60_days': False
-        } for cc in codici_clienti}
+        return None
 
-    # Convert all client codes to integers
-    cliente_ids = []
-    cliente_map = {}  # Maps integer ID back to original string
+    index = _interaction_index
+    with _interaction_index_lock:
+        now = time.time()
+        if index.refreshed_at is not None and now - index.refreshed_at < INTERACTION_INDEX_REFRESH_SECONDS:
+            return index
+        if (index.loaded_at is None and _interaction_index_failed_at is not None
+                and now - _interaction_index_failed_at < CACHE_TTL_MEDIUM):
+            return None
+
+        full = index.loaded_at is None or now - index.loaded_at >= SNAPSHOT_FULL_RESYNC_SECONDS
+        try:
+            _sync_interaction_index(client, index, full)
+        except Exception as e:
+            if index.loaded_at is None:
+                _interaction_index_failed_at = now
+                logger.warning(f"Could not load the interaction index: {e}")
+                return None
+            logger.warning(f"Interaction index sync failed, serving the last state: {e}")
+            index.refreshed_at = now
+        return index
+
+
+def _indicators_from_index(index: InteractionIndex, codici_clienti: list) -> Dict[str, Dict[str, bool]]:
+    """Batch check answered from the interaction index (no queries)."""
+    cliente_map = {}
     for cc in codici_clienti:
         if isinstance(cc, str) and cc.startswith("CLI_"):
             try:
-                cid = int(cc.replace("CLI_", ""))
-                cliente_ids.append(cid)
-                cliente_map[cid] = cc
+                cliente_map[cc] = int(cc.replace("CLI_", ""))
             except ValueError:
                 logger.warning(f"Could not parse codice_cliente: {cc}")
         else:
-            cliente_ids.append(cc)
             cliente_map[cc] = cc
 
-    now = datetime.now()
-    five_business_days = now - timedelta(days=7)
-    ten_days = now - timedelta(days=10)
-    thirty_days = now - timedelta(days=30)
-    sixty_days = now - timedelta(days=60)
+    by_id = index.indicators_by_client(cliente_map.values())
+    return {cc: by_id[int(cid)] for cc, cid in cliente_map.items()}
 
-    # Initialize results
-    results = {cc: {
+
+def _no_indicators() -> Dict[str, bool]:
+    return {
         'email_last_5_days': False,
         'call_last_10_days': False,
         'new_policy_last_30_days': False,
         'open_complaint': False,
         'claim_last_60_days': False
-    } for cc in codici_clienti}
+    }
+
+
+def _run_chunks(func, chunks: list) -> list:
+    """Run func over the chunks on a bounded thread pool (results in chunk order)."""
+    if len(chunks) <= 1:
+        return [func(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=min(ELIGIBILITY_WORKERS, len(chunks))) as executor:
+        return list(executor.map(func, chunks))
 
-    # Split into chunks to avoid URL too long errors
-    CHUNK_SIZE = 500  # Max clients per query
-    chunks = [cliente_ids[i:i + CHUNK_SIZE] for i in range(0, len(cliente_ids), CHUNK_SIZE)]
-    
-    total_queries = 0
 
+# Time of the last failed get_eligibility_indicators call: while recent,
+# the batch check goes straight to the per-table queries
+_eligibility_rpc_failed_at: Optional[float] = None
+
+
+def _rpc_indicator_chunk(client: Client, chunk: list, windows: Dict[str, str]) -> Dict[int, Dict[str, bool]]:
+    """All five indicators for a chunk of client IDs in one RPC (scripts/sql/eligibility_indicators.sql)."""
+    response = client.rpc("get_eligibility_indicators", {"p_clienti": chunk, **windows}).execute()
+    record_payload("interactions", "eligibility_rpc", response.data)
+    return {
+        row['codice_cliente']: {name: bool(row.get(name)) for name in _no_indicators()}
+        for row in response.data or []
+    }
+
+
+# Table queries issued by _query_indicator_chunk (recent interactions,
+# complaints, policies, claims)
+_QUERIES_PER_CHUNK = 4
+
+
+def _query_indicator_chunk(client: Client, chunk: list, windows: Dict[str, str]) -> Dict[int, Dict[str, bool]]:
+    """Indicators for a chunk of client IDs from four table queries (no RPC installed)."""
+    found = {cid: _no_indicators() for cid in chunk}
+
+    # Query 1: Recent interactions (emails, calls)
     try:
-        # Process each chunk
-        for chunk_idx, chunk in enumerate(chunks):
-            # Batch query 1: All recent interactions (emails, calls, complaints)
-            try:
-                interactions_response = _retry_query(
-                    lambda: client.table("interactions")
-                    .select("codice_cliente, tipo_interazione, data_interazione, esito")
-                    .in_("codice_cliente", chunk)
-                    .gte("data_interazione", five_business_days.isoformat())
-                    .execute()
-                )
-                total_queries += 1
+        interactions_response = _select(
+            client, "interactions", "eligibility",
+            lambda q: q
+            .in_("codice_cliente", chunk)
+            .gte("data_interazione", windows["p_email_since"])
+        )
+        for row in interactions_response.data:
+            indicators = found.get(row['codice_cliente'])
+            if indicators is None:
+                continue
+
+            tipo = row.get('tipo_interazione', '')
+            data = row.get('data_interazione', '')
 
-                for row in interactions_response.data:
-                    cc = cliente_map.get(row['codice_cliente'])
-                    if not cc:
-                        continue
+            # Check emails (last 5 business days)
+            if tipo == 'email' and data >= windows["p_email_since"]:
+                indicators['email_last_5_days'] = True
 
-                    tipo = row.get('tipo_interazione', '')
-                    data = row.get('data_interazione', '')
+            # Check calls (last 10 days)
+            if tipo == 'telefonata' and data >= windows["p_call_since"]:
+                indicators['call_last_10_days'] = True
+    except Exception as e:
+        logger.warning(f"Error in batch interactions check: {e}")
+
+    # Query 2: Open complaints of any age (as the RPC and the interaction index)
+    try:
+        complaints_response = _select(
+            client, "interactions", "complaints",
+            lambda q: q
+            .in_("codice_cliente", chunk)
+            .eq("tipo_interazione", "reclamo")
+        )
+        for row in complaints_response.data:
+            indicators = found.get(row['codice_cliente'])
+            if indicators is None:
+                continue
+            esito = row.get('esito', '')
+            if not esito or esito not in ['risolto', 'chiuso']:
+                indicators['open_complaint'] = True
+    except Exception as e:
+        logger.warning(f"Error in batch complaints check: {e}")
 
-                    # Check emails (last 5 business days)
-                    if tipo == 'email' and data >= five_business_days.isoformat():
-                        results[cc]['email_last_5_days'] = True
+    # Query 3: Recent policies
+    try:
+        policies_response = _select(
+            client, "polizze", "eligibility",
+            lambda q: q
+            .in_("codice_cliente", chunk)
+            .gte("data_emissione", windows["p_policy_since"])
+        )
+        for row in policies_response.data:
+            if row['codice_cliente'] in found:
+                found[row['codice_cliente']]['new_policy_last_30_days'] = True
+    except Exception as e:
+        logger.warning(f"Error in batch policies check: {e}")
 
-                    # Check calls (last 10 days)
-                    if tipo == 'telefonata' and data >= ten_days.isoformat():
-                        results[cc]['call_last_10_days'] = True
+    # Query 4: Recent claims
+    try:
+        claims_response = _select(
+            client, "sinistri", "eligibility",
+            lambda q: q
+            .in_("codice_cliente", chunk)
+            .gte("data_sinistro", windows["p_claim_since"])
+        )
+        for row in claims_response.data:
+            if row['codice_cliente'] in found:
+                found[row['codice_cliente']]['claim_last_60_days'] = True
+    except Exception as e:
+        logger.warning(f"Error in batch claims check: {e}")
 
-                    # Check open complaints
-                    if tipo == 'reclamo':
-                        esito = row.get('esito', '')
-                        if not esito or esito not in ['risolto', 'chiuso']:
-                            results[cc]['open_complaint'] = True
-            except Exception as e:
-                logger.warning(f"Error in batch interactions check (chunk {chunk_idx + 1}/{len(chunks)}): {e}")
+    return found
 
-            # Batch query 2: Recent policies
-            try:
-                policies_response = _retry_query(
-                    lambda: client.table("polizze")
-                    .select("codice_cliente, data_emissione")
-                    .in_("codice_cliente", chunk)
-                    .gte("data_emissione", thirty_days.isoformat())
-                    .execute()
-                )
-                total_queries += 1
 
-                for row in policies_response.data:
-                    cc = cliente_map.get(row['codice_cliente'])
-                    if cc:
-                        results[cc]['new_policy_last_30_days'] = True
-            except Exception as e:
-                logger.warning(f"Error in batch policies check (chunk {chunk_idx + 1}/{len(chunks)}): {e}")
+def _remote_indicators(client: Client, cliente_ids: list) -> Dict[int, Dict[str, bool]]:
+    """
+    Indicators for client IDs from Supabase, chunks running concurrently.
 
-            # Batch query 3: Recent claims
-            try:
-                claims_response = _retry_query(
-                    lambda: client.table("sinistri")
-                    .select("codice_cliente, data_sinistro")
-                    .in_("codice_cliente", chunk)
-                    .gte("data_sinistro", sixty_days.isoformat())
-                    .execute()
-                )
-                total_queries += 1
+    Uses the get_eligibility_indicators RPC (one call per chunk of
+    ELIGIBILITY_RPC_CHUNK_SIZE); if it fails, the chunks of
+    ELIGIBILITY_QUERY_CHUNK_SIZE are checked with four table queries each.
+    """
+    global _eligibility_rpc_failed_at
+    from datetime import datetime, timedelta
+
+    now = datetime.now()
+    windows = {
+        "p_email_since": (now - timedelta(days=7)).isoformat(),  # ~5 business days
+        "p_call_since": (now - timedelta(days=10)).isoformat(),
+        "p_policy_since": (now - timedelta(days=30)).isoformat(),
+        "p_claim_since": (now - timedelta(days=60)).isoformat(),
+    }
+
+    rpc_down = _eligibility_rpc_failed_at is not None and time.time() - _eligibility_rpc_failed_at < CACHE_TTL_MEDIUM
+    if not rpc_down:
+        size = ELIGIBILITY_RPC_CHUNK_SIZE
+        chunks = [cliente_ids[i:i + size] for i in range(0, len(cliente_ids), size)]
+        try:
+            found = {}
+            for part in _run_chunks(lambda chunk: _rpc_indicator_chunk(client, chunk, windows), chunks):
+                found.update(part)
+            logger.info(f"Checked interactions for {len(cliente_ids)} clients with {len(chunks)} RPC calls")
+            return found
+        except Exception as e:
+            _eligibility_rpc_failed_at = time.time()
+            logger.warning(f"RPC get_eligibility_indicators failed, using table queries: {e}")
+
+    size = ELIGIBILITY_QUERY_CHUNK_SIZE
+    chunks = [cliente_ids[i:i + size] for i in range(0, len(cliente_ids), size)]
+    found = {}
+    for part in _run_chunks(lambda chunk: _query_indicator_chunk(client, chunk, windows), chunks):
+        found.update(part)
+    logger.info(f"Checked interactions for {len(cliente_ids)} clients with {len(chunks) * _QUERIES_PER_CHUNK} queries "
+                f"({len(chunks)} concurrent chunks of max {size})")
+    return found
+
+
+def check_all_clients_interactions_batch(codici_clienti: list) -> Dict[str, Dict[str, bool]]:
+    """
+    Batch check interactions for multiple clients at once (much faster).
 
-                for row in claims_response.data:
-                    cc = cliente_map.get(row['codice_cliente'])
-                    if cc:
-                        results[cc]['claim_last_60_days'] = True
-            except Exception as e:
-                logger.warning(f"Error in batch claims check (chunk {chunk_idx + 1}/{len(chunks)}): {e}")
+    Answered from the interaction index when it is loaded (no queries, any
+    number of clients). Otherwise chunks of IDs are checked concurrently,
+    one get_eligibility_indicators RPC per chunk (four table queries per
+    chunk if the function is not installed).
 
-        logger.info(f"Batch checked interactions for {len(codici_clienti)} clients with {total_queries} queries "
-                   f"({len(chunks)} chunks of max {CHUNK_SIZE}) instead of {len(codici_clienti) * 5}")
+    Args:
+        codici_clienti: List of client IDs to check
+
+    Returns:
+        Dictionary mapping codice_cliente -> indicators dict
+    """
+    client = get_supabase_client()
+    if not client:
+        logger.warning("No Supabase client available for batch interaction check")
+        return {cc: _no_indicators() for cc in codici_clienti}
+
+    index = get_interaction_index()
+    if index is not None:
+        return _indicators_from_index(index, codici_clienti)
+
+    # Convert all client codes to integers
+    cliente_ids = []
+    cliente_map = {}  # Maps integer ID back to original string
+    for cc in codici_clienti:
+        if isinstance(cc, str) and cc.startswith("CLI_"):
+            try:
+                cid = int(cc.replace("CLI_", ""))
+                cliente_ids.append(cid)
+                cliente_map[cid] = cc
+            except ValueError:
+                logger.warning(f"Could not parse codice_cliente: {cc}")
+        else:
+            cliente_ids.append(cc)
+            cliente_map[cc] = cc
+
+    results = {cc: _no_indicators() for cc in codici_clienti}
+    try:
+        for cid, indicators in _remote_indicators(client, cliente_ids).items():
+            cc = cliente_map.get(cid)
+            if cc is not None:
+                results[cc] = indicators
         return results
 
     except Exception as e:
@@ -865,6 +1129,33 @@ def check_all_clients_interactions_batch(codici_clienti: list) -> Dict[str, Dict
         return results
 
 
+# Bumped by every interaction written from the app, so rankings filtered on
+# recent interactions (Top 20) are recomputed right after a write
+_eligibility_writes = 0
+_eligibility_lock = threading.Lock()
+
+
+def eligibility_epoch() -> Tuple[int, int]:
+    """
+    Token identifying the current state of the Top 20 eligibility checks.
+
+    Changes when this process writes an interaction or when a
+    ELIGIBILITY_EPOCH_SECONDS window elapses (writes from elsewhere).
+
+    Returns:
+        (writes counter, time window)
+    """
+    with _eligibility_lock:
+        writes = _eligibility_writes
+    return writes, int(time.time() // ELIGIBILITY_EPOCH_SECONDS)
+
+
+def _advance_eligibility_epoch() -> None:
+    global _eligibility_writes
+    with _eligibility_lock:
+        _eligibility_writes += 1
+
+
 def insert_phone_call_interaction(
     codice_cliente: str,
     polizza_proposta: str = None,
@@ -920,13 +1211,18 @@ def insert_phone_call_interaction(
         }
 
         # Use upsert to update if exists, insert if not
-        response = _retry_query(
+        # (returning=minimal: an existing row would otherwise echo its embedding back)
+        _retry_query(
             lambda: client.table("interactions").upsert(
                 interaction_data,
-                on_conflict="dedup_key"
+                on_conflict="dedup_key",
+                returning=ReturnMethod.minimal
             ).execute()
         )
 
+        if _interaction_index.loaded_at is not None:
+            _interaction_index.add_events(CALL, [cliente_id], [today])
+        _advance_eligibility_epoch()
         logger.info(f"Successfully upserted phone call interaction for client {codice_cliente}")
         return True
 
@@ -0,0 +1,125 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS FILTER INDEX                                        ║
+║              Pre-built Categorical Index for the Analytics Filters            ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Built once per data load: every filter column is factorized into integer codes
+and its rows are grouped by code (CSR layout: one stable argsort + offsets), so
+the positions of any value are a contiguous, already sorted slice.
+
+Filtering starts from the smallest posting list and checks the remaining
+columns on their code arrays only, so the cost is proportional to the
+smallest selected group instead of three full-column boolean masks.
+Sorted positions are used rather than per-value bitmaps: with thousands of
+cities, one bitmap per value would cost (n_values x n_rows) bits.
+"""
+
+from typing import Any, Dict, Hashable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class _ColumnIndex(NamedTuple):
+    codes: np.ndarray          # int32 code per row (-1 = missing)
+    values: List[Any]          # sorted distinct values (code -> value)
+    lookup: Dict[Any, int]     # value -> code
+    order: np.ndarray          # row positions grouped by code
+    offsets: np.ndarray        # order[offsets[c]:offsets[c + 1]] = rows with code c
+
+
+class FilterIndex:
+    """
+    Categorical codes + sorted position lists for a fixed set of columns.
+
+    Args:
+        df: Frame to index (positions refer to df.iloc)
+        columns: Columns that can be filtered on
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str]):
+        self.n_rows = len(df)
+        self._columns: Dict[str, _ColumnIndex] = {}
+
+        for col in columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            codes = codes.astype(np.int32, copy=False)
+            valid = codes >= 0
+            counts = np.bincount(codes[valid], minlength=len(uniques))
+            offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            # Stable sort keeps the positions inside each group ascending;
+            # missing values (-1) sort first and are skipped by the offsets
+            order = np.argsort(codes, kind="stable")[len(codes) - int(valid.sum()):]
+            values = uniques.tolist()
+            self._columns[col] = _ColumnIndex(
+                codes=codes,
+                values=values,
+                lookup={v: i for i, v in enumerate(values)},
+                order=order,
+                offsets=offsets,
+            )
+
+    def values(self, column: str) -> List[Any]:
+        """Sorted distinct values of an indexed column."""
+        return list(self._columns[column].values)
+
+    def _postings(self, column: str, code: int) -> np.ndarray:
+        idx = self._columns[column]
+        return idx.order[idx.offsets[code]:idx.offsets[code + 1]]
+
+    def select(self, **filters: Any) -> np.ndarray:
+        """
+        Positions of the rows matching every filter (None = no filter).
+
+        Example:
+            index.select(citta="Milano", risk_category=None, zona_sismica=3)
+
+        Returns:
+            Sorted int64 array of row positions
+        """
+        active: List[Tuple[str, int]] = []
+        for col, value in filters.items():
+            if value is None:
+                continue
+            code = self._columns[col].lookup.get(value)
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            active.append((col, code))
+
+        if not active:
+            return np.arange(self.n_rows, dtype=np.int64)
+
+        # Start from the smallest group, then check the other columns' codes
+        active.sort(key=lambda item: len(self._postings(*item)))
+        positions = self._postings(*active[0])
+        for col, code in active[1:]:
+            positions = positions[self._columns[col].codes[positions] == code]
+        return positions
+
+    @staticmethod
+    def fingerprint(**filters: Any) -> Tuple[Tuple[str, Hashable], ...]:
+        """Hashable key of a filter combination (None filters are dropped)."""
+        return tuple(sorted((k, v) for k, v in filters.items() if v is not None))
+
+
+class IndexedFrame(NamedTuple):
+    """A loaded frame with its filter index and a content version token."""
+    df: pd.DataFrame
+    index: FilterIndex
+    version: str
+
+
+def build_indexed_frame(df: pd.DataFrame, columns: Sequence[str]) -> IndexedFrame:
+    """
+    Index df on columns and compute a version token from its contents.
+
+    The version only changes when the data changes, so caches keyed on it
+    survive reloads that return identical data.
+    """
+    if len(df):
+        digest = int(pd.util.hash_pandas_object(df, index=False).sum()) & 0xFFFFFFFFFFFFFFFF
+    else:
+        digest = 0
+    return IndexedFrame(df=df, index=FilterIndex(df, columns), version=f"{len(df)}-{digest:016x}")
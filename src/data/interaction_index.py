@@ -0,0 +1,165 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS INTERACTION INDEX                                   ║
+║              In-Memory Event Timelines for Top 20 Eligibility                 ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The Top 20 eligibility rules only ask "did client X have an event of type T
+in the last D days" (emails, calls, new policies, claims) plus "does X have an
+open complaint". This index keeps, per event kind, the event dates of every
+client as one sorted CSR layout (clients, offsets, dates), and the set of
+clients with an open complaint. All five indicators for any number of
+clients are then a searchsorted plus a few comparisons.
+
+Events older than LOOKBACK_DAYS are pruned; duplicates (e.g. a delta read
+overlapping its watermark) are dropped when a timeline is rebuilt. Loading
+and incremental refreshes (created_at watermarks) live in db_utils, this
+module stays free of Supabase and Streamlit.
+"""
+
+import time
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Event kinds kept in the index
+EMAIL = 'email'
+CALL = 'telefonata'
+POLICY = 'polizza'
+CLAIM = 'sinistro'
+EVENT_KINDS = (EMAIL, CALL, POLICY, CLAIM)
+
+# Indicator -> (event kind, window in days). The email window approximates
+# 5 business days with 7 calendar days, as the query-based checks do
+WINDOWS = {
+    'email_last_5_days': (EMAIL, 7),
+    'call_last_10_days': (CALL, 10),
+    'new_policy_last_30_days': (POLICY, 30),
+    'claim_last_60_days': (CLAIM, 60),
+}
+OPEN_COMPLAINT = 'open_complaint'
+INDICATORS = ('email_last_5_days', 'call_last_10_days', 'new_policy_last_30_days',
+              OPEN_COMPLAINT, 'claim_last_60_days')
+
+# Oldest event that can still set an indicator
+LOOKBACK_DAYS = max(days for _, days in WINDOWS.values())
+
+_DAY = 86400
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """ISO dates/timestamps -> int64 epoch seconds (-1 where unparseable)."""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors='coerce', format='ISO8601')
+    seconds = (parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    return seconds.fillna(-1).to_numpy(dtype=np.int64)
+
+
+class _Timeline:
+    """Sorted event dates of one kind: client i's dates are dates[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, clients: np.ndarray, dates: np.ndarray):
+        order = np.lexsort((dates, clients))
+        clients, dates = clients[order], dates[order]
+        if len(clients):
+            keep = np.ones(len(clients), dtype=bool)
+            keep[1:] = (clients[1:] != clients[:-1]) | (dates[1:] != dates[:-1])
+            clients, dates = clients[keep], dates[keep]
+        self.events = clients
+        self.dates = dates
+        self.clients, starts = np.unique(clients, return_index=True)
+        self.offsets = np.append(starts, len(clients)).astype(np.int64)
+
+    def latest(self, codes: np.ndarray) -> np.ndarray:
+        """Most recent event date per code (-1 = no event)."""
+        if not len(self.clients):
+            return np.full(len(codes), -1, dtype=np.int64)
+        pos = np.searchsorted(self.clients, codes).clip(max=len(self.clients) - 1)
+        found = self.clients[pos] == codes
+        return np.where(found, self.dates[self.offsets[pos + 1] - 1], -1)
+
+
+class InteractionIndex:
+    """
+    Per-client event timelines and open complaints.
+
+    Thread-safe: writers replace whole timelines under a lock, readers use
+    whatever timeline object they grabbed.
+    """
+
+    def __init__(self):
+        self._timelines: Dict[str, _Timeline] = {
+            kind: _Timeline(np.empty(0, np.int64), np.empty(0, np.int64)) for kind in EVENT_KINDS
+        }
+        self._open_complaints = np.empty(0, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.watermarks: Dict[str, Optional[str]] = {}
+        self.loaded_at: Optional[float] = None
+        self.refreshed_at: Optional[float] = None
+
+    def _merge(self, kind: str, clients, dates, now: Optional[float], keep_current: bool) -> None:
+        clients = np.asarray(clients, dtype=np.int64).reshape(-1)
+        dates = np.asarray(dates)
+        if dates.dtype.kind not in 'iu':
+            dates = to_epoch_seconds(dates)
+        dates = dates.astype(np.int64)
+
+        now = time.time() if now is None else now
+        cutoff = int(now) - LOOKBACK_DAYS * _DAY
+        with self._lock:
+            if keep_current:
+                current = self._timelines[kind]
+                clients = np.concatenate([current.events, clients])
+                dates = np.concatenate([current.dates, dates])
+            keep = dates >= cutoff
+            # Built completely before the swap: readers see the old or the new timeline
+            self._timelines[kind] = _Timeline(clients[keep], dates[keep])
+
+    def add_events(self, kind: str, clients, dates, now: Optional[float] = None) -> None:
+        """
+        Merge events into a kind's timeline (events outside the lookback are dropped).
+
+        Args:
+            kind: One of EVENT_KINDS
+            clients: codice_cliente per event
+            dates: Event dates (ISO strings or epoch seconds)
+        """
+        self._merge(kind, clients, dates, now, keep_current=True)
+
+    def replace_events(self, kind: str, clients, dates, now: Optional[float] = None) -> None:
+        """Replace a kind's timeline with these events in a single swap."""
+        self._merge(kind, clients, dates, now, keep_current=False)
+
+    def set_open_complaints(self, clients: Iterable) -> None:
+        """Replace the set of clients with an open complaint."""
+        self._open_complaints = np.unique(np.asarray(list(clients), dtype=np.int64))
+
+    def event_count(self, kind: str) -> int:
+        """Events currently indexed for a kind."""
+        return len(self._timelines[kind].events)
+
+    def indicators(self, codes, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        All five Top 20 indicators for a batch of clients, in one pass.
+
+        Args:
+            codes: codice_cliente values (e.g. the whole portfolio)
+            now: Reference time (epoch seconds), defaults to time.time()
+
+        Returns:
+            Indicator name -> bool array aligned with codes
+        """
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+        now = int(time.time() if now is None else now)
+        result = {}
+        for name, (kind, days) in WINDOWS.items():
+            result[name] = self._timelines[kind].latest(codes) >= now - days * _DAY
+        result[OPEN_COMPLAINT] = np.isin(codes, self._open_complaints)
+        return {name: result[name] for name in INDICATORS}
+
+    def indicators_by_client(self, codes, now: Optional[float] = None) -> Dict[int, Dict[str, bool]]:
+        """indicators() as codice_cliente -> indicators dict (the batch check format)."""
+        codes = [int(cc) for cc in codes]
+        masks = self.indicators(codes, now=now)
+        return {cc: {name: bool(masks[name][i]) for name in INDICATORS} for i, cc in enumerate(codes)}
@@ -0,0 +1,230 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS COLUMN PROJECTIONS                                  ║
+║              Named Select Lists & Payload Accounting                          ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Central registry of the column lists every Supabase query is allowed to ask
+for. Queries reference a (table, view) pair instead of writing select strings
+inline, so no path can silently fall back to `select("*")` and drag wide
+columns (interactions.embedding, ~1536 floats as text) over the wire.
+
+Every response can be passed to record_payload() to keep a per-view count of
+rows and serialized (JSON or CSV) bytes, exposed through payload_stats().
+"""
+
+import json
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+from src.config.constants import PAYLOAD_METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REGISTRY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_ABITAZIONI_DETAIL: Tuple[str, ...] = (
+    "id", "codice_cliente", "via", "civico", "citta", "cap", "provincia",
+    "indirizzo_completo", "latitudine", "longitudine", "metratura",
+    "sistema_allarme", "zona_sismica", "hydro_risk_p3", "hydro_risk_p2",
+    "flood_risk_p4", "flood_risk_p3", "solar_potential_kwh",
+    "solar_coverage_percent", "solar_savings_euro", "high_solar_potential",
+    "risk_score", "high_risk_property", "risk_category",
+)
+
+_CLIENTI_DETAIL: Tuple[str, ...] = (
+    "codice_cliente", "nome", "cognome", "eta", "luogo_nascita",
+    "luogo_residenza", "professione", "reddito", "reddito_familiare",
+    "numero_figli", "anzianita_compagnia", "stato_civile",
+    "numero_familiari_carico", "reddito_stimato",
+    "patrimonio_finanziario_stimato", "patrimonio_reale_stimato",
+    "consumi_stimati", "propensione_vita", "propensione_danni",
+    "valore_immobiliare_medio", "probabilita_furti", "probabilita_rapine",
+    "zona_residenza", "agenzia", "latitudine", "longitudine", "num_polizze",
+    "engagement_score", "churn_probability", "clv_stimato",
+    "potenziale_crescita", "reclami_totali", "satisfaction_score",
+    "data_ultima_visita", "visite_ultimo_anno", "cluster_risposta",
+)
+
+_POLIZZE_DETAIL: Tuple[str, ...] = (
+    "id", "codice_cliente", "prodotto", "area_bisogno", "data_emissione",
+    "data_scadenza", "premio_ricorrente", "premio_unico",
+    "capitale_rivalutato", "massimale", "stato_polizza",
+    "canale_acquisizione", "premio_totale_annuo", "sinistri_totali",
+)
+
+_SINISTRI_DETAIL: Tuple[str, ...] = (
+    "codice_cliente", "data_sinistro", "tipologia_sinistro", "prodotto",
+    "area_bisogno", "importo_liquidato", "stato_liquidazione",
+)
+
+# Never includes text_embedded / embedding
+_INTERACTIONS_DETAIL: Tuple[str, ...] = (
+    "id", "codice_cliente", "data_interazione", "tipo_interazione",
+    "motivo", "esito", "note",
+)
+
+PROJECTIONS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "abitazioni": {
+        # Map + KPIs (analytics dashboard, snapshot store)
+        "map": (
+            "id", "codice_cliente", "citta", "latitudine", "longitudine",
+            "zona_sismica", "risk_score", "risk_category",
+            "hydro_risk_p3", "flood_risk_p3",
+        ),
+        # Legacy joined fetch (fetch_abitazioni(lite=False), benchmarks)
+        "joined": (
+            "id", "codice_cliente", "citta", "latitudine", "longitudine",
+            "zona_sismica", "risk_score", "risk_category", "clienti(nome,cognome)",
+        ),
+        "search": (
+            "id", "codice_cliente", "citta", "indirizzo_completo",
+            "zona_sismica", "risk_score", "risk_category",
+            "clienti(nome,cognome,churn_probability)",
+        ),
+        "detail": _ABITAZIONI_DETAIL,
+        "iris": _ABITAZIONI_DETAIL,
+        "iris_context": (
+            "risk_score", "risk_category", "zona_sismica", "solar_potential_kwh", "citta",
+        ),
+        "iris_risk": (
+            "risk_score", "risk_category", "zona_sismica", "hydro_risk_p3",
+            "hydro_risk_p2", "flood_risk_p4", "flood_risk_p3", "citta",
+        ),
+        "iris_solar": (
+            "solar_potential_kwh", "solar_savings_euro", "solar_coverage_percent",
+            "latitudine", "longitudine", "citta",
+        ),
+    },
+    "clienti": {
+        "kpi": (
+            "codice_cliente", "nome", "cognome", "churn_probability",
+            "clv_stimato", "num_polizze", "latitudine", "longitudine",
+        ),
+        # Legacy 11-column list (fetch_clienti(lite=False))
+        "full": (
+            "codice_cliente", "nome", "cognome", "eta", "professione", "reddito",
+            "churn_probability", "clv_stimato", "latitudine", "longitudine", "num_polizze",
+        ),
+        "detail": _CLIENTI_DETAIL,
+        "iris": _CLIENTI_DETAIL,
+        "iris_context": (
+            "codice_cliente", "nome", "cognome", "eta", "professione", "reddito",
+            "clv_stimato", "churn_probability", "num_polizze",
+        ),
+    },
+    "polizze": {
+        "detail": _POLIZZE_DETAIL,
+        "iris": _POLIZZE_DETAIL,
+        "exists": ("id",),
+        "eligibility": ("codice_cliente", "data_emissione"),
+        "timeline": ("codice_cliente", "data_emissione", "created_at"),
+    },
+    "sinistri": {
+        "detail": _SINISTRI_DETAIL,
+        "iris": _SINISTRI_DETAIL,
+        "exists": ("data_sinistro",),
+        "eligibility": ("codice_cliente", "data_sinistro"),
+        "timeline": ("codice_cliente", "data_sinistro", "created_at"),
+    },
+    "interactions": {
+        "detail": _INTERACTIONS_DETAIL,
+        "iris": _INTERACTIONS_DETAIL,
+        "iris_recent": ("data_interazione", "tipo_interazione", "esito", "note"),
+        "exists": ("id",),
+        "eligibility": ("codice_cliente", "tipo_interazione", "data_interazione", "esito"),
+        "timeline": ("codice_cliente", "tipo_interazione", "data_interazione", "created_at"),
+        "complaints": ("codice_cliente", "esito"),
+        # Clients with rows newer than the local vector index (src/iris/vector_index.py)
+        "vector_delta": ("id", "codice_cliente"),
+    },
+    "client_satellite_images": {
+        "detail": ("codice_cliente", "image_url", "vlm_analysis"),
+    },
+    # Small static lookup tables without wide columns
+    "ref_seismic_zones": {
+        "reference": ("*",),
+    },
+    "ref_hydrogeological_zones": {
+        "reference": ("*",),
+    },
+}
+
+
+def projection_columns(table: str, view: str) -> Tuple[str, ...]:
+    """
+    Return the registered column tuple for a (table, view) pair.
+
+    Raises:
+        KeyError: If the table or view is not registered
+    """
+    try:
+        return PROJECTIONS[table][view]
+    except KeyError:
+        raise KeyError(f"No projection '{view}' registered for table '{table}'") from None
+
+
+def projection(table: str, view: str) -> str:
+    """Return the PostgREST select string for a (table, view) pair."""
+    return ",".join(projection_columns(table, view))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PAYLOAD ACCOUNTING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_stats_lock = threading.Lock()
+_payload_stats: Dict[str, Dict[str, int]] = {}
+
+
+def record_payload(table: str, view: str, data: Any) -> int:
+    """
+    Account rows and serialized bytes of a query result.
+
+    Args:
+        table: Queried table
+        view: Projection used
+        data: response.data (list of rows, single row dict, CSV text or None)
+
+    Returns:
+        Payload size in bytes (0 when metrics are disabled)
+    """
+    if not PAYLOAD_METRICS_ENABLED:
+        return 0
+
+    if data is None:
+        rows, size = 0, 0
+    elif isinstance(data, str):
+        # text/csv page: header line + one line per row (approximate with
+        # multi-line quoted fields, which the projections avoid)
+        rows = max(data.count("\n"), 0)
+        size = len(data.encode("utf-8"))
+    else:
+        rows = len(data) if isinstance(data, list) else 1
+        size = len(json.dumps(data, default=str, separators=(",", ":")))
+
+    key = f"{table}.{view}"
+    with _stats_lock:
+        entry = _payload_stats.setdefault(key, {"queries": 0, "rows": 0, "bytes": 0})
+        entry["queries"] += 1
+        entry["rows"] += rows
+        entry["bytes"] += size
+
+    logger.debug(f"Payload {key}: {rows} rows, {size} bytes")
+    return size
+
+
+def payload_stats() -> Dict[str, Dict[str, int]]:
+    """Snapshot of the cumulative per-projection payload counters."""
+    with _stats_lock:
+        return {key: dict(entry) for key, entry in _payload_stats.items()}
+
+
+def reset_payload_stats() -> None:
+    """Clear the payload counters."""
+    with _stats_lock:
+        _payload_stats.clear()
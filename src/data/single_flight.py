@@ -0,0 +1,174 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS SINGLE-FLIGHT CACHE                                 ║
+║              Request De-duplication & Stale-While-Revalidate                  ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Process-wide cache for the data-access functions in db_utils.
+
+- Single-flight: only one load per key runs at a time; concurrent callers
+  wait on the same future instead of starting their own download.
+- Stale-while-revalidate: once an entry expires, callers keep getting the
+  previous value while one background refresh runs.
+
+Cached values are shared between sessions: callers must treat them as
+read-only (copy before mutating a DataFrame).
+"""
+
+import time
+import logging
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from src.config.constants import CACHE_REFRESH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for background refreshes (small on purpose: it only runs loaders)
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=CACHE_REFRESH_WORKERS,
+    thread_name_prefix="helios-refresh"
+)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once per key; callers arriving while it runs get the same result.
+
+        Exceptions raised by fn are propagated to every waiting caller.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """True if a load for key is currently running."""
+        with self._lock:
+            return key in self._inflight
+
+
+class StaleWhileRevalidateCache:
+    """
+    TTL cache that serves stale entries while refreshing them in the background.
+
+    Args:
+        ttl: Seconds an entry is considered fresh
+        cache_if: Optional predicate; results failing it are returned but not
+                  stored (e.g. empty DataFrames after a failed fetch), and a
+                  failing background refresh keeps the previous value
+        failure_ttl: If set, results failing cache_if are stored for this
+                     many seconds (when there is no good value to keep), so
+                     an outage is not retried on every call but does not
+                     outlive the short TTL either
+    """
+
+    def __init__(self, ttl: float, cache_if: Optional[Callable[[Any], bool]] = None,
+                 failure_ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.cache_if = cache_if
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Any, float, float]] = {}
+        self._refreshing: Set[Hashable] = set()
+        self._flight = SingleFlight()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        if self.cache_if is None or self.cache_if(value):
+            with self._lock:
+                self._entries[key] = (value, time.monotonic(), self.ttl)
+        elif self.failure_ttl is not None:
+            with self._lock:
+                previous = self._entries.get(key)
+                if previous is None or not self.cache_if(previous[0]):
+                    self._entries[key] = (value, time.monotonic(), self.failure_ttl)
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            self._flight.do(key, lambda: self._load(key, loader))
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, loading or refreshing it as needed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at, ttl = entry
+                if time.monotonic() - loaded_at < ttl:
+                    return value
+
+                # Stale: serve it and make sure exactly one refresh is running
+                # (checked and registered under the same lock)
+                start_refresh = key not in self._refreshing
+                if start_refresh:
+                    self._refreshing.add(key)
+
+        if entry is not None:
+            if start_refresh:
+                try:
+                    _refresh_executor.submit(self._refresh, key, loader)
+                except RuntimeError:
+                    with self._lock:
+                        self._refreshing.discard(key)
+                    raise
+            return value
+
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def clear(self) -> None:
+        """Drop every entry (in-flight loads still complete)."""
+        with self._lock:
+            self._entries.clear()
+
+
+def shared_cache(ttl: float, cache_if: Optional[Callable[[Any], bool]] = None,
+                 failure_ttl: Optional[float] = None):
+    """
+    Decorator: process-wide single-flight + stale-while-revalidate cache.
+
+    Drop-in replacement for st.cache_data on data-access functions. Arguments
+    must be hashable; the wrapped function gains a .clear() method.
+    """
+    def decorator(func):
+        cache = StaleWhileRevalidateCache(ttl, cache_if=cache_if, failure_ttl=failure_ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return cache.get(key, lambda: func(*args, **kwargs))
+
+        wrapper.clear = cache.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,173 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS SNAPSHOT STORE                                      ║
+║              Local Parquet Mirrors with Incremental Sync                      ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Persists table projections (abitazioni, clienti, ...) as Parquet files on disk,
+next to a small JSON sidecar holding the sync watermark. All worker processes
+share the same files, so a cold start only needs one delta query instead of a
+full table scan.
+
+This module only handles the local files; the Supabase queries that feed it
+live in db_utils.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+from typing import Optional, Dict, List
+
+import pandas as pd
+
+from src.config.constants import SNAPSHOT_DIR, SNAPSHOT_FULL_RESYNC_SECONDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional: without it every load is a full fetch
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Directory of Parquet snapshots keyed by a logical name (e.g. "abitazioni.lite").
+
+    Each snapshot is made of two files:
+        <name>.parquet    the rows
+        <name>.meta.json  watermark, column signature and sync timestamps
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+
+    @property
+    def available(self) -> bool:
+        """True if pyarrow is installed and snapshots can be used."""
+        return pq is not None
+
+    def _paths(self, name: str):
+        return (
+            os.path.join(self.root, f"{name}.parquet"),
+            os.path.join(self.root, f"{name}.meta.json"),
+        )
+
+    def read_meta(self, name: str) -> Dict:
+        """Return the sidecar metadata of a snapshot ({} if missing or unreadable)."""
+        _, meta_path = self._paths(name)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def read(self, name: str, columns: List[str]) -> Optional[pd.DataFrame]:
+        """
+        Read a snapshot memory-mapped.
+
+        Args:
+            name: Snapshot name
+            columns: Expected column signature; a snapshot written with a
+                     different projection is treated as missing
+
+        Returns:
+            DataFrame, or None if the snapshot is missing, stale or unreadable
+        """
+        if not self.available:
+            return None
+
+        data_path, _ = self._paths(name)
+        meta = self.read_meta(name)
+        if not meta or not os.path.exists(data_path):
+            return None
+
+        if meta.get("columns") != list(columns):
+            logger.info(f"Snapshot {name} has a different projection, ignoring it")
+            return None
+
+        try:
+            return pq.read_table(data_path, memory_map=True).to_pandas()
+        except Exception as e:
+            logger.warning(f"Could not read snapshot {name}: {e}")
+            return None
+
+    def needs_full_resync(self, name: str) -> bool:
+        """True if the last full sync is older than SNAPSHOT_FULL_RESYNC_SECONDS."""
+        meta = self.read_meta(name)
+        last_full = meta.get("full_synced_at", 0)
+        return (time.time() - last_full) > SNAPSHOT_FULL_RESYNC_SECONDS
+
+    def write(self, name: str, df: pd.DataFrame, columns: List[str],
+              watermark: Optional[str], full_sync: bool) -> bool:
+        """
+        Atomically replace a snapshot and its metadata.
+
+        Files are written to a temporary path and moved into place, so readers
+        in other processes never observe a half-written file.
+
+        Returns:
+            True if the snapshot was written
+        """
+        if not self.available:
+            return False
+
+        data_path, meta_path = self._paths(name)
+        previous = self.read_meta(name)
+        now = time.time()
+        meta = {
+            "columns": list(columns),
+            "watermark": watermark,
+            "rows": int(len(df)),
+            "synced_at": now,
+            "full_synced_at": now if full_sync else previous.get("full_synced_at", now),
+        }
+
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+
+            fd, tmp_data = tempfile.mkstemp(dir=self.root, suffix=".parquet.tmp")
+            os.close(fd)
+            pq.write_table(table, tmp_data)
+
+            fd, tmp_meta = tempfile.mkstemp(dir=self.root, suffix=".meta.tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            os.replace(tmp_data, data_path)
+            os.replace(tmp_meta, meta_path)
+            logger.info(f"Snapshot {name} written ({len(df)} rows, watermark={watermark})")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not write snapshot {name}: {e}")
+            return False
+
+
+def merge_delta(base: pd.DataFrame, delta: pd.DataFrame, key: str) -> pd.DataFrame:
+    """
+    Upsert delta rows into a snapshot frame.
+
+    Rows of `delta` replace rows of `base` with the same key; new keys are appended.
+    """
+    if delta is None or delta.empty:
+        return base
+    if base is None or base.empty:
+        return delta.reset_index(drop=True)
+
+    merged = pd.concat([base[~base[key].isin(delta[key])], delta], ignore_index=True)
+    return merged
+
+
+def compute_watermark(df: pd.DataFrame, column: str) -> Optional[str]:
+    """Highest value of the watermark column, as returned by PostgREST (ISO string)."""
+    if df is None or df.empty or column not in df.columns:
+        return None
+    values = df[column].dropna()
+    if values.empty:
+        return None
+    return str(values.astype(str).max())
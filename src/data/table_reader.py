@@ -0,0 +1,196 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS TABLE READER                                        ║
+║              Keyset-Paginated Streaming Reads from Supabase                   ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Pages through a table on its primary key (`key > last_key order by key limit N`)
+instead of count + offset chunks: every page is an index range scan, so deep
+pages cost the same as the first one and no `count="exact"` scan is needed.
+
+Pages can be requested as JSON (row dicts) or as text/csv, which is parsed
+straight into a DataFrame by the pandas C parser.
+
+Kept free of Streamlit so offline scripts (generate_nbo_master.py) can share it.
+"""
+
+import io
+import logging
+from typing import Optional, Callable, Iterator, List, Dict
+
+import pandas as pd
+
+from src.config.constants import DB_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Supported PostgREST response encodings for bulk reads
+WIRE_FORMATS = ("json", "csv")
+
+
+def _top_level_columns(columns: str) -> List[str]:
+    """Split a PostgREST select string on commas outside embedded resources."""
+    names, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            names.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        names.append(current.strip())
+    return names
+
+
+def _last_key(page, key: str):
+    """Key value of the last row of a page (list of dicts or DataFrame)."""
+    if isinstance(page, pd.DataFrame):
+        value = page[key].iloc[-1]
+        return value.item() if hasattr(value, "item") else value
+    return page[-1][key]
+
+
+def _paginate(
+    client,
+    table: str,
+    columns: str,
+    key: Optional[str],
+    page_size: int,
+    where: Optional[Callable],
+    fetch: Callable
+) -> Iterator:
+    """Shared keyset/offset pagination loop; fetch(query) returns one page."""
+    if key and columns != "*" and key not in _top_level_columns(columns):
+        columns = f"{columns},{key}"
+
+    last_key = None
+    offset = 0
+
+    while True:
+        query = client.table(table).select(columns)
+        if where:
+            query = where(query)
+
+        if key:
+            if last_key is not None:
+                query = query.gt(key, last_key)
+            query = query.order(key).limit(page_size)
+        else:
+            query = query.range(offset, offset + page_size - 1)
+
+        page = fetch(query)
+        if len(page) == 0:
+            break
+
+        yield page
+
+        if len(page) < page_size:
+            break
+        if key:
+            last_key = _last_key(page, key)
+        else:
+            offset += page_size
+
+
+def iter_table_pages(
+    client,
+    table: str,
+    columns: str = "*",
+    key: Optional[str] = "id",
+    page_size: int = DB_CHUNK_SIZE,
+    where: Optional[Callable] = None,
+    retry: Optional[Callable] = None
+) -> Iterator[List[Dict]]:
+    """
+    Yield raw record pages of a table as they arrive.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        columns: PostgREST select string (the key column is added if missing)
+        key: Unique, sortable column to page on. None falls back to offset
+             pagination for tables without a primary key (e.g. sinistri)
+        page_size: Rows per request
+        where: Optional function applying filters to the query builder,
+               e.g. lambda q: q.gte("updated_at", watermark)
+        retry: Optional wrapper called as retry(fn) around every request
+
+    Yields:
+        Lists of row dicts, one per page
+    """
+    run = retry or (lambda fn: fn())
+    yield from _paginate(
+        client, table, columns, key, page_size, where,
+        fetch=lambda query: run(query.execute).data or []
+    )
+
+
+def _read_csv_page(query, run) -> pd.DataFrame:
+    """Request one page as text/csv and parse it with the pandas C parser."""
+    text = run(query.csv().execute).data
+    if not text:
+        return pd.DataFrame()
+    return pd.read_csv(io.StringIO(text))
+
+
+def iter_table_batches(
+    client,
+    table: str,
+    columns: str = "*",
+    wire_format: str = "json",
+    **kwargs
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield one DataFrame per page.
+
+    Accepts the same keyword arguments as iter_table_pages.
+
+    Args:
+        wire_format: "json" converts each page of dicts and releases it, so at
+                     most one page of Python objects is alive at a time.
+                     "csv" asks PostgREST for text/csv and parses it directly,
+                     never building row dicts. Selects with embedded resources
+                     (e.g. clienti(nome,cognome)) always use JSON, since
+                     PostgREST renders them as JSON inside the CSV cell.
+    """
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown wire format '{wire_format}' (expected one of {WIRE_FORMATS})")
+
+    if wire_format == "csv" and "(" not in columns:
+        run = kwargs.pop("retry", None) or (lambda fn: fn())
+        yield from _paginate(
+            client, table, columns,
+            kwargs.pop("key", "id"),
+            kwargs.pop("page_size", DB_CHUNK_SIZE),
+            kwargs.pop("where", None),
+            fetch=lambda query: _read_csv_page(query, run)
+        )
+        return
+
+    for rows in iter_table_pages(client, table, columns, **kwargs):
+        yield pd.DataFrame(rows)
+
+
+def read_table(client, table: str, columns: str = "*", **kwargs) -> pd.DataFrame:
+    """
+    Read a whole table projection into a single DataFrame.
+
+    Accepts the same keyword arguments as iter_table_batches.
+
+    Returns:
+        DataFrame with all rows (empty DataFrame if the table is empty)
+    """
+    batches = []
+    total = 0
+    for batch in iter_table_batches(client, table, columns, **kwargs):
+        batches.append(batch)
+        total += len(batch)
+        logger.debug(f"Read {total} rows from {table}")
+
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
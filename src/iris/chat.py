@@ -7,7 +7,7 @@
 
 import os
 import streamlit as st
-from typing import Dict
+from typing import Dict, Iterator
 from dotenv import load_dotenv
 
 # Import will be deferred to init_iris_engine for lazy loading
@@ -18,7 +18,7 @@ load_dotenv()
 
 
 
-IRIS_VERSION = "1.0"  # Increment to force reload
+IRIS_VERSION = "1.1"  # Increment to force reload
 
 def init_iris_engine() -> None:
     """Initialize Iris engine with Supabase connection."""
@@ -241,21 +241,31 @@ def render_iris_chat() -> None:
         
         # Get response
         with st.chat_message("assistant", avatar="☀️"):
-            # Placeholder for typing animation
-            message_placeholder = st.empty()
-            message_placeholder.markdown("""
+            # Placeholder for typing animation (until the first token)
+            typing_placeholder = st.empty()
+            typing_placeholder.markdown("""
                 <div class="typing-indicator">
                     <div class="typing-dot"></div>
                     <div class="typing-dot"></div>
                     <div class="typing-dot"></div>
                 </div>
             """, unsafe_allow_html=True)
-            
-            # Generate response
-            result = get_iris_response(prompt)
-            response = result.get("response", "Errore di elaborazione.")
+            message_placeholder = st.empty()
+
+            # Stream the response as it is generated
+            result: Dict = {}
 
-            # Overwrite placeholder with response
+            def chunks() -> Iterator[str]:
+                for chunk in stream_iris_response(prompt, result):
+                    typing_placeholder.empty()
+                    yield chunk
+                typing_placeholder.empty()
+
+            with message_placeholder.container():
+                st.write_stream(chunks())
+            response = result.get("response") or "Errore di elaborazione."
+
+            # Overwrite the streamed text with the final (sanitized) response
             message_placeholder.markdown(response)
 
             # Add to history
@@ -295,6 +305,45 @@ def get_iris_response(prompt: str) -> Dict:
     }
 
 
+def stream_iris_response(prompt: str, result: Dict) -> Iterator[str]:
+    """
+    Stream the response from Iris - tries Python engine, falls back to local.
+
+    Args:
+        prompt: User's message
+        result: Filled with the final response dict (see get_iris_response)
+
+    Yields:
+        Text chunks as the model generates them
+    """
+    client_id = st.session_state.get("selected_client_id")
+    # Exclude the last message (current prompt) from history because the engine adds it again with context
+    history = st.session_state.iris_messages[:-1] if st.session_state.iris_messages else []
+
+    # Try Python engine
+    if st.session_state.get("iris_engine"):
+        try:
+            yield from st.session_state.iris_engine.chat_stream(
+                message=prompt,
+                client_id=client_id,
+                history=history,
+                result=result
+            )
+
+            if result.get("success"):
+                return
+        except Exception as e:
+            st.error(f"Iris Engine error: {e}")
+
+    # Fallback to local response
+    result.update({
+        "response": get_local_response(prompt),
+        "tools_used": [],
+        "success": True
+    })
+    yield result["response"]
+
+
 def get_welcome_message() -> str:
     """Generate welcome message for Iris chatbot."""
     return """Ciao! Sono **Iris**, il tuo Intelligent Advisor. 🌞
@@ -0,0 +1,137 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS EMBEDDING CACHE                                     ║
+║              Two-Level Cache of RAG Query Embeddings                          ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Agents ask doc_retriever_rag the same few questions ("Ci sono stati problemi
+recenti?", "storico reclami") for thousands of clients, and each one used to
+cost an embeddings round trip. Query vectors are cached by model name and
+normalized query text (case-folded, whitespace collapsed):
+
+    1. an in-process LRU (EMBEDDING_CACHE_SIZE vectors)
+    2. one float32 .npy file per query under EMBEDDING_CACHE_DIR/<model>/,
+       shared by every worker process and kept across restarts
+
+Disk files are written through a temporary file and moved into place;
+disk errors are logged and only cost the cache hit.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from src.config.constants import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key text: NFKC, case-folded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class EmbeddingCache:
+    """
+    Query embeddings keyed by (model, normalized text).
+
+    Args:
+        root: Directory of the on-disk store (None = memory only)
+        max_entries: Vectors kept in the in-process LRU
+    """
+
+    def __init__(self, root: Optional[str] = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.root = root
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _path(self, model: str, text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, re.sub(r"[^\w.-]", "_", model), f"{digest}.npy")
+
+    def _remember(self, key: tuple, vector: np.ndarray) -> None:
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, model: str, query: str) -> Optional[np.ndarray]:
+        """Cached vector of a query (memory, then disk), or None."""
+        key = (model, normalize_query(query))
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector
+
+        if self.root:
+            try:
+                vector = np.load(self._path(*key))
+            except FileNotFoundError:
+                vector = None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read cached embedding: {e}")
+                vector = None
+            if vector is not None:
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return vector
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, model: str, query: str, vector: Sequence[float]) -> np.ndarray:
+        """Store a query vector in both levels; returns it as read-only float32."""
+        key = (model, normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32).copy()
+        vector.setflags(write=False)
+        self._remember(key, vector)
+
+        if self.root:
+            path = self._path(*key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, vector)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not write cached embedding: {e}")
+        return vector
+
+    def get_or_compute(self, model: str, query: str, compute: Callable[[str], Sequence[float]]) -> np.ndarray:
+        """
+        Cached vector of a query, computing and storing it on a miss.
+
+        Args:
+            model: Embedding model name (part of the key)
+            query: Query text
+            compute: Called with the normalized query text on a miss
+
+        Returns:
+            Read-only float32 vector
+        """
+        vector = self.get(model, query)
+        if vector is None:
+            vector = self.put(model, query, compute(normalize_query(query)))
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        """Hit / miss counters."""
+        with self._lock:
+            return dict(self._stats, entries=len(self._lru))
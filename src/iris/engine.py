@@ -8,13 +8,18 @@ Implementazione Python completa di Iris con:
 - Integrazione OpenRouter (Claude 3.5 Sonnet)
 - 6 Tools: Client Profile, Policies, Risk, Solar, RAG, Premium
 - Gestione conversazione multi-turn
+- Streaming SSE delle risposte (chat_stream)
+- Esecuzione parallela dei tool con timeout (pool condiviso)
+- Cache degli embedding delle query RAG (memoria + disco)
 """
 
 import os
 import json
 import re
-import requests
-from typing import Optional, Dict, List, Any
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, List, Any, Iterator
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -46,12 +51,21 @@ from src.config.constants import (
     SOLAR_SYSTEM_COST_EUR,
     SOLAR_LATITUDE_NORTH_THRESHOLD,
     SOLAR_LATITUDE_CENTER_THRESHOLD,
-    API_TIMEOUT_DEFAULT,
-    API_TIMEOUT_EMBEDDING,
+    IRIS_TOOL_WORKERS,
+    IRIS_TOOL_TIMEOUT_DEFAULT,
+    IRIS_TOOL_TIMEOUTS,
+    IRIS_TOOL_QUEUE_TIMEOUT,
+    VECTOR_INDEX_CHECK_SECONDS,
+    VECTOR_INDEX_MAX_AGE_SECONDS,
+    VECTOR_INDEX_MAX_DELTA,
     MAX_CONVERSATION_HISTORY,
     IRIS_SYSTEM_PROMPT,
     get_seismic_zone_info,
 )
+from src.data.projections import projection, record_payload
+from src.iris.embedding_cache import EmbeddingCache
+from src.iris.vector_index import get_vector_index
+from src.utils import http_client
 
 load_dotenv()
 
@@ -61,6 +75,69 @@ print("🔄 IRIS_ENGINE.PY LOADED - PRODUCTION VERSION")
 print("=" * 80)
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# TOOL EXECUTION POOL & LATENCY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Shared by every engine (one per chat session), so concurrent turns cannot
+# open more than IRIS_TOOL_WORKERS Supabase / embedding calls at once. A
+# running tool cannot be cancelled: workers are freed by the I/O timeouts
+# of the Supabase client (SUPABASE_TIMEOUT) and of http_client
+_tool_pool = ThreadPoolExecutor(max_workers=IRIS_TOOL_WORKERS, thread_name_prefix="iris-tool")
+
+# RAG query embeddings, shared by every engine
+_embedding_cache = EmbeddingCache()
+
+# Clients with interactions created after the local vector index watermark:
+# their RAG searches go to the RPC until the index is rebuilt. Checked at most
+# every VECTOR_INDEX_CHECK_SECONDS per index version, shared by every engine.
+# The lock only guards the dict: one caller runs the query ("refreshing")
+# while the others keep using the previous answer
+_vector_delta_lock = threading.Lock()
+_vector_delta: Dict[str, Any] = {"version": None, "checked_at": 0.0, "clients": None, "refreshing": False}
+
+_tool_stats_lock = threading.Lock()
+_tool_stats: Dict[str, Dict[str, float]] = {}
+
+
+class _ToolRun:
+    """Start signal of a submitted tool call (its timeout counts from here)."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.started_at: Optional[float] = None
+
+
+def _timed_call(func, kwargs: Dict, run: _ToolRun) -> tuple:
+    """Run a tool, returning (result, seconds)."""
+    run.started_at = time.monotonic()
+    run.started.set()
+    start = time.perf_counter()
+    result = func(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def _record_tool_latency(tool: str, seconds: float, timed_out: bool = False) -> None:
+    with _tool_stats_lock:
+        entry = _tool_stats.setdefault(tool, {"calls": 0, "timeouts": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        entry["calls"] += 1
+        entry["timeouts"] += int(timed_out)
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+
+def tool_stats() -> Dict[str, Dict[str, float]]:
+    """Snapshot of the cumulative per-tool call counts and latencies."""
+    with _tool_stats_lock:
+        return {tool: dict(entry) for tool, entry in _tool_stats.items()}
+
+
+def reset_tool_stats() -> None:
+    """Clear the tool latency counters."""
+    with _tool_stats_lock:
+        _tool_stats.clear()
+
+
 class IrisEngine:
     """
     Core engine per Iris - Gestisce AI, tools e conversazione.
@@ -71,6 +148,7 @@ class IrisEngine:
         self.supabase = supabase_client
         self.openrouter_key = os.getenv("OPENROUTER_API_KEY")
         self.model = "anthropic/claude-3.5-sonnet"
+        self.embedding_model = "openai/text-embedding-3-small"
         print(f"🔑 OpenRouter API Key present: {bool(self.openrouter_key)}")
         print(f"📡 Model: {self.model}")
         
@@ -293,10 +371,7 @@ class IrisEngine:
         
         try:
             # Query client data
-            response = self.supabase.table("clienti").select(
-                "codice_cliente, nome, cognome, eta, professione, reddito, "
-                "clv_stimato, churn_probability, num_polizze"
-            ).eq("codice_cliente", client_id).single().execute()
+            response = self._select("clienti", "iris_context", lambda q: q.eq("codice_cliente", client_id).single())
             
             if not response.data:
                 return ""
@@ -304,9 +379,7 @@ class IrisEngine:
             client = response.data
             
             # Query abitazione
-            abit_response = self.supabase.table("abitazioni").select(
-                "risk_score, risk_category, zona_sismica, solar_potential_kwh, citta"
-            ).eq("codice_cliente", client_id).execute()
+            abit_response = self._select("abitazioni", "iris_context", lambda q: q.eq("codice_cliente", client_id))
             
             abit = abit_response.data[0] if abit_response.data else {}
             
@@ -354,56 +427,205 @@ CONTESTO CLIENTE:
         
         return messages
     
+    def _chat_request(self, messages: List[Dict]) -> Dict[str, Any]:
+        """URL, headers and payload of an OpenRouter chat completion."""
+        return {
+            "url": "https://openrouter.ai/api/v1/chat/completions",
+            "headers": {
+                "Authorization": f"Bearer {self.openrouter_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://helios-project.local",
+                "X-Title": "Helios Iris"
+            },
+            "json": {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": self._get_system_prompt()
+                    }
+                ] + messages,
+                "tools": self.tool_definitions,
+                "temperature": 0.3,
+                "max_tokens": 2000
+            }
+        }
+
     def _call_claude(self, messages: List[Dict]) -> Dict:
         """Call OpenRouter/Claude API."""
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        headers = {
-            "Authorization": f"Bearer {self.openrouter_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://helios-project.local",
-            "X-Title": "Helios Iris"
-        }
-        
-        payload = {
-            "model": self.model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": self._get_system_prompt()
-                }
-            ] + messages,
-            "tools": self.tool_definitions,
-            "temperature": 0.3,
-            "max_tokens": 2000
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=API_TIMEOUT_DEFAULT)
+        response = http_client.post("chat", **self._chat_request(messages))
         response.raise_for_status()
         
         return response.json()
+
+    def _stream_claude(self, messages: List[Dict]) -> Iterator[Dict]:
+        """Call OpenRouter/Claude API with stream=True and yield the SSE chunks."""
+        request = self._chat_request(messages)
+        request["json"]["stream"] = True
+
+        with http_client.post("chat", **request, stream=True) as response:
+            response.raise_for_status()
+            for raw in response.iter_lines():
+                line = raw.decode("utf-8")
+                # Skip keep-alives and comments (": OPENROUTER PROCESSING")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    error = chunk["error"]
+                    raise RuntimeError(error.get("message", error) if isinstance(error, dict) else error)
+                yield chunk
+
+    def _stream_turn(self, messages: List[Dict], turn: Dict) -> Iterator[str]:
+        """
+        Stream one completion, yielding its text deltas.
+
+        Tool-call deltas are assembled by index (id and name arrive first,
+        arguments in fragments). Once exhausted, turn holds "message" (the
+        assistant message, with tool_calls if any) and "finish_reason".
+        """
+        text = []
+        calls: Dict[int, Dict] = {}
+        finish_reason = None
+
+        for chunk in self._stream_claude(messages):
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta") or {}
+                if delta.get("content"):
+                    text.append(delta["content"])
+                    yield delta["content"]
+                for tool_call in delta.get("tool_calls") or []:
+                    call = calls.setdefault(tool_call.get("index", len(calls)), {
+                        "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                    })
+                    call["id"] = tool_call.get("id") or call["id"]
+                    function = tool_call.get("function") or {}
+                    call["function"]["name"] += function.get("name") or ""
+                    call["function"]["arguments"] += function.get("arguments") or ""
+                finish_reason = choice.get("finish_reason") or finish_reason
+
+        message = {"role": "assistant", "content": "".join(text) or None}
+        if calls:
+            message["tool_calls"] = [calls[i] for i in sorted(calls)]
+        turn["message"] = message
+        turn["finish_reason"] = finish_reason
+
+    def chat_stream(self, message: str, client_id: Optional[int] = None,
+                    history: Optional[List[Dict]] = None, result: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Streaming variant of chat(): yields the answer as text chunks.
+
+        Text is yielded as the model generates it. If the model asks for
+        tools, they run once the first completion ends and the final answer
+        is streamed from the follow-up completion.
+
+        Args:
+            message: User message
+            client_id: Optional client ID for context
+            history: Conversation history
+            result: Filled with the keys chat() returns once the stream is
+                    exhausted; its response is sanitized, so it can differ
+                    from the raw streamed text
+
+        Yields:
+            Text chunks
+        """
+        result = {} if result is None else result
+        try:
+            context = self._build_context(client_id)
+            messages = self._build_messages(message, context, history)
+
+            turn: Dict = {}
+            yield from self._stream_turn(messages, turn)
+
+            tools_used = []
+            tool_calls = turn["message"].get("tool_calls")
+            if tool_calls:
+                print(f"[DEBUG] Tool calls detected: {[tc['function']['name'] for tc in tool_calls]}")
+                tools_used = [tc["function"]["name"] for tc in tool_calls]
+                messages.append(turn["message"])
+                messages.extend(self._run_tool_calls(turn["message"]))
+                if turn["message"]["content"]:
+                    yield "\n\n"
+                turn = {}
+                yield from self._stream_turn(messages, turn)
+
+            result.update({
+                "success": True,
+                "response": self._sanitize_response(turn["message"]["content"] or "Nessuna risposta generata."),
+                "tools_used": tools_used,
+                "timestamp": datetime.now().isoformat()
+            })
+
+        except Exception as e:
+            result.update({
+                "success": False,
+                "response": f"⚠️ Errore: {str(e)}",
+                "tools_used": [],
+                "error": str(e)
+            })
+
+    def _run_tool_calls(self, message: Dict) -> List[Dict]:
+        """
+        Execute the tool calls of an assistant message, returning the tool messages.
+
+        The calls run concurrently on the shared tool pool, so a multi-tool
+        turn costs the slowest tool instead of the sum. Each call has its own
+        timeout (IRIS_TOOL_TIMEOUTS), counted from when it starts running; a
+        call still queued after IRIS_TOOL_QUEUE_TIMEOUT is cancelled. Either
+        way the model gets an error for that call. Tool messages keep the
+        order of the tool calls.
+        """
+        pending = []
+
+        # Submit each tool
+        for tool_call in message.get("tool_calls", []):
+            tool_name = tool_call.get("function", {}).get("name")
+            tool_args = json.loads(tool_call.get("function", {}).get("arguments") or "{}")
+            
+            if tool_name in self.tools:
+                timeout = IRIS_TOOL_TIMEOUTS.get(tool_name, IRIS_TOOL_TIMEOUT_DEFAULT)
+                run = _ToolRun()
+                future = _tool_pool.submit(_timed_call, self.tools[tool_name], tool_args, run)
+                pending.append((tool_call, tool_name, timeout, run, future))
+
+        # Collect the results in tool call order
+        queue_deadline = time.monotonic() + IRIS_TOOL_QUEUE_TIMEOUT
+        tool_results = []
+        for tool_call, tool_name, timeout, run, future in pending:
+            started = run.started.wait(max(0.0, queue_deadline - time.monotonic()))
+            if not started and future.cancel():
+                _record_tool_latency(tool_name, 0.0, timed_out=True)
+                print(f"[ERROR] Tool {tool_name} still queued after {IRIS_TOOL_QUEUE_TIMEOUT}s")
+                result = {"error": f"Timeout: {tool_name} non è partito entro {IRIS_TOOL_QUEUE_TIMEOUT} secondi (strumenti occupati)"}
+            else:
+                run.started.wait()
+                try:
+                    result, seconds = future.result(timeout=max(0.0, run.started_at + timeout - time.monotonic()))
+                    _record_tool_latency(tool_name, seconds)
+                    print(f"[DEBUG] Tool {tool_name} took {seconds * 1000:.0f} ms")
+                except FutureTimeoutError:
+                    _record_tool_latency(tool_name, timeout, timed_out=True)
+                    print(f"[ERROR] Tool {tool_name} timed out after {timeout}s")
+                    result = {"error": f"Timeout: {tool_name} non ha risposto entro {timeout} secondi"}
+
+            tool_results.append({
+                "role": "tool",
+                "tool_call_id": tool_call.get("id"),
+                "content": json.dumps(result)
+            })
+
+        return tool_results
     
     def _process_tool_calls(self, response: Dict, messages: List[Dict]) -> Dict:
         """Process tool calls and get final response."""
-        tool_results = []
-        
         # Extract tool calls from response
         choice = response.get("choices", [{}])[0]
         message = choice.get("message", {})
-        tool_calls = message.get("tool_calls", [])
-        
-        # Execute each tool
-        for tool_call in tool_calls:
-            tool_name = tool_call.get("function", {}).get("name")
-            tool_args = json.loads(tool_call.get("function", {}).get("arguments", "{}"))
-            
-            if tool_name in self.tools:
-                result = self.tools[tool_name](**tool_args)
-                tool_results.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.get("id"),
-                    "content": json.dumps(result)
-                })
+        tool_results = self._run_tool_calls(message)
         
         # Call Claude again with tool results
         messages.append(message)
@@ -479,14 +701,20 @@ CONTESTO CLIENTE:
     # ========================================================================
     # TOOLS IMPLEMENTATION
     # ========================================================================
+
+    def _select(self, table: str, view: str, build):
+        """Run a query on a registered projection and record its payload size."""
+        response = build(self.supabase.table(table).select(projection(table, view))).execute()
+        record_payload(table, view, response.data)
+        return response
     
     def tool_client_profile(self, client_id: int) -> Dict:
         """Tool: Get client profile."""
         print(f"[DEBUG] Executing tool_client_profile for {client_id}")
         try:
             # Simple direct queries for reliability
-            client = self.supabase.table("clienti").select("*").eq("codice_cliente", client_id).single().execute()
-            abit = self.supabase.table("abitazioni").select("*").eq("codice_cliente", client_id).execute()
+            client = self._select("clienti", "iris", lambda q: q.eq("codice_cliente", client_id).single())
+            abit = self._select("abitazioni", "iris", lambda q: q.eq("codice_cliente", client_id))
             
             return {
                 "profile": {
@@ -504,7 +732,7 @@ CONTESTO CLIENTE:
         print(f"[DEBUG] Executing tool_policy_status for {client_id}")
         try:
             # Query all policies for this client
-            response = self.supabase.table("polizze").select("*").eq("codice_cliente", client_id).execute()
+            response = self._select("polizze", "iris", lambda q: q.eq("codice_cliente", client_id))
 
             print(f"[DEBUG] Found {len(response.data)} policies in database")
 
@@ -548,10 +776,7 @@ CONTESTO CLIENTE:
         """Tool: Assess property risk."""
         print(f"[DEBUG] Executing tool_risk_assessment for {client_id}")
         try:
-            response = self.supabase.table("abitazioni").select(
-                "risk_score, risk_category, zona_sismica, "
-                "hydro_risk_p3, hydro_risk_p2, flood_risk_p4, flood_risk_p3, citta"
-            ).eq("codice_cliente", client_id).single().execute()
+            response = self._select("abitazioni", "iris_risk", lambda q: q.eq("codice_cliente", client_id).single())
             
             data = response.data
 
@@ -596,10 +821,7 @@ CONTESTO CLIENTE:
         """Tool: Calculate solar potential."""
         print(f"[DEBUG] Executing tool_solar_potential for {client_id}")
         try:
-            response = self.supabase.table("abitazioni").select(
-                "solar_potential_kwh, solar_savings_euro, solar_coverage_percent, "
-                "latitudine, longitudine, citta"
-            ).eq("codice_cliente", client_id).single().execute()
+            response = self._select("abitazioni", "iris_solar", lambda q: q.eq("codice_cliente", client_id).single())
             
             data = response.data
             
@@ -638,68 +860,135 @@ CONTESTO CLIENTE:
             print(f"[ERROR] tool_solar_potential: {e}")
             return {"error": str(e)}
     
+    def _embed_query(self, text: str) -> List[float]:
+        """Embedding of a RAG query from the OpenRouter embeddings endpoint."""
+        emb_response = http_client.post(
+            "embeddings",
+            "https://openrouter.ai/api/v1/embeddings",
+            headers={
+                "Authorization": f"Bearer {self.openrouter_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.embedding_model,
+                "input": text
+            }
+        )
+        
+        emb_response.raise_for_status()
+        return emb_response.json()["data"][0]["embedding"]
+
+    def _clients_newer_than(self, index) -> Optional[set]:
+        """
+        codice_cliente of the interactions embedded after the index watermark.
+
+        Returns:
+            Set of clients, or None if unknown (no watermark, failed query or
+            more than VECTOR_INDEX_MAX_DELTA new rows): the index is not used
+        """
+        if not index.watermark or self.supabase is None:
+            return None
+
+        with _vector_delta_lock:
+            now = time.time()
+            same_index = _vector_delta["version"] == index.version
+            if same_index and now - _vector_delta["checked_at"] < VECTOR_INDEX_CHECK_SECONDS:
+                return _vector_delta["clients"]
+            if _vector_delta.get("refreshing"):
+                # Another session is querying: previous answer, or the RPC
+                return _vector_delta["clients"] if same_index else None
+            _vector_delta["refreshing"] = True
+
+        clients = None
+        try:
+            response = self._select(
+                "interactions", "vector_delta",
+                lambda q: q.gt("created_at", index.watermark).not_.is_("embedding", "null").limit(VECTOR_INDEX_MAX_DELTA)
+            )
+            rows = response.data or []
+            clients = {int(r["codice_cliente"]) for r in rows} if len(rows) < VECTOR_INDEX_MAX_DELTA else None
+        except Exception as e:
+            print(f"[ERROR] Vector index delta check failed: {e}")
+        finally:
+            with _vector_delta_lock:
+                _vector_delta.update(version=index.version, checked_at=now, clients=clients, refreshing=False)
+        return clients
+
+    def _local_vector_index(self, client_id: int):
+        """The local vector index if it is current for this client, else None."""
+        index = get_vector_index()
+        if index is None or index.model != self.embedding_model or not index.has_client(int(client_id)):
+            return None
+        if time.time() - index.built_at > VECTOR_INDEX_MAX_AGE_SECONDS:
+            return None
+        newer = self._clients_newer_than(index)
+        if newer is None or int(client_id) in newer:
+            return None
+        return index
+
+    def _match_interactions(self, embedding: List[float], client_id: int) -> List[Dict]:
+        """
+        Client interactions most similar to a query embedding.
+
+        Served by the local vector index (scripts/python/build_interaction_vectors.py)
+        when it holds the client's vectors for the same embedding model and
+        none of the client's interactions is newer than the index; by the
+        match_interactions RPC otherwise (or once the index is older than
+        VECTOR_INDEX_MAX_AGE_SECONDS).
+        """
+        threshold = 0.3  # Adjusted based on test results (max sim ~0.35)
+        count = 5        # Top 5 relevant interactions
+
+        index = self._local_vector_index(client_id)
+        if index is not None:
+            return index.search(embedding, client_id=client_id, threshold=threshold, count=count)
+
+        # Vector search using the RPC function we created
+        response = self.supabase.rpc(
+            "match_interactions",
+            {
+                "query_embedding": embedding,
+                "match_threshold": threshold,
+                "match_count": count,
+                "filter_client_id": client_id
+            }
+        ).execute()
+        record_payload("interactions", "match_interactions", response.data)
+        return response.data
+
     def tool_rag_retriever(self, client_id: int, query: str) -> Dict:
         """Tool: RAG document retrieval using semantic search."""
         print(f"[DEBUG] Executing tool_rag_retriever for client {client_id} with query: '{query}'")
         try:
-            # Generate query embedding
-            emb_response = requests.post(
-                "https://openrouter.ai/api/v1/embeddings",
-                headers={
-                    "Authorization": f"Bearer {self.openrouter_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "openai/text-embedding-3-small",
-                    "input": query
-                },
-                timeout=API_TIMEOUT_EMBEDDING
-            )
+            # Query embedding (cached by model + normalized query text)
+            embedding = _embedding_cache.get_or_compute(self.embedding_model, query, self._embed_query).tolist()
             
-            emb_response.raise_for_status()
-            embedding = emb_response.json()["data"][0]["embedding"]
-            
-            # Vector search using the RPC function we created
             try:
-                response = self.supabase.rpc(
-                    "match_interactions",
-                    {
-                        "query_embedding": embedding,
-                        "match_threshold": 0.3,  # Adjusted based on test results (max sim ~0.35)
-                        "match_count": 5,        # Top 5 relevant interactions
-                        "filter_client_id": client_id
-                    }
-                ).execute()
-                
-                documents = response.data
+                documents = matches = self._match_interactions(embedding, client_id)
                 print(f"[DEBUG] RAG found {len(documents)} relevant documents")
                 
                 # If no semantic matches, fallback to recent interactions
                 if not documents:
                     print("[DEBUG] No semantic matches, falling back to recent interactions")
-                    fallback = self.supabase.table("interactions")\
-                        .select("data_interazione, tipo_interazione, esito, note")\
-                        .eq("codice_cliente", client_id)\
-                        .order("data_interazione", desc=True)\
-                        .limit(3)\
-                        .execute()
+                    fallback = self._select(
+                        "interactions", "iris_recent",
+                        lambda q: q.eq("codice_cliente", client_id).order("data_interazione", desc=True).limit(3)
+                    )
                     documents = fallback.data
 
                 return {
                     "documents": documents,
                     "count": len(documents),
-                    "search_type": "vector" if response.data else "fallback_recent"
+                    "search_type": "vector" if matches else "fallback_recent"
                 }
 
             except Exception as rpc_error:
                 print(f"[ERROR] RAG RPC failed: {rpc_error}")
                 # Fallback in case RPC fails (e.g. function not created)
-                fallback = self.supabase.table("interactions")\
-                    .select("data_interazione, tipo_interazione, esito, note")\
-                    .eq("codice_cliente", client_id)\
-                    .order("data_interazione", desc=True)\
-                    .limit(5)\
-                    .execute()
+                fallback = self._select(
+                    "interactions", "iris_recent",
+                    lambda q: q.eq("codice_cliente", client_id).order("data_interazione", desc=True).limit(5)
+                )
                     
                 return {
                     "documents": fallback.data,
@@ -737,12 +1026,12 @@ CONTESTO CLIENTE:
         """Tool: Generic database explorer."""
         print(f"[DEBUG] Executing tool_database_explorer on {table_name}")
         try:
-            query = self.supabase.table(table_name).select("*")
-            
-            if client_id:
-                query = query.eq("codice_cliente", client_id)
-            
-            response = query.limit(limit).execute()
+            def build(query):
+                if client_id:
+                    query = query.eq("codice_cliente", client_id)
+                return query.limit(limit)
+
+            response = self._select(table_name, "iris", build)
             
             return {
                 "table": table_name,
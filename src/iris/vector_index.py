@@ -0,0 +1,414 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS INTERACTION VECTOR INDEX                            ║
+║              Memory-Mapped Quantized Embeddings for Local RAG                 ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Offline copy of interactions.embedding, built by
+scripts/python/build_interaction_vectors.py, so doc_retriever_rag can rank a
+client's interactions in process instead of calling the match_interactions
+RPC. Each build is one directory of files, published under the index
+directory by src/utils/versioned_dir.py:
+
+    manifest.json          rows, dim, dtype, embedding model, created_at watermark,
+                           version (written last)
+    codes.npy              int64 codice_cliente (sorted, clients with vectors)
+    offsets.npy            int64 CSR offsets: rows offsets[i]:offsets[i + 1]
+                           belong to codes[i]
+    vectors.npy            int8 (or float16) (rows, dim) quantized unit vectors
+    inv_norms.npy          float32 1 / norm of each quantized row
+    documents.jsonl        one JSON line per row (the match_interactions columns)
+    document_offsets.npy   int64 byte offsets of the document lines
+    ivf_centroids.npy      optional (nlist, dim) float32 unit centroids
+    ivf_offsets.npy,       optional inverted lists: rows of list j are
+    ivf_rows.npy           ivf_rows[ivf_offsets[j]:ivf_offsets[j + 1]]
+
+Similarity is the cosine between the query and the quantized row,
+(row . query) * inv_norm / |query|, as the RPC's 1 - (embedding <=> query).
+Searching one client is a dot product over a contiguous slice of rows;
+searching the whole portfolio probes the nearest inverted lists when the
+IVF was built, and scans every row otherwise.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.constants import (
+    INTERACTION_VECTORS_DIR,
+    VECTOR_INDEX_CHECK_SECONDS,
+    VECTOR_INDEX_NPROBE,
+)
+from src.utils.versioned_dir import current_dir, discard, new_build, publish
+
+logger = logging.getLogger(__name__)
+
+# match_interactions columns kept for every row (similarity is added on search)
+DOCUMENT_COLUMNS = ('id', 'codice_cliente', 'tipo_interazione', 'data_interazione', 'esito', 'note')
+
+DTYPES = ('int8', 'float16')
+
+_ARRAYS = ('codes', 'offsets', 'vectors', 'inv_norms', 'document_offsets')
+_IVF_ARRAYS = ('ivf_centroids', 'ivf_offsets', 'ivf_rows')
+
+# Files of a build (also the flat layout of indexes written before versioning)
+_FILES = tuple(f"{name}.npy" for name in _ARRAYS + _IVF_ARRAYS) + ('documents.jsonl', 'manifest.json')
+
+# Rows scored per matrix product when scanning many rows
+_SCAN_BLOCK = 8192
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUANTIZATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    """interactions.embedding (pgvector text "[...]" or list) -> float32 vector, None if missing."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    vector = np.asarray(value, dtype=np.float32)
+    return vector if vector.size else None
+
+
+def quantize(vectors: np.ndarray, dtype: str = 'int8') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize embedding rows.
+
+    Rows are scaled to unit length; int8 rows are then scaled so their
+    largest component maps to 127 (one scale per row).
+
+    Returns:
+        (quantized rows, float32 inverse norm of each quantized row)
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown vector dtype '{dtype}' (expected one of {DTYPES})")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if dtype == 'int8':
+        scale = 127.0 / np.maximum(np.abs(unit).max(axis=1, keepdims=True), 1e-12)
+        quantized = np.rint(unit * scale).astype(np.int8)
+    else:
+        quantized = unit.astype(np.float16)
+    norms = np.linalg.norm(quantized.astype(np.float32), axis=1)
+    return quantized, (1.0 / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _unit_rows(vectors: np.ndarray, inv_norms: np.ndarray) -> np.ndarray:
+    return vectors.astype(np.float32) * inv_norms[:, None]
+
+
+def build_ivf(vectors: np.ndarray, inv_norms: np.ndarray, nlist: int,
+              iterations: int = 10, sample: int = 20000, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Spherical k-means inverted lists over the quantized rows.
+
+    Centroids are trained on a sample of rows, then every row is assigned
+    to its nearest centroid.
+
+    Returns:
+        ivf_centroids, ivf_offsets, ivf_rows arrays
+    """
+    n = len(vectors)
+    nlist = max(1, min(nlist, n))
+    rng = np.random.default_rng(seed)
+    picked = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+    train = _unit_rows(vectors[picked], inv_norms[picked])
+    centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+
+    for _ in range(iterations):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = ~np.bincount(assign, minlength=nlist).astype(bool)
+        sums[empty] = centroids[empty]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, _SCAN_BLOCK):
+        block = _unit_rows(vectors[start:start + _SCAN_BLOCK], inv_norms[start:start + _SCAN_BLOCK])
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    rows = np.argsort(assign, kind='stable').astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+    return {'ivf_centroids': centroids.astype(np.float32), 'ivf_offsets': offsets, 'ivf_rows': rows}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WRITE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def write_vector_index(rows: Iterable[Dict[str, Any]], path: str, model: str,
+                       dtype: str = 'int8', nlist: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Build the index directory from interaction rows.
+
+    Rows are quantized as they are read (e.g. page by page from Supabase),
+    so only the quantized matrix is kept in memory.
+
+    Args:
+        rows: Interaction dicts with "embedding" and DOCUMENT_COLUMNS; rows
+              without an embedding are skipped. Their highest "created_at"
+              is stored as the index watermark
+        path: Index directory
+        model: Embedding model of the vectors (queries must use the same)
+        dtype: "int8" or "float16"
+        nlist: Inverted lists for portfolio-wide search (0 = no IVF,
+               None = sqrt of the number of rows)
+
+    Returns:
+        The manifest
+    """
+    codes, quantized, inv_norms, documents = [], [], [], []
+    batch, batch_docs = [], []
+
+    def flush():
+        if batch:
+            q, inv = quantize(np.stack(batch), dtype)
+            quantized.append(q)
+            inv_norms.append(inv)
+            documents.extend(batch_docs)
+            batch.clear()
+            batch_docs.clear()
+
+    dim = None
+    watermark = None
+    for row in rows:
+        vector = parse_embedding(row.get('embedding'))
+        if vector is None:
+            continue
+        if row.get('created_at') is not None:
+            watermark = max(watermark or '', str(row['created_at']))
+        if dim is None:
+            dim = len(vector)
+        elif len(vector) != dim:
+            raise ValueError(f"Interaction {row.get('id')} has a {len(vector)}-d embedding, expected {dim}")
+        codes.append(int(row['codice_cliente']))
+        batch.append(vector)
+        batch_docs.append(json.dumps({c: row.get(c) for c in DOCUMENT_COLUMNS},
+                                     ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+        if len(batch) >= _SCAN_BLOCK:
+            flush()
+    flush()
+
+    # Rows grouped by client (stable: keeps the read order within a client)
+    codes = np.array(codes, dtype=np.int64)
+    order = np.argsort(codes, kind='stable')
+    np_dtype = np.int8 if dtype == 'int8' else np.float16
+    vectors = np.concatenate(quantized)[order] if quantized else np.empty((0, dim or 0), dtype=np_dtype)
+    inv = np.concatenate(inv_norms)[order] if inv_norms else np.empty(0, dtype=np.float32)
+    lines = [documents[i] for i in order.tolist()]
+    client_codes, starts = np.unique(codes[order], return_index=True)
+
+    arrays = {
+        'codes': client_codes.astype(np.int64),
+        'offsets': np.append(starts, len(order)).astype(np.int64),
+        'vectors': vectors,
+        'inv_norms': inv,
+        'document_offsets': np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64),
+    }
+    if nlist is None:
+        nlist = int(np.sqrt(len(vectors)))
+    if nlist and len(vectors):
+        arrays.update(build_ivf(vectors, inv, nlist))
+
+    digest = hashlib.sha1(json.dumps([model, watermark]).encode('utf-8'))
+    for array in arrays.values():
+        digest.update(array.tobytes())
+    manifest = {
+        'version': digest.hexdigest()[:16],
+        'rows': int(len(vectors)),
+        'clients': int(len(client_codes)),
+        'dim': int(dim or 0),
+        'dtype': dtype,
+        'model': model,
+        'nlist': int(len(arrays['ivf_centroids'])) if 'ivf_centroids' in arrays else 0,
+        'watermark': watermark,
+        'created_at': time.time(),
+    }
+
+    # Readers switch to the new build in one swap (see versioned_dir)
+    build = new_build(path)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(build, f"{name}.npy"), array)
+        with open(os.path.join(build, "documents.jsonl"), 'wb') as f:
+            f.writelines(lines)
+        with open(os.path.join(build, "manifest.json"), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(manifest))
+        publish(path, build, manifest['version'], legacy=_FILES)
+    except BaseException:
+        discard(build)
+        raise
+    logger.info(f"Interaction vector index written to {path} ({manifest['rows']} rows, {manifest['clients']} clients)")
+    return manifest
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SEARCH
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class VectorIndex:
+    """
+    Read-only, memory-mapped interaction vectors.
+
+    Use load_vector_index() / get_vector_index() to open one.
+    """
+
+    def __init__(self, manifest: Dict[str, Any], arrays: Dict[str, np.ndarray], documents: np.ndarray):
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.model = manifest['model']
+        # Newest interaction created_at in the index (None if unknown)
+        self.watermark: Optional[str] = manifest.get('watermark')
+        self.built_at: float = manifest.get('created_at', 0.0)
+        self._a = arrays
+        self._documents = documents
+
+    def __len__(self) -> int:
+        return len(self._a['vectors'])
+
+    @property
+    def has_ivf(self) -> bool:
+        return 'ivf_centroids' in self._a
+
+    def _client_rows(self, client_id: int) -> Optional[slice]:
+        codes = self._a['codes']
+        pos = int(np.searchsorted(codes, client_id))
+        if pos >= len(codes) or codes[pos] != client_id:
+            return None
+        return slice(int(self._a['offsets'][pos]), int(self._a['offsets'][pos + 1]))
+
+    def has_client(self, client_id: int) -> bool:
+        """True if the index holds vectors for the client."""
+        return self._client_rows(client_id) is not None
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """match_interactions columns of a row."""
+        start, end = int(self._a['document_offsets'][row]), int(self._a['document_offsets'][row + 1])
+        return json.loads(self._documents[start:end].tobytes().decode('utf-8'))
+
+    def _scores(self, rows, query: np.ndarray) -> np.ndarray:
+        return (self._a['vectors'][rows].astype(np.float32) @ query) * self._a['inv_norms'][rows]
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) for a portfolio-wide search."""
+        if self.has_ivf:
+            lists = np.argsort(-(self._a['ivf_centroids'] @ query), kind='stable')[:nprobe]
+            offsets = self._a['ivf_offsets']
+            rows = np.sort(np.concatenate(
+                [self._a['ivf_rows'][offsets[j]:offsets[j + 1]] for j in lists.tolist()]
+            ).astype(np.int64))
+            return rows, self._scores(rows, query)
+
+        rows = np.arange(len(self), dtype=np.int64)
+        scores = np.concatenate([
+            self._scores(slice(start, start + _SCAN_BLOCK), query)
+            for start in range(0, len(self), _SCAN_BLOCK)
+        ]) if len(self) else np.empty(0, dtype=np.float32)
+        return rows, scores
+
+    def search(self, query_embedding, client_id: Optional[int] = None, threshold: float = 0.0,
+               count: int = 5, nprobe: int = VECTOR_INDEX_NPROBE) -> List[Dict[str, Any]]:
+        """
+        Interactions most similar to a query, as match_interactions returns them.
+
+        Args:
+            query_embedding: Query vector (same model as the index)
+            client_id: Only this client's interactions (None = whole portfolio)
+            threshold: Minimum cosine similarity (exclusive)
+            count: Maximum results
+            nprobe: Inverted lists probed by portfolio-wide searches
+
+        Returns:
+            Row dicts (DOCUMENT_COLUMNS + similarity), most similar first
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if len(query) != self.manifest['dim']:
+            raise ValueError(f"Query has {len(query)} dimensions, the index {self.manifest['dim']}")
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if client_id is not None:
+            span = self._client_rows(int(client_id))
+            if span is None:
+                return []
+            rows = np.arange(span.start, span.stop, dtype=np.int64)
+            scores = self._scores(span, query)
+        else:
+            rows, scores = self._candidates(query, nprobe)
+
+        keep = np.flatnonzero(scores > threshold)
+        best = keep[np.argsort(-scores[keep], kind='stable')[:count]]
+        return [dict(self.document(int(rows[i])), similarity=float(scores[i])) for i in best.tolist()]
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Manifest of an index directory ({} if missing or unreadable)."""
+    try:
+        with open(os.path.join(current_dir(path), "manifest.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_vector_index(path: str = INTERACTION_VECTORS_DIR) -> Optional[VectorIndex]:
+    """
+    Open an index directory memory-mapped.
+
+    Returns:
+        VectorIndex, or None if the index is missing or inconsistent
+    """
+    # Resolved once: every file below comes from the same build
+    path = current_dir(path)
+    manifest = read_manifest(path)
+    if not manifest:
+        return None
+
+    try:
+        names = _ARRAYS + (_IVF_ARRAYS if manifest.get('nlist') else ())
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in names}
+        documents = np.memmap(os.path.join(path, "documents.jsonl"), dtype=np.uint8, mode='r') \
+            if arrays['document_offsets'][-1] else np.empty(0, dtype=np.uint8)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not open interaction vector index {path}: {e}")
+        return None
+
+    if (len(arrays['vectors']) != manifest.get('rows') or len(arrays['inv_norms']) != manifest.get('rows')
+            or int(arrays['offsets'][-1]) != manifest.get('rows')
+            or len(documents) != int(arrays['document_offsets'][-1])):
+        logger.warning(f"Interaction vector index {path} does not match its manifest, ignoring it")
+        return None
+
+    return VectorIndex(manifest, arrays, documents)
+
+
+_loaded: Dict[str, Tuple[Optional[VectorIndex], float]] = {}
+_load_lock = threading.Lock()
+
+
+def get_vector_index(path: str = INTERACTION_VECTORS_DIR) -> Optional[VectorIndex]:
+    """
+    Shared index of a directory, reopened when a rebuild changes its version.
+
+    The manifest is checked at most every VECTOR_INDEX_CHECK_SECONDS.
+
+    Returns:
+        VectorIndex, or None if no index has been built
+    """
+    now = time.time()
+    with _load_lock:
+        index, checked_at = _loaded.get(path, (None, 0.0))
+        if now - checked_at < VECTOR_INDEX_CHECK_SECONDS:
+            return index
+        version = read_manifest(path).get('version')
+        if index is None or index.version != version:
+            index = load_vector_index(path) if version else None
+        _loaded[path] = (index, now)
+        return index
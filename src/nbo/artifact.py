@@ -0,0 +1,432 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS NBO ARTIFACT                                        ║
+║              Columnar, Memory-Mapped NBO Master                               ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Binary replacement for Data/nbo_master.json, written by
+scripts/python/generate_nbo_master.py. Each build is one directory of files,
+published under the artifact directory by src/utils/versioned_dir.py:
+
+    manifest.json         counts, version token, creation time (written last)
+    strings.json          product / need-area string tables
+    codes.npy             int64 codice_cliente per client
+    offsets.npy           int64 CSR offsets: client i owns recommendations
+                          offsets[i]:offsets[i + 1]
+    components.npy        float64 (n_recs, 4) score components
+    details.npy           float64 (n_recs, 3) churn details
+    product.npy, area.npy int16 indexes into the string tables
+    profiles.jsonl        one JSON line per client (anagrafica, metadata)
+    profile_offsets.npy   int64 byte offsets of the profile lines
+    fingerprints.npy      optional uint64 input fingerprint per client
+
+Arrays are opened with mmap_mode='r', so every worker process shares the
+same pages, and a client's full record is only decoded when it is displayed
+(ClientTable). JSON stays available as an export format (export_json).
+
+patch_artifact() replaces the records of some clients (incremental runs of
+the generator): the other clients' rows and profile bytes are copied over
+without being decoded into a new build, swapped in like a full one.
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+import textwrap
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.nbo.engine import COMPONENTS, NBOEngine
+from src.utils.versioned_dir import current_dir, discard, new_build, publish
+
+logger = logging.getLogger(__name__)
+
+# Columns of components.npy / details.npy
+COMPONENT_COLUMNS = COMPONENTS + ('affinita_cluster',)
+DETAIL_COLUMNS = ('delta_churn', 'churn_prima', 'churn_dopo')
+
+_ARRAYS = ('codes', 'offsets', 'components', 'details', 'product', 'area', 'profile_offsets')
+
+# Files of a build (also the flat layout of artifacts written before versioning)
+_FILES = tuple(f"{name}.npy" for name in _ARRAYS) + (
+    'fingerprints.npy', 'profiles.jsonl', 'strings.json', 'manifest.json')
+
+
+class ClientTable(Sequence):
+    """
+    Read-only, lazily decoded view of the NBO master client records.
+
+    table[i] rebuilds the same dict nbo_master.json holds for client i
+    (codice_cliente, timestamp, anagrafica, raccomandazioni, metadata).
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], strings: Dict[str, List[str]], profiles: np.ndarray):
+        self._a = arrays
+        self._products = strings['prodotti']
+        self._areas = strings['aree']
+        self._profiles = profiles
+
+    def __len__(self) -> int:
+        return len(self._a['codes'])
+
+    def recommendations(self, i: int) -> List[Dict[str, Any]]:
+        """Recommendations of client i, in stored order."""
+        start, end = int(self._a['offsets'][i]), int(self._a['offsets'][i + 1])
+        components = self._a['components'][start:end].tolist()
+        details = self._a['details'][start:end].tolist()
+        products = self._a['product'][start:end].tolist()
+        areas = self._a['area'][start:end].tolist()
+        return [
+            {
+                'area_bisogno': self._areas[areas[j]],
+                'prodotto': self._products[products[j]],
+                'componenti': dict(zip(COMPONENT_COLUMNS, components[j])),
+                'dettagli': dict(zip(DETAIL_COLUMNS, details[j])),
+            }
+            for j in range(end - start)
+        ]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        start, end = int(self._a['profile_offsets'][i]), int(self._a['profile_offsets'][i + 1])
+        profile = json.loads(self._profiles[start:end].tobytes().decode('utf-8'))
+        return {
+            'codice_cliente': profile['codice_cliente'],
+            'timestamp': profile.get('timestamp'),
+            'anagrafica': profile.get('anagrafica', {}),
+            'raccomandazioni': self.recommendations(i),
+            'metadata': profile.get('metadata', {}),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WRITE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _columnar(clients: Iterable[Dict[str, Any]], profiles_out):
+    """
+    Flatten client records into the artifact arrays and string tables.
+
+    Records are consumed one at a time; their profile lines go straight to
+    profiles_out, so only the numeric columns are kept in memory.
+
+    Returns:
+        (arrays, strings, sha1 of the profile bytes)
+    """
+    products: Dict[str, int] = {}
+    areas: Dict[str, int] = {}
+    codes, offsets = [], [0]
+    components, details, product, area = [], [], [], []
+    profile_offsets = [0]
+    profile_digest = hashlib.sha1()
+
+    for client in clients:
+        codes.append(int(client['codice_cliente']))
+        for rec in client.get('raccomandazioni') or []:
+            components.append([float(rec['componenti'].get(c) or 0) for c in COMPONENT_COLUMNS])
+            details.append([float((rec.get('dettagli') or {}).get(c) or 0) for c in DETAIL_COLUMNS])
+            product.append(products.setdefault(rec['prodotto'], len(products)))
+            area.append(areas.setdefault(rec['area_bisogno'], len(areas)))
+        offsets.append(len(components))
+
+        line = json.dumps({
+            'codice_cliente': client['codice_cliente'],
+            'timestamp': client.get('timestamp'),
+            'anagrafica': client.get('anagrafica', {}),
+            'metadata': client.get('metadata', {}),
+        }, ensure_ascii=False).encode('utf-8') + b'\n'
+        profiles_out.write(line)
+        profile_digest.update(line)
+        profile_offsets.append(profile_offsets[-1] + len(line))
+
+    arrays = {
+        'codes': np.array(codes, dtype=np.int64),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'components': np.array(components, dtype=np.float64).reshape(-1, len(COMPONENT_COLUMNS)),
+        'details': np.array(details, dtype=np.float64).reshape(-1, len(DETAIL_COLUMNS)),
+        'product': np.array(product, dtype=np.int16),
+        'area': np.array(area, dtype=np.int16),
+        'profile_offsets': np.array(profile_offsets, dtype=np.int64),
+    }
+    strings = {'prodotti': list(products), 'aree': list(areas)}
+    return arrays, strings, profile_digest.digest()
+
+
+def _store(path: str, build: str, arrays: Dict[str, np.ndarray], strings: Dict[str, List[str]],
+           profile_digest: bytes, fingerprints: Optional[np.ndarray]) -> Dict[str, Any]:
+    """Complete a build holding profiles.jsonl and publish it as the live artifact."""
+    digest = hashlib.sha1()
+    for name in _ARRAYS:
+        digest.update(arrays[name].tobytes())
+    digest.update(profile_digest)
+    digest.update(json.dumps(strings, ensure_ascii=False).encode('utf-8'))
+
+    for name in _ARRAYS:
+        np.save(os.path.join(build, f"{name}.npy"), arrays[name])
+    with open(os.path.join(build, "strings.json"), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(strings, ensure_ascii=False))
+
+    if fingerprints is not None:
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        if len(fingerprints) != len(arrays['codes']):
+            raise ValueError(f"{len(fingerprints)} fingerprints for {len(arrays['codes'])} clients")
+        np.save(os.path.join(build, "fingerprints.npy"), fingerprints)
+
+    manifest = {
+        'version': digest.hexdigest()[:16],
+        'clients': int(len(arrays['codes'])),
+        'recommendations': int(len(arrays['components'])),
+        'created_at': time.time(),
+    }
+    with open(os.path.join(build, "manifest.json"), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest))
+    publish(path, build, manifest['version'], legacy=_FILES)
+    logger.info(f"NBO artifact written to {path} ({manifest['clients']} clients, version {manifest['version']})")
+    return manifest
+
+
+def write_artifact(clients: Iterable[Dict[str, Any]], path: str,
+                   fingerprints: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Write NBO master records as a columnar artifact directory.
+
+    clients can be any iterable (e.g. a generator streaming the records):
+    it is read once. The files go to a new build directory that replaces
+    the live one in a single swap, so readers never mix two builds.
+
+    Args:
+        clients: NBO master records
+        path: Artifact directory
+        fingerprints: Input fingerprint per client, kept for incremental
+                      runs (see patch_artifact)
+
+    Returns:
+        The manifest
+    """
+    build = new_build(path)
+    try:
+        with open(os.path.join(build, "profiles.jsonl"), 'wb') as profiles_out:
+            arrays, strings, profile_digest = _columnar(clients, profiles_out)
+        return _store(path, build, arrays, strings, profile_digest, fingerprints)
+    except BaseException:
+        discard(build)
+        raise
+
+
+def _positions(codes: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """Position of each lookup code in codes (-1 = missing)."""
+    if not len(codes):
+        return np.full(len(lookup), -1, dtype=np.int64)
+    sorter = np.argsort(codes, kind='stable')
+    idx = np.searchsorted(codes, lookup, sorter=sorter).clip(max=len(codes) - 1)
+    pos = sorter[idx]
+    return np.where(codes[pos] == lookup, pos, -1)
+
+
+def _gather(old: np.ndarray, new: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Rows of the virtual concatenation [old, new]."""
+    out = np.empty((len(rows),) + old.shape[1:], dtype=old.dtype)
+    from_old = rows < len(old)
+    out[from_old] = old[rows[from_old]]
+    out[~from_old] = new[rows[~from_old] - len(old)]
+    return out
+
+
+def patch_artifact(path: str, codes: Sequence[int], changed: np.ndarray,
+                   records: Iterable[Dict[str, Any]],
+                   fingerprints: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Rewrite an artifact replacing the records of some clients.
+
+    Unchanged clients keep their stored recommendations and profile bytes
+    (copied, not decoded); clients of the stored artifact missing from codes
+    are dropped.
+
+    Args:
+        path: Existing artifact directory
+        codes: codice_cliente of every client of the new artifact, in order
+        changed: Bool mask aligned with codes: True = the client's record is
+                 the next one in records, False = keep the stored record
+        records: Records of the changed clients, in codes order
+        fingerprints: Input fingerprint per client (aligned with codes)
+
+    Returns:
+        The new manifest
+
+    Raises:
+        ValueError: A kept client is not in the stored artifact, or records
+                    does not hold one record per changed client
+    """
+    stored = current_dir(path)
+    old = {name: np.load(os.path.join(stored, f"{name}.npy"), mmap_mode='r') for name in _ARRAYS}
+    with open(os.path.join(stored, "strings.json"), 'r', encoding='utf-8') as f:
+        strings = json.load(f)
+    old_profiles = np.memmap(os.path.join(stored, "profiles.jsonl"), dtype=np.uint8, mode='r') \
+        if old['profile_offsets'][-1] else np.empty(0, dtype=np.uint8)
+
+    codes = np.asarray(codes, dtype=np.int64)
+    changed = np.asarray(changed, dtype=bool)
+    src = np.where(changed, -1, _positions(np.asarray(old['codes']), codes))
+    if (src[~changed] < 0).any():
+        raise ValueError("Unchanged clients are missing from the stored NBO artifact")
+
+    buffer = io.BytesIO()
+    new, new_strings, _ = _columnar(records, buffer)
+    new_profiles = np.frombuffer(buffer.getbuffer(), dtype=np.uint8)
+    if len(new['codes']) != int(changed.sum()) or not np.array_equal(new['codes'], codes[changed]):
+        raise ValueError("Patched records do not match the changed clients")
+
+    # New product / area names are appended to the stored string tables
+    for key, column in (('prodotti', 'product'), ('aree', 'area')):
+        index = {name: i for i, name in enumerate(strings[key])}
+        mapping = np.array([index.setdefault(name, len(index)) for name in new_strings[key]], dtype=np.int16)
+        strings[key] = list(index)
+        new[column] = mapping[new[column]] if len(mapping) else new[column]
+
+    # Row ranges in the virtual concatenations [old, new] (recommendations
+    # and profile bytes), one per client of the new artifact
+    old_at = src.clip(min=0)
+    new_at = (np.cumsum(changed) - 1).clip(min=0)
+
+    def ranges(old_offsets: np.ndarray, new_offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        old_offsets = np.append(old_offsets, old_offsets[-1])
+        new_offsets = np.append(new_offsets, new_offsets[-1])
+        starts = np.where(changed, old_offsets[-1] + new_offsets[new_at], old_offsets[old_at])
+        lengths = np.where(changed, new_offsets[new_at + 1] - new_offsets[new_at],
+                           old_offsets[old_at + 1] - old_offsets[old_at])
+        return starts.astype(np.int64), lengths.astype(np.int64)
+
+    rec_starts, rec_lengths = ranges(np.asarray(old['offsets']), new['offsets'])
+    offsets = np.concatenate([[0], np.cumsum(rec_lengths)]).astype(np.int64)
+    rows = np.repeat(rec_starts - offsets[:-1], rec_lengths) + np.arange(offsets[-1])
+
+    arrays = {'codes': codes, 'offsets': offsets}
+    for name in ('components', 'details', 'product', 'area'):
+        arrays[name] = _gather(old[name], new[name], rows)
+
+    byte_starts, byte_lengths = ranges(np.asarray(old['profile_offsets']), new['profile_offsets'])
+    arrays['profile_offsets'] = np.concatenate([[0], np.cumsum(byte_lengths)]).astype(np.int64)
+
+    # Profile bytes are copied in runs of contiguous lines from the same file
+    breaks = np.flatnonzero(
+        (changed[1:] != changed[:-1]) | (byte_starts[1:] != byte_starts[:-1] + byte_lengths[:-1])
+    ) + 1
+    run_first = np.concatenate([[0], breaks]).astype(np.int64) if len(codes) else breaks
+    run_last = np.append(breaks, len(codes)) - 1 if len(codes) else breaks
+
+    build = new_build(path)
+    try:
+        profile_digest = hashlib.sha1()
+        with open(os.path.join(build, "profiles.jsonl"), 'wb') as out:
+            for first, last in zip(run_first.tolist(), run_last.tolist()):
+                start, end = int(byte_starts[first]), int(byte_starts[last] + byte_lengths[last])
+                if changed[first]:
+                    offset = len(old_profiles)
+                    chunk = new_profiles[start - offset:end - offset]
+                else:
+                    chunk = old_profiles[start:end]
+                out.write(chunk.tobytes())
+                profile_digest.update(chunk.tobytes())
+        return _store(path, build, arrays, strings, profile_digest.digest(), fingerprints)
+    except BaseException:
+        discard(build)
+        raise
+
+
+def export_json(clients: Iterable[Dict[str, Any]], path: str) -> None:
+    """
+    Export client records in the nbo_master.json layout.
+
+    Streams one record at a time; the output matches json.dump(list, indent=2).
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        empty = True
+        for client in clients:
+            f.write('\n' if empty else ',\n')
+            f.write(textwrap.indent(json.dumps(client, indent=2, ensure_ascii=False), '  '))
+            empty = False
+        f.write(']' if empty else '\n]')
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# READ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Manifest of an artifact directory ({} if missing or unreadable)."""
+    try:
+        with open(os.path.join(current_dir(path), "manifest.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def read_fingerprints(path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Input fingerprints stored with an artifact.
+
+    Returns:
+        (codes, fingerprints) aligned arrays, or None if the artifact has no
+        fingerprints or they do not match its manifest
+    """
+    path = current_dir(path)
+    manifest = read_manifest(path)
+    try:
+        codes = np.load(os.path.join(path, "codes.npy"))
+        fingerprints = np.load(os.path.join(path, "fingerprints.npy"))
+    except (OSError, ValueError):
+        return None
+    if not manifest or not len(codes) == len(fingerprints) == manifest.get('clients'):
+        return None
+    return codes, fingerprints
+
+
+def load_artifact(path: str) -> Optional[NBOEngine]:
+    """
+    Open an artifact memory-mapped and build the scoring engine over it.
+
+    Returns:
+        NBOEngine whose .clients is a ClientTable and .version the artifact
+        version, or None if the artifact is missing or inconsistent
+    """
+    # Resolved once: every file below comes from the same build
+    path = current_dir(path)
+    manifest = read_manifest(path)
+    if not manifest:
+        return None
+
+    try:
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in _ARRAYS}
+        with open(os.path.join(path, "strings.json"), 'r', encoding='utf-8') as f:
+            strings = json.load(f)
+        profiles = np.memmap(os.path.join(path, "profiles.jsonl"), dtype=np.uint8, mode='r') \
+            if arrays['profile_offsets'][-1] else np.empty(0, dtype=np.uint8)
+    except (OSError, ValueError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not open NBO artifact {path}: {e}")
+        return None
+
+    n_clients, n_recs = manifest.get('clients'), manifest.get('recommendations')
+    if (len(arrays['codes']) != n_clients or len(arrays['components']) != n_recs
+            or int(arrays['offsets'][-1]) != n_recs or len(profiles) != int(arrays['profile_offsets'][-1])):
+        logger.warning(f"NBO artifact {path} does not match its manifest, ignoring it")
+        return None
+
+    return NBOEngine(
+        arrays['codes'],
+        arrays['components'][:, :len(COMPONENTS)],
+        arrays['offsets'],
+        clients=ClientTable(arrays, strings, profiles),
+        version=manifest['version'],
+    )
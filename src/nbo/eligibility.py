@@ -0,0 +1,134 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS NBO ELIGIBILITY OVERLAY                             ║
+║              Per-Client Interaction Bits for the Top 20                       ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The Top 20 / Top 5 lists skip clients with recent interactions (email, call,
+new policy, open complaint, claim). Instead of writing those indicators into
+the shared NBO client dicts, they live here: one uint8 bitmask and one check
+timestamp per client, aligned with the NBOEngine client positions.
+
+The ranking, the Top 5 page and the detail chips all read the overlay;
+logging a call flips a single bit. Indicators older than max_age seconds are
+fetched again the next time a ranking needs them.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.config.constants import ELIGIBILITY_EPOCH_SECONDS
+
+# Interaction indicators, in bit order (bit i = INDICATORS[i])
+INDICATORS = (
+    'email_last_5_days',
+    'call_last_10_days',
+    'new_policy_last_30_days',
+    'open_complaint',
+    'claim_last_60_days',
+)
+INDICATOR_BITS = {name: np.uint8(1 << i) for i, name in enumerate(INDICATORS)}
+
+
+def pack_indicators(indicators: Dict[str, bool]) -> int:
+    """Indicators dict -> bitmask."""
+    return sum(1 << i for i, name in enumerate(INDICATORS) if indicators.get(name))
+
+
+def unpack_indicators(bits: int) -> Dict[str, bool]:
+    """Bitmask -> indicators dict (all five keys)."""
+    return {name: bool(bits & (1 << i)) for i, name in enumerate(INDICATORS)}
+
+
+class EligibilityOverlay:
+    """
+    Interaction indicators of the NBO clients, stored apart from the records.
+
+    Args:
+        codes: codice_cliente per client position (NBOEngine.codes)
+        max_age: Seconds a check stays valid
+    """
+
+    def __init__(self, codes: np.ndarray, max_age: float = ELIGIBILITY_EPOCH_SECONDS):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.max_age = max_age
+        self.bits = np.zeros(len(self.codes), dtype=np.uint8)
+        self.checked_at = np.full(len(self.codes), -np.inf)
+        self._sorter = np.argsort(self.codes, kind='stable')
+        self._lock = threading.Lock()
+
+    def positions(self, codes) -> np.ndarray:
+        """Client positions of codice_cliente values (-1 = not in the NBO master)."""
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+        if not len(self.codes):
+            return np.full(len(codes), -1, dtype=np.int64)
+        idx = np.searchsorted(self.codes, codes, sorter=self._sorter).clip(max=len(self.codes) - 1)
+        pos = self._sorter[idx]
+        return np.where(self.codes[pos] == codes, pos, -1)
+
+    def stale(self, positions: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+        """Bool mask: positions never checked or checked more than max_age ago."""
+        now = time.time() if now is None else now
+        return self.checked_at[positions] <= now - self.max_age
+
+    def update(self, positions: np.ndarray, bits: np.ndarray, now: Optional[float] = None) -> None:
+        """Store freshly checked bitmasks."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.bits[positions] = bits
+            self.checked_at[positions] = now
+
+    def check(self, codes, fetch: Callable[[List[int]], Dict]) -> np.ndarray:
+        """
+        Eligibility of a batch of clients, fetching only stale indicators.
+
+        Args:
+            codes: codice_cliente values (codes outside the NBO master count
+                   as eligible)
+            fetch: Called with the codes to refresh, returns
+                   codice_cliente -> indicators dict. Codes missing from
+                   the result count as eligible and stay unchecked.
+
+        Returns:
+            Bool mask aligned with codes (True = no recent interactions)
+        """
+        pos = self.positions(codes)
+        known = pos >= 0
+        todo = pos[known][self.stale(pos[known])]
+        unchecked = np.zeros(len(pos), dtype=bool)
+        if len(todo):
+            fetched = fetch(self.codes[todo].tolist())
+            found = np.array([int(self.codes[p]) in fetched for p in todo.tolist()], dtype=bool)
+            self.update(
+                todo[found],
+                np.array([pack_indicators(fetched[int(self.codes[p])]) for p in todo[found].tolist()], dtype=np.uint8),
+            )
+            unchecked = np.isin(pos, todo[~found])
+        return ~known | unchecked | (self.bits[pos.clip(min=0)] == 0)
+
+    def set_indicator(self, codice_cliente, name: str, value: bool = True) -> bool:
+        """
+        Flip one indicator of a client (e.g. right after logging a call).
+
+        Returns:
+            False if the client is not in the NBO master
+        """
+        pos = int(self.positions([codice_cliente])[0])
+        if pos < 0:
+            return False
+        with self._lock:
+            if value:
+                self.bits[pos] |= INDICATOR_BITS[name]
+            else:
+                self.bits[pos] &= ~INDICATOR_BITS[name]
+        return True
+
+    def indicators(self, codice_cliente) -> Dict[str, bool]:
+        """Indicators of a client ({} if never checked or unknown)."""
+        pos = int(self.positions([codice_cliente])[0])
+        if pos < 0 or (self.checked_at[pos] == -np.inf and not self.bits[pos]):
+            return {}
+        return unpack_indicators(int(self.bits[pos]))
@@ -0,0 +1,229 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS NBO ENGINE                                          ║
+║              Vectorized Next Best Offer Scoring & Ranking                     ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The NBO master is flattened once into NumPy arrays: one row of score
+components per recommendation (CSR layout: the recommendations of client i
+are rows offsets[i]:offsets[i + 1]). Scoring all recommendations for a
+weight vector is a single matrix-vector product, and the per-client sort,
+the deterministic "swap" rule and the global ranking are array operations,
+so moving a weight slider re-ranks without touching Python dicts.
+
+The dashboards only show the first few clients: top_clients() selects them
+with argpartition over each client's best score (O(N)) and widens the window
+only when the eligibility check removes candidates, so no full ranked list
+is built or kept.
+"""
+
+import hashlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# First top_clients() window, as a multiple of k (grows x2 when candidates are filtered out)
+TOP_WINDOW_FACTOR = 2
+
+# Score components of a recommendation (rec['componenti']) and the matching
+# keys of the weights dict (st.session_state.nbo_weights)
+COMPONENTS = ('retention_gain', 'redditivita', 'propensione')
+WEIGHT_KEYS = ('retention', 'redditivita', 'propensione')
+
+
+def weight_vector(weights: Dict[str, float]) -> np.ndarray:
+    """Weights dict -> float64 vector aligned with COMPONENTS."""
+    return np.array([float(weights[key]) for key in WEIGHT_KEYS], dtype=np.float64)
+
+
+def recommendation_score(rec: Dict[str, Any], weights: Dict[str, float]) -> float:
+    """Weighted score of a single recommendation dict."""
+    c = rec['componenti']
+    return sum(float(c[comp]) * float(weights[key]) for comp, key in zip(COMPONENTS, WEIGHT_KEYS))
+
+
+class Ranking(NamedTuple):
+    """
+    Recommendations in global score order (descending).
+
+    client: client position in the engine
+    rec: recommendation position inside that client's 'raccomandazioni'
+    score: weighted score (after the swap rule, the client's first
+           displayed recommendation carries the client's top score)
+    """
+    client: np.ndarray
+    rec: np.ndarray
+    score: np.ndarray
+
+
+class NBOEngine:
+    """
+    Flattened NBO recommendation matrix.
+
+    Args:
+        codes: codice_cliente per client (int64)
+        components: (n_recommendations, len(COMPONENTS)) float64 score components
+        offsets: (n_clients + 1) int64; client i owns rows offsets[i]:offsets[i + 1]
+        clients: Optional original client records, aligned with codes
+        version: Optional data version token (e.g. the artifact version)
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        components: np.ndarray,
+        offsets: np.ndarray,
+        clients: Optional[Sequence[Dict[str, Any]]] = None,
+        version: Optional[str] = None
+    ):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.components = np.asarray(components, dtype=np.float64).reshape(-1, len(COMPONENTS))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.clients = clients
+        self.version = version
+        self.n_clients = len(self.codes)
+
+        self.counts = np.diff(self.offsets)
+        self.max_recs = int(self.counts.max()) if self.n_clients else 0
+
+        # Padded (client, slot) -> flat row matrix, -1 = no recommendation
+        self._owner = np.repeat(np.arange(self.n_clients), self.counts)
+        self._slot = np.arange(len(self.components)) - self.offsets[self._owner]
+        self._slots = np.full((self.n_clients, self.max_recs), -1, dtype=np.int64)
+        self._slots[self._owner, self._slot] = np.arange(len(self.components))
+
+        # Swap rule: position (in score order) shown first for each client
+        mod = self.codes % 5
+        self._swap = np.zeros(self.n_clients, dtype=np.int64)
+        self._swap[((mod == 1) | (mod == 3)) & (self.counts > 1)] = 1
+        self._swap[(mod == 2) & (self.counts > 2)] = 2
+
+    @classmethod
+    def from_clients(cls, clients: List[Dict[str, Any]]) -> "NBOEngine":
+        """Build the engine from nbo_master records (one pass over the dicts)."""
+        codes = np.empty(len(clients), dtype=np.int64)
+        offsets = np.zeros(len(clients) + 1, dtype=np.int64)
+        rows: List[List[float]] = []
+        for i, client in enumerate(clients):
+            codes[i] = client['codice_cliente']
+            recs = client.get('raccomandazioni') or []
+            rows.extend([float(rec['componenti'][comp]) for comp in COMPONENTS] for rec in recs)
+            offsets[i + 1] = offsets[i] + len(recs)
+        components = np.array(rows, dtype=np.float64).reshape(-1, len(COMPONENTS))
+        digest = hashlib.sha1(codes.tobytes() + offsets.tobytes() + components.tobytes()).hexdigest()
+        return cls(codes, components, offsets, clients=clients, version=digest[:16])
+
+    def scores(self, weights: Dict[str, float]) -> np.ndarray:
+        """Score of every recommendation (flat row order)."""
+        return self.components @ weight_vector(weights)
+
+    def _padded_scores(self, weights: Dict[str, float]) -> np.ndarray:
+        """(n_clients, max_recs) scores by recommendation position, -inf = padding."""
+        flat = self.scores(weights)
+        return np.where(self._slots >= 0, flat[self._slots.clip(min=0)], -np.inf)
+
+    def client_order(self, weights: Dict[str, float]):
+        """
+        Per-client recommendations in display order.
+
+        Returns:
+            (slots, scores): (n_clients, max_recs) arrays. slots[i, j] is the
+            recommendation position shown j-th for client i (-1 = padding);
+            scores[i, j] is the score shown in that position, i.e. the j-th
+            best score (the swap exchanges recommendations, not scores).
+        """
+        padded = self._padded_scores(weights)
+        # Stable descending sort: ties keep the original recommendation order
+        order = np.argsort(-padded, axis=1, kind='stable')
+        sorted_scores = np.take_along_axis(padded, order, axis=1)
+
+        # Deterministic swap for variety: 20% of clients show their 2nd
+        # recommendation first, 20% their 3rd, 20% their 2nd (variant), and
+        # the first position keeps the top score
+        rows = np.arange(self.n_clients)
+        shown = order.copy()
+        if self.max_recs:
+            shown[rows, 0] = order[rows, self._swap]
+            shown[rows, self._swap] = order[rows, 0]
+        shown[sorted_scores == -np.inf] = -1
+        return shown, sorted_scores
+
+    @staticmethod
+    def _top_indices(best: np.ndarray, m: int) -> np.ndarray:
+        """
+        Positions of the m highest values of best, ordered by (value desc,
+        position asc); -inf entries are never returned.
+        """
+        valid = np.flatnonzero(best > -np.inf)
+        if m < len(valid):
+            # Everything >= the m-th largest value (ties at the boundary included)
+            kth = np.partition(best[valid], len(valid) - m)[len(valid) - m]
+            valid = valid[best[valid] >= kth]
+        order = np.lexsort((valid, -best[valid]))
+        return valid[order[:m]]
+
+    def top_clients(
+        self,
+        weights: Dict[str, float],
+        k: int,
+        eligible: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> Ranking:
+        """
+        First k clients by best score, with the recommendation shown first.
+
+        Same order as the clients' first appearance in rank(): best score
+        descending, ties by client position.
+
+        Args:
+            weights: Scoring weights
+            k: Number of clients to return
+            eligible: Optional filter called with the codice_cliente array of
+                      each new batch of candidates, returning a bool mask.
+                      Candidates are checked in windows of
+                      k * TOP_WINDOW_FACTOR, doubled until k pass or the
+                      clients run out.
+
+        Returns:
+            Ranking with at most k rows (one per client)
+        """
+        padded = self._padded_scores(weights)
+        best = padded.max(axis=1) if self.max_recs else np.full(self.n_clients, -np.inf)
+        n_valid = int(np.count_nonzero(best > -np.inf))
+
+        selected: List[np.ndarray] = []
+        n_selected = checked = 0
+        window = max(k * TOP_WINDOW_FACTOR, 1)
+        while k > 0 and checked < n_valid:
+            candidates = self._top_indices(best, window)[checked:]
+            checked += len(candidates)
+            if eligible is not None:
+                candidates = candidates[np.asarray(eligible(self.codes[candidates]), dtype=bool)]
+            selected.append(candidates)
+            n_selected += len(candidates)
+            if n_selected >= k:
+                break
+            window *= 2
+
+        clients = np.concatenate(selected)[:k] if selected else np.empty(0, dtype=np.int64)
+
+        # Displayed recommendation (swap rule) for the selected clients only
+        rows = padded[clients]
+        order = np.argsort(-rows, axis=1, kind='stable')
+        recs = order[np.arange(len(clients)), self._swap[clients]]
+        return Ranking(client=clients, rec=recs, score=best[clients])
+
+    def rank(self, weights: Dict[str, float]) -> Ranking:
+        """
+        All recommendations of all clients, ranked by score (descending).
+
+        Ties keep client order, then display order, as a stable sort of the
+        per-client lists would.
+        """
+        shown, sorted_scores = self.client_order(weights)
+        valid = shown >= 0
+        client, _ = np.nonzero(valid)
+        rec = shown[valid]
+        score = sorted_scores[valid]
+
+        order = np.argsort(-score, kind='stable')
+        return Ranking(client=client[order], rec=rec[order], score=score[order])
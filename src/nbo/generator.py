@@ -0,0 +1,471 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS NBO GENERATOR CORE                                  ║
+║              Vectorized Churn Model & Recommendation Scoring                  ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Computational core of scripts/python/generate_nbo_master.py. The churn logit
+is evaluated once for the whole portfolio (baseline) and once more as an
+(n_clients, n_products) batch for the "client buys product j" counterfactuals;
+score components, the per-client normalization and the ranking of the
+products are array operations. Only the final record dicts are built per
+client.
+
+generate_records() yields records chunk by chunk, optionally scoring the
+chunks on a process pool, so the caller can stream them to disk.
+input_fingerprints() hashes each client's inputs, so incremental runs only
+rescore the clients whose inputs changed.
+"""
+
+import re
+import json
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL TABLES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+PROFITABILITY_TABLE = {
+    "Assicurazione Casa e Famiglia: Casa Serena": {
+        "area_bisogno": "Protezione",
+        "margine_medio_annuo": 450,
+        "redditivita_norm": 0.75
+    },
+    "Polizza Salute e Infortuni: Salute Protetta": {
+        "area_bisogno": "Protezione",
+        "margine_medio_annuo": 520,
+        "redditivita_norm": 0.87
+    },
+    "Polizza Vita a Premio Unico: Futuro Sicuro": {
+        "area_bisogno": "Risparmio e Investimento",
+        "margine_medio_annuo": 600,
+        "redditivita_norm": 1.00
+    },
+    "Polizza Vita a Premi Ricorrenti: Risparmio Costante": {
+        "area_bisogno": "Risparmio e Investimento",
+        "margine_medio_annuo": 380,
+        "redditivita_norm": 0.63
+    },
+    "Piano Individuale Pensionistico (PIP): Pensione Serenità": {
+        "area_bisogno": "Previdenza",
+        "margine_medio_annuo": 540,
+        "redditivita_norm": 0.90
+    }
+}
+
+# Simulated churn logit
+CHURN_MODEL_PARAMS = {
+    "intercept": -0.5,
+    "coef_num_polizze": -0.42,
+    "coef_anzianita": -0.08,
+    "coef_visite": -0.15,
+    "coef_satisfaction": -0.025,
+    "coef_reclami": 0.35,
+    "coef_eta": 0.015,
+    "coef_reddito": -0.00001,
+    "coef_engagement": -0.018,
+    "coef_num_figli": -0.05,
+    "coef_protezione": -0.25,
+    "coef_risparmio": -0.30,
+    "coef_previdenza": -0.35
+}
+
+CLUSTER_AFFINITY = {
+    1: {"Protezione": 0.75, "Risparmio e Investimento": 0.42, "Previdenza": 0.25},
+    2: {"Protezione": 0.50, "Risparmio e Investimento": 0.83, "Previdenza": 0.58},
+    3: {"Protezione": 0.92, "Risparmio e Investimento": 0.33, "Previdenza": 0.30},
+    4: {"Protezione": 0.67, "Risparmio e Investimento": 0.75, "Previdenza": 0.67},
+    5: {"Protezione": 0.42, "Risparmio e Investimento": 1.00, "Previdenza": 0.92},
+    6: {"Protezione": 1.00, "Risparmio e Investimento": 0.50, "Previdenza": 0.75},
+    7: {"Protezione": 0.67, "Risparmio e Investimento": 0.58, "Previdenza": 0.50}
+}
+
+AREAS = ("Protezione", "Risparmio e Investimento", "Previdenza")
+
+# An owned product counts for an area if its name contains one of these
+AREA_KEYWORDS = {
+    "Protezione": ("Casa Serena", "Salute Protetta"),
+    "Risparmio e Investimento": ("Futuro Sicuro", "Risparmio Costante"),
+    "Previdenza": ("Pensione Serenità",),
+}
+
+PRODUCTS = tuple(PROFITABILITY_TABLE)
+_PRODUCT_AREA = np.array([AREAS.index(PROFITABILITY_TABLE[p]["area_bisogno"]) for p in PRODUCTS])
+_REDDITIVITA = np.array([PROFITABILITY_TABLE[p]["redditivita_norm"] * 100 for p in PRODUCTS])
+
+# Affinity by cluster (rows 1-7; unknown clusters get 0.5) and area
+_AFFINITY = np.full((8, len(AREAS)), 0.5)
+for _cluster, _areas in CLUSTER_AFFINITY.items():
+    _AFFINITY[_cluster] = [_areas[a] for a in AREAS]
+
+# Feature columns of the logit, with the clienti fields (first non-empty
+# wins) and the default used when all are empty
+NUMERIC_FEATURES = {
+    "eta": (("eta",), 45),
+    "reddito": (("reddito", "reddito_stimato"), 35000),
+    "anzianita": (("anzianita_compagnia",), 5),
+    "visite": (("visite_ultimo_anno",), 0),
+    "satisfaction": (("satisfaction_score",), 75),
+    "reclami": (("reclami_totali",), 0),
+    "engagement": (("engagement_score",), 50),
+    "num_figli": (("numero_figli",), 0),
+    "propensione_vita": (("propensione_vita",), 0.5),
+    "propensione_danni": (("propensione_danni",), 0.5),
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FEATURES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _resolve(frame: pd.DataFrame, fields: Sequence[str], default: float) -> np.ndarray:
+    """First non-empty (not null, not 0) value among fields, else default, as `a or b or default` does."""
+    out = np.full(len(frame), np.nan)
+    for field in fields:
+        if field not in frame:
+            continue
+        values = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=float)
+        fill = np.isnan(out) & ~np.isnan(values) & (values != 0)
+        out[fill] = values[fill]
+    out[np.isnan(out)] = default
+    return out
+
+
+def feature_matrix(clienti: Sequence[Dict[str, Any]], prodotti: Sequence[Sequence[str]]) -> Dict[str, np.ndarray]:
+    """
+    Model inputs for all clients at once.
+
+    Args:
+        clienti: clienti rows
+        prodotti: Active products owned by each client (aligned with clienti)
+
+    Returns:
+        Feature name -> array (NUMERIC_FEATURES, num_polizze, has_<area>
+        flags as (n, len(AREAS)) bool, owned as (n, len(PRODUCTS)) bool)
+    """
+    frame = pd.DataFrame.from_records(list(clienti), columns=sorted({f for fs, _ in NUMERIC_FEATURES.values() for f in fs}))
+    features = {name: _resolve(frame, fields, default) for name, (fields, default) in NUMERIC_FEATURES.items()}
+
+    n = len(clienti)
+    features["num_polizze"] = np.array([len(p) for p in prodotti], dtype=float)
+
+    exploded = pd.Series(list(prodotti), dtype=object).explode().dropna().astype(str)
+    rows = exploded.index.to_numpy(dtype=np.int64)
+    names = exploded.to_numpy()
+
+    owned = np.zeros((n, len(PRODUCTS)), dtype=bool)
+    product_pos = pd.Index(PRODUCTS).get_indexer(names)
+    owned[rows[product_pos >= 0], product_pos[product_pos >= 0]] = True
+
+    has_area = np.zeros((n, len(AREAS)), dtype=bool)
+    for a, area in enumerate(AREAS):
+        pattern = "|".join(re.escape(k) for k in AREA_KEYWORDS[area])
+        has_area[rows[exploded.str.contains(pattern, regex=True).to_numpy(dtype=bool)], a] = True
+
+    features["owned"] = owned
+    features["has_area"] = has_area
+    return features
+
+
+def churn_logit(features: Dict[str, np.ndarray], num_polizze: np.ndarray, has_area: np.ndarray) -> np.ndarray:
+    """
+    Churn probability, broadcasting over any leading shape.
+
+    Terms are added in the model's order, as the scalar formula did.
+
+    Args:
+        features: feature_matrix() output (per-client arrays)
+        num_polizze: Policy count, shape (n,) or (n, k)
+        has_area: Area flags, shape (n, len(AREAS)) or (n, k, len(AREAS))
+    """
+    extra = (slice(None),) + (None,) * (num_polizze.ndim - 1)
+    p = CHURN_MODEL_PARAMS
+    logit = (
+        p["intercept"] +
+        p["coef_num_polizze"] * num_polizze +
+        p["coef_anzianita"] * features["anzianita"][extra] +
+        p["coef_visite"] * features["visite"][extra] +
+        p["coef_satisfaction"] * features["satisfaction"][extra] +
+        p["coef_reclami"] * features["reclami"][extra] +
+        p["coef_eta"] * features["eta"][extra] +
+        p["coef_reddito"] * features["reddito"][extra] +
+        p["coef_engagement"] * features["engagement"][extra] +
+        p["coef_num_figli"] * features["num_figli"][extra] +
+        p["coef_protezione"] * has_area[..., 0] +
+        p["coef_risparmio"] * has_area[..., 1] +
+        p["coef_previdenza"] * has_area[..., 2]
+    )
+    return 1 / (1 + np.exp(-logit))
+
+
+def cluster_nba(features: Dict[str, np.ndarray]) -> np.ndarray:
+    """NBA cluster (1-7) from demographic + behavioral patterns."""
+    eta, reddito, num = features["eta"], features["reddito"], features["num_polizze"]
+    return np.select(
+        [
+            (eta < 35) & (reddito < 40000),
+            (eta < 35) & (reddito >= 40000),
+            (eta >= 35) & (eta < 55) & (num <= 2),
+            (eta >= 35) & (eta < 55) & (num > 2),
+            (eta >= 55) & (features["propensione_vita"] > 0.6),
+            (eta >= 55) & (features["propensione_danni"] > 0.6),
+        ],
+        [1, 2, 3, 4, 5, 6],
+        default=7,
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SCORING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def score_portfolio(features: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Baseline churn and all product counterfactuals for every client.
+
+    Returns:
+        churn (n,), cluster (n,), and (n, len(PRODUCTS)) arrays:
+        retention, redditivita, propensione, affinita, churn_dopo, delta;
+        order (n, len(PRODUCTS)) lists product columns by total score
+        (descending, ties in PRODUCTS order) with owned products last;
+        n_recs (n,) is the number of products not owned
+    """
+    n = len(features["eta"])
+    k = len(PRODUCTS)
+    churn = churn_logit(features, features["num_polizze"], features["has_area"])
+
+    # Counterfactual j: one more policy, area of product j covered
+    has_after = np.repeat(features["has_area"][:, None, :], k, axis=1)
+    has_after[:, np.arange(k), _PRODUCT_AREA] = True
+    churn_after = churn_logit(features, np.repeat(features["num_polizze"][:, None] + 1, k, axis=1), has_after)
+    delta = churn[:, None] - churn_after
+
+    available = ~features["owned"]
+    max_delta = np.where(available, delta, -np.inf).max(axis=1) if k else np.zeros(n)
+    max_delta = np.where((max_delta == 0) | ~np.isfinite(max_delta), 0.001, max_delta)
+    retention = delta / max_delta[:, None] * 100
+
+    # Propensity by area (AREAS order), then per product
+    vita, danni = features["propensione_vita"], features["propensione_danni"]
+    by_area = np.stack([danni * 100, vita * 100, (vita * 0.7 + danni * 0.3) * 100], axis=1)
+    propensione = by_area[:, _PRODUCT_AREA]
+
+    cluster = cluster_nba(features)
+    affinita = _AFFINITY[cluster][:, _PRODUCT_AREA] * 100
+    redditivita = np.broadcast_to(_REDDITIVITA, (n, k))
+
+    total = retention + redditivita + propensione + affinita
+    order = np.argsort(np.where(available, -total, np.inf), axis=1, kind='stable')
+
+    return {
+        "churn": churn,
+        "cluster": cluster,
+        "retention": retention,
+        "redditivita": redditivita,
+        "propensione": propensione,
+        "affinita": affinita,
+        "churn_dopo": churn_after,
+        "delta": delta,
+        "order": order,
+        "n_recs": available.sum(axis=1),
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RECORDS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _recommendations(scores: Dict[str, np.ndarray], i: int) -> List[Dict[str, Any]]:
+    rows = {name: scores[name][i].tolist() for name in
+            ("retention", "redditivita", "propensione", "affinita", "delta", "churn_dopo")}
+    churn_prima = float(scores["churn"][i])
+    recs = []
+    for j in scores["order"][i, :scores["n_recs"][i]].tolist():
+        product = PRODUCTS[j]
+        recs.append({
+            "area_bisogno": PROFITABILITY_TABLE[product]["area_bisogno"],
+            "prodotto": product,
+            "componenti": {
+                "retention_gain": round(rows["retention"][j], 1),
+                "redditivita": round(rows["redditivita"][j], 1),
+                "propensione": round(rows["propensione"][j], 1),
+                "affinita_cluster": round(rows["affinita"][j], 1)
+            },
+            "dettagli": {
+                "delta_churn": round(rows["delta"][j], 4),
+                "churn_prima": round(churn_prima, 4),
+                "churn_dopo": round(rows["churn_dopo"][j], 4)
+            }
+        })
+    return recs
+
+
+def build_records(
+    clienti: Sequence[Dict[str, Any]],
+    prodotti: Sequence[List[str]],
+    abitazioni: Sequence[Optional[Dict[str, Any]]],
+    timestamp: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    NBO master records for a batch of clients.
+
+    Args:
+        clienti: clienti rows
+        prodotti: Active products per client (aligned with clienti)
+        abitazioni: First abitazione per client, or None (aligned with clienti)
+        timestamp: Record timestamp (default: now, UTC)
+
+    Returns:
+        One record per client (nbo_master.json layout)
+    """
+    features = feature_matrix(clienti, prodotti)
+    scores = score_portfolio(features)
+    timestamp = timestamp or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    records = []
+    for i, c in enumerate(clienti):
+        abit = abitazioni[i] or {}
+        prodotti_posseduti = list(prodotti[i])
+        eta = c.get("eta") or 45
+        reddito = c.get("reddito") or c.get("reddito_stimato") or 35000
+        satisfaction = c.get("satisfaction_score") or 75
+        engagement = c.get("engagement_score") or 50
+        propensione_vita = c.get("propensione_vita") or 0.5
+        propensione_danni = c.get("propensione_danni") or 0.5
+        num_figli = c.get("numero_figli") or 0
+
+        records.append({
+            "codice_cliente": c.get("codice_cliente"),
+            "timestamp": timestamp,
+
+            # Anagrafica - from clienti + abitazioni
+            "anagrafica": {
+                "nome": c.get("nome") or "",
+                "cognome": c.get("cognome") or "",
+                "eta": eta,
+                "luogo_nascita": c.get("luogo_nascita") or "",
+                "luogo_residenza": c.get("luogo_residenza") or "",
+                "professione": c.get("professione") or "",
+                "stato_civile": c.get("stato_civile") or "",
+                "numero_figli": num_figli,
+                # From abitazioni
+                "indirizzo": abit.get("indirizzo_completo") or "",
+                "via": abit.get("via") or "",
+                "civico": abit.get("civico") or "",
+                "citta": abit.get("citta") or c.get("luogo_residenza") or "",
+                "cap": abit.get("cap") or "",
+                "provincia": abit.get("provincia") or "",
+                "latitudine": abit.get("latitudine") or c.get("latitudine"),
+                "longitudine": abit.get("longitudine") or c.get("longitudine"),
+            },
+
+            # Raccomandazioni NBO
+            "raccomandazioni": _recommendations(scores, i),
+
+            # Metadata - all real values from DB
+            "metadata": {
+                "churn_attuale": round(float(scores["churn"][i]), 4),
+                "num_polizze_attuali": len(prodotti_posseduti),
+                "cluster_nba": int(scores["cluster"][i]),
+                "cluster_risposta": c.get("cluster_risposta") or "Moderate_Responder",
+                "prodotti_posseduti": prodotti_posseduti,
+                "satisfaction_score": round(satisfaction, 1) if satisfaction else None,
+                "engagement_score": round(engagement, 1) if engagement else None,
+                "clv_stimato": c.get("clv_stimato") or 10000,
+                # Additional real data
+                "reddito": reddito,
+                "reddito_familiare": c.get("reddito_familiare"),
+                "patrimonio_finanziario": c.get("patrimonio_finanziario_stimato"),
+                "patrimonio_reale": c.get("patrimonio_reale_stimato"),
+                "propensione_vita": round(propensione_vita, 4) if propensione_vita else None,
+                "propensione_danni": round(propensione_danni, 4) if propensione_danni else None,
+                "anzianita_compagnia": c.get("anzianita_compagnia") or 5,
+                "visite_ultimo_anno": c.get("visite_ultimo_anno") or 0,
+                "reclami_totali": c.get("reclami_totali") or 0,
+                "agenzia": c.get("agenzia") or "",
+                "zona_residenza": c.get("zona_residenza") or "",
+            }
+        })
+    return records
+
+
+def _build_chunk(args) -> List[Dict[str, Any]]:
+    return build_records(*args)
+
+
+def generate_records(
+    clienti: Sequence[Dict[str, Any]],
+    prodotti: Sequence[List[str]],
+    abitazioni: Sequence[Optional[Dict[str, Any]]],
+    chunk_size: int = 5000,
+    workers: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the NBO master records of a portfolio in input order.
+
+    Args:
+        clienti, prodotti, abitazioni: Aligned inputs (see build_records)
+        chunk_size: Clients scored per batch
+        workers: Processes scoring the batches (1 = in this process)
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    chunks = (
+        (clienti[i:i + chunk_size], prodotti[i:i + chunk_size], abitazioni[i:i + chunk_size], timestamp)
+        for i in range(0, len(clienti), chunk_size)
+    )
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _build_chunk(chunk)
+        return
+
+    # At most 2 x workers chunks in flight: inputs are pickled as the window
+    # advances and finished chunks wait only as long as the writer lags
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_build_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INPUT FINGERPRINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Part of every fingerprint: changing a model table invalidates all clients
+_MODEL_KEY = json.dumps([PROFITABILITY_TABLE, CHURN_MODEL_PARAMS, CLUSTER_AFFINITY], sort_keys=True).encode('utf-8')
+
+
+def input_fingerprints(
+    clienti: Sequence[Dict[str, Any]],
+    prodotti: Sequence[List[str]],
+    abitazioni: Sequence[Optional[Dict[str, Any]]]
+) -> np.ndarray:
+    """
+    64-bit fingerprint of each client's generator inputs.
+
+    Covers the clienti row, the active products (in order, as they end up in
+    prodotti_posseduti), the abitazione and the model tables: a client whose
+    fingerprint did not change gets the same record (timestamp aside).
+
+    Returns:
+        uint64 array aligned with clienti
+    """
+    base = hashlib.blake2b(_MODEL_KEY, digest_size=8)
+    out = np.empty(len(clienti), dtype=np.uint64)
+    for i, c in enumerate(clienti):
+        h = base.copy()
+        h.update(json.dumps([c, list(prodotti[i]), abitazioni[i]],
+                            sort_keys=True, default=str, ensure_ascii=False).encode('utf-8'))
+        out[i] = int.from_bytes(h.digest(), 'little')
+    return out
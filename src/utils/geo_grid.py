@@ -0,0 +1,107 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS GEO GRID                                            ║
+║              Server-side Spatial Aggregation for the Risk Map                 ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Bins the filtered abitazioni into square lat/lon cells so the pydeck map sends
+a bounded number of cells (count, mean risk score, worst severity) instead of
+every point. The resolution is the finest of MAP_GRID_RESOLUTIONS that keeps
+the cell count under MAP_MAX_CELLS, so a city filter gets small cells and the
+national view gets coarse ones.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import MAP_GRID_RESOLUTIONS, MAP_MAX_CELLS
+
+# Cell columns returned by aggregate_grid
+GRID_COLUMNS = ['lat', 'lon', 'count', 'risk_score', 'weight', 'severity']
+
+_METERS_PER_DEGREE = 111_320.0
+
+
+def _cell_keys(lat: np.ndarray, lon: np.ndarray, cell_deg: float) -> np.ndarray:
+    """One int64 key per point: row/column of its cell packed together."""
+    row = np.floor(lat / cell_deg).astype(np.int64)
+    col = np.floor(lon / cell_deg).astype(np.int64)
+    return (row << 32) + (col & 0xFFFFFFFF)
+
+
+def choose_resolution(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    max_cells: int = MAP_MAX_CELLS,
+    resolutions: Sequence[float] = MAP_GRID_RESOLUTIONS
+) -> float:
+    """
+    Finest cell size (degrees) producing at most max_cells non-empty cells.
+
+    Falls back to the coarsest resolution when none fits.
+    """
+    for cell_deg in sorted(resolutions):
+        if len(np.unique(_cell_keys(lat, lon, cell_deg))) <= max_cells:
+            return cell_deg
+    return max(resolutions)
+
+
+def aggregate_grid(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    risk_score: np.ndarray,
+    severity: np.ndarray,
+    cell_deg: float,
+    weight: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """
+    Aggregate points into square cells of cell_deg degrees.
+
+    Args:
+        lat, lon: Point coordinates (no NaN)
+        risk_score: Per-point risk score (averaged per cell)
+        severity: Per-point severity rank (max per cell)
+        cell_deg: Cell size in degrees
+        weight: Optional per-point heatmap weight (summed per cell);
+                defaults to 1 per point
+
+    Returns:
+        DataFrame with GRID_COLUMNS, one row per non-empty cell; lat/lon
+        are the cell centres
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) == 0:
+        return pd.DataFrame(columns=GRID_COLUMNS)
+
+    keys, inverse = np.unique(_cell_keys(lat, lon, cell_deg), return_inverse=True)
+    n_cells = len(keys)
+
+    count = np.bincount(inverse, minlength=n_cells)
+    score = np.bincount(inverse, weights=np.nan_to_num(np.asarray(risk_score, dtype=float)), minlength=n_cells)
+    if weight is None:
+        weight_sum = count.astype(float)
+    else:
+        weight_sum = np.bincount(inverse, weights=np.nan_to_num(np.asarray(weight, dtype=float)), minlength=n_cells)
+    worst = np.zeros(n_cells, dtype=np.uint8)
+    np.maximum.at(worst, inverse, np.asarray(severity, dtype=np.uint8))
+
+    row = keys >> 32
+    col = (keys & 0xFFFFFFFF).astype(np.int64)
+    col = np.where(col >= 2**31, col - 2**32, col)  # restore negative longitudes
+
+    return pd.DataFrame({
+        'lat': (row + 0.5) * cell_deg,
+        'lon': (col + 0.5) * cell_deg,
+        'count': count,
+        'risk_score': np.round(score / count, 1),
+        'weight': weight_sum,
+        'severity': worst,
+    })
+
+
+def cell_radius_meters(cell_deg: float) -> float:
+    """Column radius that fills most of a cell without touching its neighbours."""
+    return cell_deg * _METERS_PER_DEGREE * 0.45
@@ -0,0 +1,118 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS HTTP CLIENT                                         ║
+║              Pooled Keep-Alive Sessions for OpenRouter Traffic                ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The Iris chat completions, the RAG query embeddings and the satellite vision
+analysis all go through post(). Every thread gets its own requests.Session,
+and all the sessions mount one shared HTTPAdapter. Its urllib3 pool is
+thread-safe, so TLS connections are reused across calls and threads, while
+no Session state (cookies, headers) is shared between threads.
+
+Each call names its endpoint ("chat", "embeddings", "vision"), which picks
+its read timeout from HTTP_TIMEOUTS and keys the per-endpoint counters.
+http_stats() reports those counters together with the connections opened
+per host, to show how often a request reused a connection.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config.constants import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TIMEOUTS,
+    API_TIMEOUT_DEFAULT,
+)
+
+logger = logging.getLogger(__name__)
+
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+_local = threading.local()
+
+_stats_lock = threading.Lock()
+_endpoint_stats: Dict[str, Dict[str, float]] = {}
+
+
+def get_session() -> requests.Session:
+    """This thread's Session (created on first use, mounted on the shared pool)."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        _local.session = session
+    return session
+
+
+def timeout_for(endpoint: str) -> tuple:
+    """(connect, read) timeout of an endpoint."""
+    return HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUTS.get(endpoint, API_TIMEOUT_DEFAULT)
+
+
+def post(endpoint: str, url: str, timeout: Optional[Any] = None, **kwargs) -> requests.Response:
+    """
+    POST through the pooled session.
+
+    Args:
+        endpoint: Endpoint name (HTTP_TIMEOUTS key, used for the counters)
+        url: Request URL
+        timeout: Overrides the endpoint timeout
+        **kwargs: Passed to requests (headers, json, stream, ...)
+
+    Returns:
+        The response (with stream=True, close it or use it as a context
+        manager so its connection goes back to the pool)
+    """
+    start = time.perf_counter()
+    failed = True
+    try:
+        response = get_session().post(url, timeout=timeout or timeout_for(endpoint), **kwargs)
+        failed = False
+        return response
+    finally:
+        seconds = time.perf_counter() - start
+        with _stats_lock:
+            entry = _endpoint_stats.setdefault(endpoint, {"requests": 0, "errors": 0, "total_seconds": 0.0})
+            entry["requests"] += 1
+            entry["errors"] += int(failed)
+            entry["total_seconds"] += seconds
+        logger.debug(f"HTTP {endpoint}: {seconds * 1000:.0f} ms")
+
+
+def http_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Snapshot of the HTTP counters.
+
+    Returns:
+        {"endpoints": endpoint -> requests, errors, total_seconds (time to
+        the response headers)}, {"hosts": host -> requests sent and
+        connections opened by the pool}; requests - connections were served
+        on a reused connection
+    """
+    with _stats_lock:
+        endpoints = {name: dict(entry) for name, entry in _endpoint_stats.items()}
+
+    hosts = {}
+    pools = _adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        entry = hosts.setdefault(pool.host, {"requests": 0, "connections": 0})
+        entry["requests"] += pool.num_requests
+        entry["connections"] += pool.num_connections
+    return {"endpoints": endpoints, "hosts": hosts}
+
+
+def reset_http_stats() -> None:
+    """Clear the per-endpoint counters (the pool's connection counters keep running)."""
+    with _stats_lock:
+        _endpoint_stats.clear()
@@ -0,0 +1,143 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS MAP PAYLOAD                                         ║
+║              Slim Layer Data & Render Size Tracking for pydeck                ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+pydeck serializes every column of a layer's DataFrame into the page on each
+rerun. The builders here keep only what a layer reads: coordinates (rounded
+to 5 decimals, ~1 m, the precision a float32 holds at Italian latitudes),
+colour, weight and the fields named in the tooltip template. The heatmap gets
+positions and weights only.
+
+Streamlit renders decks from their JSON spec, so pydeck's binary transport
+(Jupyter widgets only) is not available; smaller JSON is the lever here.
+Typed columns do not help in JSON: pydeck writes float32 coordinates with
+17 digits and uint8 array cells as strings ("[1 2 3 4]"), so coordinates
+stay rounded float64 and colours plain lists.
+
+record_deck_payload() measures the serialized size of each rendered deck.
+It serializes the deck a second time, so it only runs when
+PAYLOAD_METRICS_ENABLED is set (off by default).
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import PAYLOAD_METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Decimal places kept for coordinates (1e-5 degrees ~ 1.1 m)
+COORD_DECIMALS = 5
+WEIGHT_DECIMALS = 2
+
+_TOOLTIP_FIELD = re.compile(r"\{(\w+)\}")
+
+
+class MapPayload(NamedTuple):
+    """Per-layer data: heatmap (lon, lat, weight) and points (lon, lat, color, tooltip fields)."""
+    heat: pd.DataFrame
+    points: pd.DataFrame
+
+
+def tooltip_fields(tooltip_html: str) -> List[str]:
+    """Field names referenced as {field} in a pydeck tooltip template."""
+    return list(dict.fromkeys(_TOOLTIP_FIELD.findall(tooltip_html)))
+
+
+def _coords(df: pd.DataFrame, lon_col: str, lat_col: str) -> Dict[str, np.ndarray]:
+    return {
+        'lon': np.round(pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype=float), COORD_DECIMALS),
+        'lat': np.round(pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype=float), COORD_DECIMALS),
+    }
+
+
+def build_map_payload(
+    df: pd.DataFrame,
+    colors: np.ndarray,
+    weight_col: str,
+    fields: Sequence[str] = (),
+    lon_col: str = 'longitudine',
+    lat_col: str = 'latitudine'
+) -> MapPayload:
+    """
+    Build the slim heatmap and point layer data for a set of map rows.
+
+    Args:
+        df: Rows to draw
+        colors: (len(df), 4) uint8 RGBA array aligned with df
+        weight_col: Heatmap weight column
+        fields: Tooltip fields to carry on the points (missing ones are skipped)
+        lon_col, lat_col: Coordinate columns of df
+
+    Returns:
+        MapPayload; layers read get_position=['lon', 'lat'], get_weight='weight',
+        get_fill_color='color'
+    """
+    coords = _coords(df, lon_col, lat_col)
+    weight = pd.to_numeric(df[weight_col], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    heat = pd.DataFrame({**coords, 'weight': np.round(weight, WEIGHT_DECIMALS)})
+
+    points = pd.DataFrame(coords)
+    points['color'] = np.asarray(colors, dtype=np.uint8).tolist()
+    for field in fields:
+        if field in df.columns and field not in points.columns:
+            points[field] = df[field].to_numpy()
+
+    return MapPayload(heat=heat, points=points)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RENDER SIZE TRACKING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_stats_lock = threading.Lock()
+_render_stats: Dict[str, Dict[str, int]] = {}
+
+
+def record_deck_payload(name: str, deck, rows: int) -> Optional[int]:
+    """
+    Measure the serialized size of a deck about to be rendered.
+
+    Costs one extra deck.to_json(); a no-op unless PAYLOAD_METRICS_ENABLED.
+
+    Args:
+        name: Render kind (e.g. "points", "grid")
+        deck: pdk.Deck
+        rows: Rows drawn by the deck's main layer
+
+    Returns:
+        Size in bytes, or None when metrics are disabled
+    """
+    if not PAYLOAD_METRICS_ENABLED:
+        return None
+
+    size = len(deck.to_json().encode("utf-8"))
+    with _stats_lock:
+        entry = _render_stats.setdefault(name, {"renders": 0, "rows": 0, "bytes": 0, "last_bytes": 0})
+        entry["renders"] += 1
+        entry["rows"] += rows
+        entry["bytes"] += size
+        entry["last_bytes"] = size
+
+    logger.debug(f"Map payload {name}: {rows} rows, {size} bytes")
+    return size
+
+
+def render_stats() -> Dict[str, Dict[str, int]]:
+    """Snapshot of the cumulative per-kind map render counters."""
+    with _stats_lock:
+        return {key: dict(entry) for key, entry in _render_stats.items()}
+
+
+def reset_render_stats() -> None:
+    """Clear the map render counters."""
+    with _stats_lock:
+        _render_stats.clear()
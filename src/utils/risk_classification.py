@@ -0,0 +1,160 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS RISK CLASSIFICATION                                 ║
+║              Vectorized Level Codes & RGBA Palettes                           ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+Replaces the row-wise .apply(lambda ...) colour/level helpers of the Analytics
+map and charts: every value is turned into a small integer code with
+np.digitize / lookups, and colours are a single fancy-index into a uint8
+palette, for all four map modes in one pass.
+"""
+
+from typing import Dict, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import (
+    HYDRO_P3_LEVEL_BINS,
+    FLOOD_P3_LEVEL_BINS,
+    DEFAULT_SEISMIC_ZONE,
+    RISK_CATEGORY_CRITICAL,
+    RISK_CATEGORY_HIGH,
+    RISK_CATEGORY_MEDIUM,
+    RISK_CATEGORY_LOW,
+)
+
+# Map modes (labels of the Analytics map selector)
+MODE_COMPOSITE = "Rischio Composito"
+MODE_SEISMIC = "Rischio Sismico"
+MODE_HYDRO = "Rischio Idrogeologico"
+MODE_FLOOD = "Rischio Alluvione"
+MAP_MODES = (MODE_COMPOSITE, MODE_SEISMIC, MODE_HYDRO, MODE_FLOOD)
+
+# Level codes shared by the hydro/flood classifications
+LEVEL_LOW, LEVEL_MEDIUM, LEVEL_HIGH, LEVEL_MISSING = 0, 1, 2, 3
+
+_RED = (220, 38, 38, 200)
+_ORANGE = (234, 88, 12, 200)
+_AMBER = (202, 138, 4, 180)
+_GREEN = (22, 163, 74, 180)
+_GREY = (200, 200, 200, 100)
+
+# Palettes indexed by code (uint8 RGBA rows)
+LEVEL_PALETTE = np.array([_GREEN, _AMBER, _RED, _GREY], dtype=np.uint8)
+
+# Composite: Critico, Alto, Medio, Basso, anything else (e.g. "Non valutato")
+CATEGORY_ORDER = (RISK_CATEGORY_CRITICAL, RISK_CATEGORY_HIGH, RISK_CATEGORY_MEDIUM, RISK_CATEGORY_LOW)
+CATEGORY_PALETTE = np.array([_RED, _ORANGE, _AMBER, _GREEN, _GREEN], dtype=np.uint8)
+
+# Seismic: code = zone - 1 for zones 1-4, 4 for anything else
+SEISMIC_PALETTE = np.array([_RED, _ORANGE, _AMBER, _GREEN, _GREY], dtype=np.uint8)
+
+# Severity ranks (higher = worse), used to pick the worst value of a map cell.
+# code -> severity, and severity -> colour per mode
+_REVERSED_SEVERITY = np.array([4, 3, 2, 1, 0], dtype=np.uint8)
+_LEVEL_SEVERITY = np.array([1, 2, 3, 0], dtype=np.uint8)
+SEVERITY_PALETTES: Dict[str, np.ndarray] = {
+    MODE_COMPOSITE: np.array([_GREEN, _GREEN, _AMBER, _ORANGE, _RED], dtype=np.uint8),
+    MODE_SEISMIC: np.array([_GREY, _GREEN, _AMBER, _ORANGE, _RED], dtype=np.uint8),
+    MODE_HYDRO: np.array([_GREY, _GREEN, _AMBER, _RED], dtype=np.uint8),
+    MODE_FLOOD: np.array([_GREY, _GREEN, _AMBER, _RED], dtype=np.uint8),
+}
+
+
+def level_codes(values, bins) -> np.ndarray:
+    """
+    Classify numeric values into LOW / MEDIUM / HIGH (< bins[0], < bins[1], >= bins[1]).
+
+    Non-numeric or missing values get LEVEL_MISSING.
+
+    Returns:
+        uint8 code array
+    """
+    v = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    codes = np.digitize(v, bins).astype(np.uint8)
+    codes[np.isnan(v)] = LEVEL_MISSING
+    return codes
+
+
+def category_codes(categories) -> np.ndarray:
+    """Composite risk category -> code (position in CATEGORY_ORDER, 4 = other)."""
+    codes = pd.Index(CATEGORY_ORDER).get_indexer(pd.Series(categories))
+    return np.where(codes < 0, len(CATEGORY_ORDER), codes).astype(np.uint8)
+
+
+def seismic_codes(zones) -> np.ndarray:
+    """Seismic zone -> code (zone - 1; missing = default zone; unknown zones = 4)."""
+    z = pd.to_numeric(pd.Series(zones), errors='coerce').to_numpy(dtype=float)
+    z = np.where(np.isnan(z), DEFAULT_SEISMIC_ZONE, np.trunc(z))
+    valid = (z >= 1) & (z <= 4)
+    return np.where(valid, z - 1, 4).astype(np.uint8)
+
+
+class RiskClassification(NamedTuple):
+    """Per-row codes for every map mode, aligned with the classified frame."""
+    category: np.ndarray
+    seismic: np.ndarray
+    hydro: np.ndarray
+    flood: np.ndarray
+
+    def colors(self, mode: str) -> np.ndarray:
+        """(n, 4) uint8 RGBA array for a map mode."""
+        if mode == MODE_COMPOSITE:
+            return CATEGORY_PALETTE[self.category]
+        if mode == MODE_SEISMIC:
+            return SEISMIC_PALETTE[self.seismic]
+        if mode == MODE_HYDRO:
+            return LEVEL_PALETTE[self.hydro]
+        if mode == MODE_FLOOD:
+            return LEVEL_PALETTE[self.flood]
+        raise ValueError(f"Unknown map mode '{mode}'")
+
+    def severity(self, mode: str) -> np.ndarray:
+        """uint8 severity rank per row for a map mode (see SEVERITY_PALETTES)."""
+        if mode == MODE_COMPOSITE:
+            return _REVERSED_SEVERITY[self.category]
+        if mode == MODE_SEISMIC:
+            return _REVERSED_SEVERITY[self.seismic]
+        if mode == MODE_HYDRO:
+            return _LEVEL_SEVERITY[self.hydro]
+        if mode == MODE_FLOOD:
+            return _LEVEL_SEVERITY[self.flood]
+        raise ValueError(f"Unknown map mode '{mode}'")
+
+
+def classify(df: pd.DataFrame, missing_levels_as_low: bool = True) -> RiskClassification:
+    """
+    Compute the codes of all four map modes in one pass.
+
+    Args:
+        df: Frame with risk_category, zona_sismica, hydro_risk_p3, flood_risk_p3
+        missing_levels_as_low: The map draws missing P3 values as low risk
+                               (they used to be fillna(0)-ed); charts leave
+                               them out instead (LEVEL_MISSING)
+
+    Returns:
+        RiskClassification
+    """
+    n = len(df)
+    missing = np.full(n, LEVEL_MISSING, dtype=np.uint8)
+
+    hydro = level_codes(df['hydro_risk_p3'], HYDRO_P3_LEVEL_BINS) if 'hydro_risk_p3' in df else missing
+    flood = level_codes(df['flood_risk_p3'], FLOOD_P3_LEVEL_BINS) if 'flood_risk_p3' in df else missing
+    if missing_levels_as_low:
+        hydro = np.where(hydro == LEVEL_MISSING, LEVEL_LOW, hydro).astype(np.uint8)
+        flood = np.where(flood == LEVEL_MISSING, LEVEL_LOW, flood).astype(np.uint8)
+
+    return RiskClassification(
+        category=category_codes(df['risk_category']),
+        seismic=seismic_codes(df['zona_sismica']),
+        hydro=hydro,
+        flood=flood,
+    )
+
+
+def level_counts(codes: np.ndarray, labels) -> Dict[str, int]:
+    """Count LOW / MEDIUM / HIGH codes (LEVEL_MISSING is not counted)."""
+    counts = np.bincount(codes[codes != LEVEL_MISSING], minlength=len(labels))
+    return {label: int(counts[i]) for i, label in enumerate(labels)}
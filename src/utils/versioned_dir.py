@@ -0,0 +1,89 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════════╗
+║                    HELIOS VERSIONED DIRECTORIES                               ║
+║              Build-Then-Swap Layout for Multi-File Artifacts                  ║
+╚═══════════════════════════════════════════════════════════════════════════════╝
+
+The NBO artifact (src/nbo/artifact.py) and the interaction vector index
+(src/iris/vector_index.py) are directories of files that only make sense
+together. Replacing them file by file lets a reader open arrays from two
+different builds under one manifest, so every build goes to its own
+subdirectory instead:
+
+    <path>/current              name of the live build (one line)
+    <path>/<version>-<suffix>/  one complete build per subdirectory
+    <path>/.build-<suffix>/     build being written
+
+A writer fills new_build(), then publish() renames it into place and
+replaces the `current` pointer with one os.replace, so readers resolving
+current_dir() see either the old build or the new one, never a mix. The
+previous build is kept for readers that resolved it just before the swap;
+older ones are removed.
+
+Directories written before this layout (files directly in <path>, no
+`current` pointer) are still read as they are.
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Sequence
+
+CURRENT = "current"
+_BUILD_PREFIX = ".build-"
+
+
+def current_dir(path: str) -> str:
+    """Directory of the live build of path (path itself for the flat layout)."""
+    try:
+        with open(os.path.join(path, CURRENT), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return path
+    return os.path.join(path, name) if name else path
+
+
+def new_build(path: str) -> str:
+    """Empty hidden directory under path to write a build into."""
+    os.makedirs(path, exist_ok=True)
+    return tempfile.mkdtemp(dir=path, prefix=_BUILD_PREFIX)
+
+
+def discard(build: str) -> None:
+    """Remove an unpublished build."""
+    shutil.rmtree(build, ignore_errors=True)
+
+
+def publish(path: str, build: str, version: str, legacy: Sequence[str] = ()) -> str:
+    """
+    Make a complete build the live one.
+
+    Args:
+        path: Versioned directory
+        build: Directory returned by new_build(path), fully written
+        version: Version token, used as the prefix of the build's name
+        legacy: File names of the flat layout, removed from path once the
+                flat build is no longer the previous one
+
+    Returns:
+        The published build directory
+    """
+    previous = current_dir(path)
+    name = f"{version}-{os.path.basename(build)[len(_BUILD_PREFIX):]}"
+    os.rename(build, os.path.join(path, name))
+
+    fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(name + '\n')
+    os.replace(tmp, os.path.join(path, CURRENT))
+
+    keep = {name, os.path.basename(previous)}
+    for entry in os.listdir(path):
+        full = os.path.join(path, entry)
+        if entry not in keep and not entry.startswith('.') and os.path.isdir(full):
+            shutil.rmtree(full, ignore_errors=True)
+    if os.path.normpath(previous) != os.path.normpath(path):
+        for entry in legacy:
+            if os.path.isfile(os.path.join(path, entry)):
+                os.remove(os.path.join(path, entry))
+    return os.path.join(path, name)
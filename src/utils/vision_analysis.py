@@ -2,10 +2,11 @@
 import os
 import json
 import base64
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
 
+from src.utils import http_client
+
 # Load environment variables
 load_dotenv()
 
@@ -172,7 +173,7 @@ def analyze_image(image_path: str, model: str = DEFAULT_MODEL, api_key: str = No
             "max_tokens": 2000
         }
         
-        response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload, timeout=60)
+        response = http_client.post("vision", OPENROUTER_API_URL, headers=headers, json=payload)
         
         if response.status_code != 200:
             return {"error": f"API Error {response.status_code}: {response.text}"}
@@ -0,0 +1,82 @@
+"""
+Tests for the Analytics dashboard aggregates (local fallback + RPC normalization).
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.data.analytics import compute_analytics_summary, filter_frame, _normalize_summary
+
+
+def make_frame():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, 5, 6],
+        'citta': ['Milano', 'Milano', 'Roma', 'Roma', 'Napoli', 'Napoli'],
+        'risk_category': ['Critico', 'Alto', 'Medio', 'Basso', 'Alto', 'Non valutato'],
+        'risk_score': [90.0, 70.0, 40.0, 10.0, 75.0, 0.0],
+        'zona_sismica': [3, 3, 3, 4, 2, 2],
+        'hydro_risk_p3': [1.0, 6.0, 25.0, np.nan, 4.9, 20.0],
+        'flood_risk_p3': [0.0, 10.0, 29.9, 30.0, np.nan, np.nan],
+        'clv': [1000.0, 2000.0, 3000.0, 0.0, 500.0, 500.0],
+        'churn_probability': [0.0, 0.1, 0.25, 0.5, 0.9, 1.0],
+    })
+
+
+def test_filters_combine():
+    df = make_frame()
+    assert filter_frame(df, city='Milano')['id'].tolist() == [1, 2]
+    assert filter_frame(df, risk='Alto', zone=2)['id'].tolist() == [5]
+    assert len(filter_frame(df)) == 6
+
+
+def test_summary_matches_previous_dashboard_math():
+    summary = compute_analytics_summary(make_frame())
+    kpis = summary['kpis']
+
+    assert kpis['total'] == 6
+    assert kpis['avg_score'] == round((90 + 70 + 40 + 10 + 75 + 0) / 6, 1)
+    assert (kpis['critico'], kpis['alto'], kpis['medio'], kpis['basso']) == (1, 2, 1, 1)
+    assert kpis['high_risk_pct'] == 50.0
+    assert summary['n_cities_all'] == 3
+
+    # Missing P3 values are not counted in any level
+    assert summary['hydro_levels'] == {'Basso': 2, 'Medio': 1, 'Alto': 2}
+    assert summary['flood_levels'] == {'Basso': 1, 'Medio': 2, 'Alto': 1}
+    # churn = 0 falls outside the first (0, 0.2] band, as with pd.cut
+    assert summary['churn_bins'] == {'Molto Basso': 1, 'Basso': 1, 'Medio': 1, 'Alto': 0, 'Molto Alto': 2}
+    assert summary['zone_counts'] == [{'label': 2, 'count': 2}, {'label': 3, 'count': 3}, {'label': 4, 'count': 1}]
+    assert summary['top_cities'][0]['citta'] == 'Milano'
+
+
+def test_empty_selection():
+    summary = compute_analytics_summary(make_frame(), city='Torino')
+    assert summary['kpis']['total'] == 0
+    assert summary['kpis']['avg_clv'] == 0
+    assert summary['total_all'] == 6
+
+
+def test_scatter_sample_is_bounded_and_stable():
+    df = pd.concat([make_frame()] * 50, ignore_index=True)
+    first = compute_analytics_summary(df, sample_size=20)['clv_risk_sample']
+    second = compute_analytics_summary(df, sample_size=20)['clv_risk_sample']
+    assert len(first) == 20
+    assert first == second
+
+
+def test_rpc_payload_is_normalized():
+    raw = {
+        'kpis': {'total': 10, 'avg_score': 51.2, 'critico': 2, 'alto': 3, 'medio': 4, 'basso': 1,
+                 'avg_clv': 1234.5, 'n_cities': 3},
+        'total_all': 20,
+        'n_cities_all': 5,
+        'risk_distribution': [{'label': 'Medio', 'count': 4}],
+        'zone_counts': [{'label': '3', 'count': 10}],
+        'hydro_levels': {'Basso': 1},
+        'churn_bins': {'Alto': 2},
+    }
+    summary = _normalize_summary(raw)
+    assert summary['kpis']['high_risk_pct'] == 50.0
+    assert summary['zone_counts'] == [{'label': 3, 'count': 10}]
+    assert summary['hydro_levels'] == {'Basso': 1, 'Medio': 0, 'Alto': 0}
+    assert list(summary['churn_bins']) == ['Molto Basso', 'Basso', 'Medio', 'Alto', 'Molto Alto']
+    assert summary['top_cities'] == []
@@ -0,0 +1,114 @@
+"""
+Tests for the remote Top 20 eligibility check (RPC per chunk, table query fallback).
+"""
+
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from src.data import db_utils
+
+
+class _RpcClient:
+    """Answers get_eligibility_indicators: clients with an even ID have an open complaint."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def rpc(self, name, params):
+        with self.lock:
+            self.calls.append((name, list(params["p_clienti"])))
+        if self.fail:
+            raise RuntimeError("function get_eligibility_indicators does not exist")
+        rows = [{"codice_cliente": cid, "open_complaint": cid % 2 == 0} for cid in params["p_clienti"]]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+
+def _check(client, codes):
+    with mock.patch.object(db_utils, "get_supabase_client", return_value=client), \
+            mock.patch.object(db_utils, "get_interaction_index", return_value=None), \
+            mock.patch.object(db_utils, "ELIGIBILITY_RPC_CHUNK_SIZE", 3):
+        return db_utils.check_all_clients_interactions_batch(codes)
+
+
+def test_rpc_chunks_cover_every_client():
+    db_utils._eligibility_rpc_failed_at = None
+    client = _RpcClient()
+    result = _check(client, [1, 2, 3, 4, 5, 6, 7, "CLI_8"])
+
+    assert sorted(len(ids) for _, ids in client.calls) == [2, 3, 3]
+    assert result[2]["open_complaint"] and not result[7]["open_complaint"]
+    assert result["CLI_8"]["open_complaint"]
+    assert set(result[1]) == set(db_utils._no_indicators())
+
+
+def test_failed_rpc_falls_back_to_table_queries():
+    db_utils._eligibility_rpc_failed_at = None
+    client = _RpcClient(fail=True)
+    queried = []
+
+    def fake_chunk(_client, chunk, windows):
+        queried.append(list(chunk))
+        return {cid: dict(db_utils._no_indicators(), claim_last_60_days=True) for cid in chunk}
+
+    with mock.patch.object(db_utils, "_query_indicator_chunk", side_effect=fake_chunk):
+        result = _check(client, [1, 2, 3, 4])
+        assert all(indicators["claim_last_60_days"] for indicators in result.values())
+
+        # The RPC is not retried right after a failure
+        client.calls.clear()
+        _check(client, [5])
+        assert client.calls == []
+    assert [5] in queried
+    db_utils._eligibility_rpc_failed_at = None
+
+
+class _TableClient:
+    """Filters in-memory rows with the in_/gte/eq calls the fallback queries use."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        rows, filters = self.tables[name], []
+
+        class _Query:
+            def select(self, columns):
+                return self
+
+            def in_(self, col, values):
+                filters.append(lambda r: r[col] in values)
+                return self
+
+            def gte(self, col, value):
+                filters.append(lambda r: str(r[col]) >= value)
+                return self
+
+            def eq(self, col, value):
+                filters.append(lambda r: r[col] == value)
+                return self
+
+            def execute(self):
+                return SimpleNamespace(data=[r for r in rows if all(f(r) for f in filters)])
+
+        return _Query()
+
+
+def test_table_fallback_sees_open_complaints_of_any_age():
+    tables = {
+        "interactions": [
+            {"id": 1, "codice_cliente": 1, "tipo_interazione": "reclamo", "data_interazione": "2024-01-01",
+             "esito": "in_corso"},
+            {"id": 2, "codice_cliente": 2, "tipo_interazione": "reclamo", "data_interazione": "2024-01-01",
+             "esito": "risolto"},
+        ],
+        "polizze": [],
+        "sinistri": [],
+    }
+    windows = {key: "2026-10-10" for key in ("p_email_since", "p_call_since", "p_policy_since", "p_claim_since")}
+    result = db_utils._query_indicator_chunk(_TableClient(tables), [1, 2, 3], windows)
+
+    assert result[1]["open_complaint"]
+    assert not result[2]["open_complaint"] and not result[3]["open_complaint"]
@@ -0,0 +1,25 @@
+from unittest import mock
+
+from src.data import db_utils
+
+
+def test_epoch_advances_on_write_and_time_window():
+    with mock.patch.object(db_utils.time, "time", return_value=1000.0):
+        before = db_utils.eligibility_epoch()
+        assert db_utils.eligibility_epoch() == before
+
+        db_utils._advance_eligibility_epoch()
+        after_write = db_utils.eligibility_epoch()
+        assert after_write[0] == before[0] + 1
+
+    later = 1000.0 + db_utils.ELIGIBILITY_EPOCH_SECONDS
+    with mock.patch.object(db_utils.time, "time", return_value=later):
+        assert db_utils.eligibility_epoch()[1] == after_write[1] + 1
+
+
+def test_successful_interaction_write_advances_epoch():
+    fake_client = mock.MagicMock()
+    with mock.patch.object(db_utils, "get_supabase_client", return_value=fake_client):
+        before = db_utils.eligibility_epoch()[0]
+        assert db_utils.insert_phone_call_interaction(42, polizza_proposta="Casa Serena")
+        assert db_utils.eligibility_epoch()[0] == before + 1
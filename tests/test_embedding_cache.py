@@ -0,0 +1,71 @@
+import numpy as np
+
+from src.iris import engine as iris_engine
+from src.iris.embedding_cache import EmbeddingCache, normalize_query
+from src.iris.engine import IrisEngine
+
+MODEL = "openai/text-embedding-3-small"
+
+
+def test_normalized_queries_share_one_computation(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    computed = []
+
+    def compute(text):
+        computed.append(text)
+        return [1.0, 2.0, 3.0]
+
+    first = cache.get_or_compute(MODEL, "Ci sono stati  problemi recenti?", compute)
+    second = cache.get_or_compute(MODEL, " ci sono stati problemi RECENTI? ", compute)
+
+    assert computed == [normalize_query("Ci sono stati problemi recenti?")]
+    assert first.dtype == np.float32 and second.tolist() == [1.0, 2.0, 3.0]
+    assert cache.get("other-model", "ci sono stati problemi recenti?") is None
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_disk_store_survives_eviction_and_restarts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=1)
+    cache.put(MODEL, "storico reclami", [0.5, 0.25])
+    cache.put(MODEL, "polizze attive", [1.0, 0.0])  # evicts "storico reclami" from memory
+
+    assert cache.get(MODEL, "storico reclami").tolist() == [0.5, 0.25]
+    assert cache.stats()["disk_hits"] == 1
+    assert EmbeddingCache(str(tmp_path)).get(MODEL, "Storico reclami").tolist() == [0.5, 0.25]
+
+
+class _Rpc:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def rpc(self, name, params):
+        self.calls.append(params["query_embedding"])
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": [{"id": 1, "contenuto": "reclamo"}]})()
+
+
+def test_rag_tool_embeds_each_query_once(tmp_path, monkeypatch):
+    rpc_calls, posts = [], []
+
+    class _Embedding:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"data": [{"embedding": [0.1, 0.2]}]}
+
+    def fake_post(endpoint, url, **kwargs):
+        posts.append(kwargs["json"]["input"])
+        return _Embedding()
+
+    monkeypatch.setattr(iris_engine, "_embedding_cache", EmbeddingCache(str(tmp_path)))
+    monkeypatch.setattr(iris_engine.http_client, "post", fake_post)
+    engine = IrisEngine(supabase_client=_Rpc(rpc_calls))
+
+    for client_id in (1, 2, 3):
+        assert engine.tool_rag_retriever(client_id, "Storico reclami")["search_type"] == "vector"
+
+    assert posts == ["storico reclami"]
+    assert len(rpc_calls) == 3 and np.allclose(rpc_calls[0], [0.1, 0.2])
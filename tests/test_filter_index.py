@@ -0,0 +1,70 @@
+"""
+Tests for the Analytics filter index.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.data.filter_index import FilterIndex, build_indexed_frame
+from src.data.analytics import FILTER_COLUMNS, filter_frame, compute_analytics_summary
+
+
+def make_frame(n=500, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'citta': rng.choice(['Milano', 'Roma', 'Napoli', 'Bari', 'Torino'], n),
+        'risk_category': rng.choice(['Critico', 'Alto', 'Medio', 'Basso', 'Non valutato'], n),
+        'zona_sismica': rng.choice([1.0, 2.0, 3.0, 4.0], n),
+        'risk_score': rng.uniform(0, 100, n),
+        'hydro_risk_p3': rng.uniform(0, 40, n),
+        'flood_risk_p3': rng.uniform(0, 40, n),
+        'clv': rng.uniform(0, 5000, n),
+        'churn_probability': rng.uniform(0, 1, n),
+    })
+
+
+def test_select_matches_boolean_masks():
+    df = make_frame()
+    index = FilterIndex(df, FILTER_COLUMNS)
+
+    for city in [None, 'Milano', 'Bari']:
+        for risk in [None, 'Alto', 'Non valutato']:
+            for zone in [None, 1, 4]:
+                expected = filter_frame(df, city, risk, zone)
+                got = filter_frame(df, city, risk, zone, index=index)
+                assert got['id'].tolist() == expected['id'].tolist()
+
+
+def test_unknown_value_selects_nothing():
+    index = FilterIndex(make_frame(), FILTER_COLUMNS)
+    assert len(index.select(citta='Atlantide')) == 0
+
+
+def test_missing_values_are_not_indexed():
+    df = pd.DataFrame({'citta': ['Roma', None, 'Roma', 'Bari']})
+    index = FilterIndex(df, ['citta'])
+    assert index.values('citta') == ['Bari', 'Roma']
+    assert index.select(citta='Roma').tolist() == [0, 2]
+
+
+def test_fingerprint_ignores_inactive_filters():
+    assert FilterIndex.fingerprint(citta=None, zona_sismica=3, risk_category='Alto') == \
+        (('risk_category', 'Alto'), ('zona_sismica', 3))
+
+
+def test_version_tracks_content():
+    df = make_frame()
+    first = build_indexed_frame(df, FILTER_COLUMNS)
+    assert build_indexed_frame(df.copy(), FILTER_COLUMNS).version == first.version
+
+    changed = df.copy()
+    changed.loc[0, 'risk_score'] += 1
+    assert build_indexed_frame(changed, FILTER_COLUMNS).version != first.version
+
+
+def test_indexed_summary_equals_masked_summary():
+    data = build_indexed_frame(make_frame(), FILTER_COLUMNS)
+    masked = compute_analytics_summary(data.df, 'Roma', None, 2)
+    indexed = compute_analytics_summary(data.df, 'Roma', None, 2, index=data.index)
+    assert indexed == masked
@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.utils.geo_grid import aggregate_grid, choose_resolution, GRID_COLUMNS
+
+
+def test_aggregate_grid_counts_means_and_worst_severity():
+    lat = np.array([45.01, 45.04, 45.09, 41.90])
+    lon = np.array([9.01, 9.02, 9.03, 12.50])
+    cells = aggregate_grid(lat, lon, risk_score=[10, 20, 30, 50], severity=[1, 4, 2, 3], cell_deg=0.1)
+
+    assert list(cells.columns) == GRID_COLUMNS
+    assert len(cells) == 2
+    milan = cells[cells['lat'] > 44].iloc[0]
+    assert milan['count'] == 3
+    assert milan['risk_score'] == 20.0
+    assert milan['severity'] == 4
+    assert np.isclose(milan['lat'], 45.05) and np.isclose(milan['lon'], 9.05)
+    assert cells['weight'].sum() == 4  # default weight: one per point
+
+
+def test_negative_coordinates_round_trip_to_cell_centres():
+    cells = aggregate_grid([-33.45], [-70.66], risk_score=[1], severity=[0], cell_deg=0.5)
+    assert np.isclose(cells['lat'].iloc[0], -33.25)
+    assert np.isclose(cells['lon'].iloc[0], -70.75)
+
+
+def test_choose_resolution_is_finest_under_cap():
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(36, 47, 20_000)
+    lon = rng.uniform(6, 19, 20_000)
+
+    assert choose_resolution(lat, lon, max_cells=200, resolutions=(1.0, 0.5, 0.1)) == 1.0
+    assert choose_resolution(lat, lon, max_cells=1_000, resolutions=(1.0, 0.5, 0.1)) == 0.5
+    # Nothing fits: coarsest resolution
+    assert choose_resolution(lat, lon, max_cells=10, resolutions=(1.0, 0.5)) == 1.0
+    assert len(aggregate_grid(lat, lon, np.ones(20_000), np.zeros(20_000), 0.5)) <= 1_000
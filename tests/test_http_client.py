@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.utils import http_client
+
+
+class _Echo(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_requests_reuse_pooled_connections_across_threads():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Echo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1"
+    http_client.reset_http_stats()
+    try:
+        def call(i):
+            return http_client.post("embeddings", url, json={"input": i}).json()["input"]
+
+        assert [call(i) for i in range(3)] == [0, 1, 2]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert sorted(executor.map(call, range(6))) == list(range(6))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stats = http_client.http_stats()
+    assert stats["endpoints"]["embeddings"]["requests"] == 9
+    assert stats["endpoints"]["embeddings"]["errors"] == 0
+    host = stats["hosts"]["127.0.0.1"]
+    assert host["requests"] >= 9 and host["connections"] <= 3
+
+
+def test_endpoint_timeouts():
+    assert http_client.timeout_for("embeddings")[1] == http_client.HTTP_TIMEOUTS["embeddings"]
+    assert http_client.timeout_for("unknown")[1] == http_client.API_TIMEOUT_DEFAULT
@@ -0,0 +1,176 @@
+"""
+Tests for the in-memory interaction timelines behind the Top 20 eligibility.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.data import db_utils
+from src.data.interaction_index import CALL, CLAIM, EMAIL, POLICY, InteractionIndex, to_epoch_seconds
+
+NOW = datetime(2026, 10, 17, 12, tzinfo=timezone.utc)
+DAY = 86400
+
+
+def _ago(days):
+    return (NOW - timedelta(days=days)).isoformat()
+
+
+def test_indicators_use_each_window():
+    index = InteractionIndex()
+    now = NOW.timestamp()
+    index.add_events(EMAIL, [1, 2], [_ago(3), _ago(8)], now=now)
+    index.add_events(CALL, [2, 3], [_ago(9), _ago(11)], now=now)
+    index.add_events(POLICY, [3], [_ago(29)], now=now)
+    index.add_events(CLAIM, [4, 4], [_ago(90), _ago(59)], now=now)
+    index.set_open_complaints([5])
+
+    result = index.indicators(np.array([1, 2, 3, 4, 5, 6]), now=now)
+    assert result['email_last_5_days'].tolist() == [True, False, False, False, False, False]
+    assert result['call_last_10_days'].tolist() == [False, True, False, False, False, False]
+    assert result['new_policy_last_30_days'].tolist() == [False, False, True, False, False, False]
+    assert result['claim_last_60_days'].tolist() == [False, False, False, True, False, False]
+    assert result['open_complaint'].tolist() == [False, False, False, False, True, False]
+
+    # Events beyond the lookback are pruned
+    assert index.event_count(CLAIM) == 1
+
+
+def test_deltas_merge_and_deduplicate():
+    index = InteractionIndex()
+    now = NOW.timestamp()
+    index.add_events(CALL, [1, 2], [_ago(20), _ago(1)], now=now)
+    index.add_events(CALL, [2, 1], [_ago(1), _ago(2)], now=now)
+    assert index.event_count(CALL) == 3
+    assert index.indicators_by_client([1, 2, 9], now=now)[1]['call_last_10_days']
+
+    index.replace_events(CALL, [9], [_ago(1)], now=now)
+    assert not index.indicators_by_client([1], now=now)[1]['call_last_10_days']
+
+
+def test_to_epoch_seconds_handles_dates_and_timestamps():
+    seconds = to_epoch_seconds(['2026-10-17', '2026-10-17T12:00:00+00:00', None, 'n/a'])
+    assert seconds.tolist() == [int(NOW.timestamp()) - 12 * 3600, int(NOW.timestamp()), -1, -1]
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+
+    def select(self, columns):
+        return self
+
+    def gte(self, col, value):
+        self.filters.append(lambda r: str(r[col]) >= value)
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(lambda r: r[col] > value)
+        return self
+
+    def eq(self, col, value):
+        self.filters.append(lambda r: r[col] == value)
+        return self
+
+    def in_(self, col, values):
+        self.filters.append(lambda r: r[col] in values)
+        return self
+
+    def order(self, col):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def range(self, start, end):
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=[r for r in self.rows if all(f(r) for f in self.filters)])
+
+
+class _Client:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return _Query(self.tables[name])
+
+
+def test_sync_loads_then_merges_created_rows(monkeypatch):
+    today = datetime.now().date()
+
+    def day(n):
+        return (today - timedelta(days=n)).isoformat()
+
+    tables = {
+        "interactions": [
+            {"id": 1, "codice_cliente": 1, "tipo_interazione": "email", "data_interazione": day(2),
+             "esito": None, "created_at": "2026-01-01T00:00:00"},
+            {"id": 2, "codice_cliente": 2, "tipo_interazione": "reclamo", "data_interazione": day(200),
+             "esito": None, "created_at": "2026-01-01T00:00:00"},
+            {"id": 3, "codice_cliente": 3, "tipo_interazione": "reclamo", "data_interazione": day(5),
+             "esito": "risolto", "created_at": "2026-01-01T00:00:00"},
+        ],
+        "polizze": [{"id": 1, "codice_cliente": 4, "data_emissione": day(10), "created_at": "2026-01-01T00:00:00"}],
+        "sinistri": [],
+    }
+    monkeypatch.setattr(db_utils, "DB_WIRE_FORMAT", "json")
+    index = InteractionIndex()
+    client = _Client(tables)
+
+    db_utils._sync_interaction_index(client, index, full=True)
+    result = index.indicators_by_client([1, 2, 3, 4])
+    assert result[1]['email_last_5_days'] and result[2]['open_complaint']
+    assert not result[3]['open_complaint'] and result[4]['new_policy_last_30_days']
+    assert index.watermarks["interactions"] == "2026-01-01T00:00:00"
+
+    tables["interactions"].append({"id": 4, "codice_cliente": 3, "tipo_interazione": "telefonata",
+                                   "data_interazione": day(0), "esito": "neutro",
+                                   "created_at": "2026-02-01T00:00:00"})
+    db_utils._sync_interaction_index(client, index, full=False)
+    assert index.indicators_by_client([3])[3]['call_last_10_days']
+    assert index.event_count(EMAIL) == 1
+
+
+def test_replace_swaps_in_a_complete_timeline():
+    index = InteractionIndex()
+    now = NOW.timestamp()
+    index.add_events(CALL, [1, 2], [_ago(1), _ago(2)], now=now)
+
+    class _Recording(dict):
+        def __setitem__(self, kind, timeline):
+            swapped.append(len(timeline.events))
+            super().__setitem__(kind, timeline)
+
+    swapped = []
+    index._timelines = _Recording(index._timelines)
+    index.replace_events(CALL, [1, 3], [_ago(1), _ago(3)], now=now)
+
+    # Readers never see an empty timeline during a full resync
+    assert swapped == [2]
+    assert index.indicators_by_client([2, 3], now=now)[3]['call_last_10_days']
+
+
+def test_failed_first_load_backs_off(monkeypatch):
+    attempts = []
+
+    def failing_sync(client, index, full):
+        attempts.append(full)
+        raise RuntimeError("timeout")
+
+    monkeypatch.setattr(db_utils, "get_supabase_client", lambda: object())
+    monkeypatch.setattr(db_utils, "_sync_interaction_index", failing_sync)
+    monkeypatch.setattr(db_utils, "_interaction_index", InteractionIndex())
+    monkeypatch.setattr(db_utils, "_interaction_index_failed_at", None)
+
+    assert db_utils.get_interaction_index() is None
+    assert db_utils.get_interaction_index() is None
+    assert attempts == [True]
+
+    monkeypatch.setattr(db_utils, "_interaction_index_failed_at", 0.0)
+    assert db_utils.get_interaction_index() is None
+    assert attempts == [True, True]
@@ -0,0 +1,68 @@
+import json
+
+from src.iris import engine as iris_engine
+from src.iris.engine import IrisEngine
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self._lines = [b": OPENROUTER PROCESSING", b""]
+        self._lines += [f"data: {json.dumps(c)}".encode("utf-8") for c in chunks] + [b"data: [DONE]"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+def _delta(finish_reason=None, **delta):
+    return {"choices": [{"delta": delta, "finish_reason": finish_reason}]}
+
+
+def test_chat_stream_runs_tools_then_streams_the_answer(monkeypatch):
+    turns = [
+        [
+            _delta(tool_calls=[{"index": 0, "id": "call_1", "type": "function",
+                                "function": {"name": "premium_calculator", "arguments": ""}}]),
+            _delta(tool_calls=[{"index": 0, "function": {"arguments": '{"risk_score": 50, '}}]),
+            _delta(tool_calls=[{"index": 0, "function": {"arguments": '"product_type": "NatCat"}'}}]),
+            _delta(finish_reason="tool_calls"),
+        ],
+        [_delta(content="Il premio "), _delta(content="è calcolato."), _delta(finish_reason="stop")],
+    ]
+    requests_sent = []
+
+    def fake_post(endpoint, url, headers, json, stream=False):
+        assert stream and json["stream"]
+        requests_sent.append(json["messages"])
+        return _FakeStream(turns[len(requests_sent) - 1])
+
+    monkeypatch.setattr(iris_engine.http_client, "post", fake_post)
+    result = {}
+    chunks = list(IrisEngine(supabase_client=None).chat_stream("Preventivo NatCat", result=result))
+
+    assert chunks == ["Il premio ", "è calcolato."]
+    assert result["success"] and result["response"] == "Il premio è calcolato."
+    assert result["tools_used"] == ["premium_calculator"]
+
+    follow_up = requests_sent[1]
+    assert follow_up[-2]["tool_calls"][0]["function"]["arguments"] == '{"risk_score": 50, "product_type": "NatCat"}'
+    assert follow_up[-1]["role"] == "tool" and follow_up[-1]["tool_call_id"] == "call_1"
+    assert json.loads(follow_up[-1]["content"])["product"] == "NatCat"
+
+
+def test_chat_stream_reports_errors_in_result(monkeypatch):
+    def fake_post(*args, **kwargs):
+        return _FakeStream([{"error": {"message": "rate limited"}}])
+
+    monkeypatch.setattr(iris_engine.http_client, "post", fake_post)
+    result = {}
+    assert list(IrisEngine(supabase_client=None).chat_stream("Ciao", result=result)) == []
+    assert not result["success"] and result["error"] == "rate limited"
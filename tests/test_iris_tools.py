@@ -0,0 +1,89 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.iris import engine as iris_engine
+from src.iris.engine import IrisEngine, reset_tool_stats, tool_stats
+
+
+def _call(call_id, name, **args):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+def test_tool_calls_run_concurrently_in_call_order(monkeypatch):
+    engine = IrisEngine(supabase_client=None)
+
+    def slow(delay):
+        def tool(client_id):
+            time.sleep(delay)
+            return {"client_id": client_id, "delay": delay}
+        return tool
+
+    monkeypatch.setitem(engine.tools, "policy_status_check", slow(0.3))
+    monkeypatch.setitem(engine.tools, "risk_assessment", slow(0.1))
+    monkeypatch.setitem(engine.tools, "doc_retriever_rag", slow(0.2))
+    reset_tool_stats()
+
+    start = time.perf_counter()
+    results = engine._run_tool_calls({"tool_calls": [
+        _call("a", "policy_status_check", client_id=1),
+        _call("b", "risk_assessment", client_id=2),
+        _call("c", "doc_retriever_rag", client_id=3),
+    ]})
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.55
+    assert [r["tool_call_id"] for r in results] == ["a", "b", "c"]
+    assert [json.loads(r["content"])["client_id"] for r in results] == [1, 2, 3]
+    stats = tool_stats()
+    assert stats["policy_status_check"]["calls"] == 1 and stats["policy_status_check"]["max_seconds"] >= 0.3
+
+
+def test_slow_tool_times_out_without_blocking_the_others(monkeypatch):
+    engine = IrisEngine(supabase_client=None)
+    monkeypatch.setitem(engine.tools, "solar_potential_calc", lambda client_id: time.sleep(1) or {})
+    monkeypatch.setitem(iris_engine.IRIS_TOOL_TIMEOUTS, "solar_potential_calc", 0.1)
+    reset_tool_stats()
+
+    results = engine._run_tool_calls({"tool_calls": [
+        _call("slow", "solar_potential_calc", client_id=1),
+        _call("fast", "premium_calculator", risk_score=10, product_type="NatCat"),
+    ]})
+
+    assert "Timeout" in json.loads(results[0]["content"])["error"]
+    assert json.loads(results[1]["content"])["product"] == "NatCat"
+    assert tool_stats()["solar_potential_calc"]["timeouts"] == 1
+
+
+def test_tool_timeout_starts_when_the_tool_runs(monkeypatch):
+    engine = IrisEngine(supabase_client=None)
+    monkeypatch.setattr(iris_engine, "_tool_pool", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setitem(engine.tools, "policy_status_check", lambda client_id: time.sleep(0.3) or {"ok": 1})
+    monkeypatch.setitem(engine.tools, "risk_assessment", lambda client_id: time.sleep(0.05) or {"ok": 2})
+    monkeypatch.setitem(iris_engine.IRIS_TOOL_TIMEOUTS, "risk_assessment", 0.2)
+
+    results = engine._run_tool_calls({"tool_calls": [
+        _call("a", "policy_status_check", client_id=1),
+        _call("b", "risk_assessment", client_id=2),   # queued 0.3 s behind "a", runs 0.05 s
+    ]})
+
+    assert [json.loads(r["content"]) for r in results] == [{"ok": 1}, {"ok": 2}]
+
+
+def test_tool_still_queued_is_cancelled(monkeypatch):
+    engine = IrisEngine(supabase_client=None)
+    monkeypatch.setattr(iris_engine, "_tool_pool", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(iris_engine, "IRIS_TOOL_QUEUE_TIMEOUT", 0.15)
+    monkeypatch.setitem(iris_engine.IRIS_TOOL_TIMEOUTS, "policy_status_check", 0.1)
+    ran = []
+    monkeypatch.setitem(engine.tools, "policy_status_check", lambda client_id: time.sleep(0.5) or {})  # hung
+    monkeypatch.setitem(engine.tools, "risk_assessment", lambda client_id: ran.append(client_id) or {})
+
+    results = engine._run_tool_calls({"tool_calls": [
+        _call("a", "policy_status_check", client_id=1),
+        _call("b", "risk_assessment", client_id=2),
+    ]})
+
+    assert all("Timeout" in json.loads(r["content"])["error"] for r in results)
+    time.sleep(0.6)
+    assert ran == []
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from src.utils import map_payload
+from src.utils.map_payload import (
+    build_map_payload,
+    record_deck_payload,
+    render_stats,
+    reset_render_stats,
+    tooltip_fields,
+)
+
+
+def _frame(n=3):
+    return pd.DataFrame({
+        'longitudine': np.linspace(9.123456789, 9.2, n),
+        'latitudine': np.linspace(45.987654321, 46.0, n),
+        'risk_score': [10.0, None, 30.0][:n],
+        'citta': ['Milano'] * n,
+        'codice_cliente': ['C1', 'C2', 'C3'][:n],
+        'nome': ['A', 'B', 'C'][:n],
+        'clv': [1.0, 2.0, 3.0][:n],
+    })
+
+
+def test_tooltip_fields_in_order_without_duplicates():
+    html = "<b>{citta}</b> {risk_score} {citta} {codice_cliente}"
+    assert tooltip_fields(html) == ['citta', 'risk_score', 'codice_cliente']
+
+
+def test_payload_keeps_only_layer_fields():
+    colors = np.array([[1, 2, 3, 4]] * 3, dtype=np.uint8)
+    payload = build_map_payload(_frame(), colors, 'risk_score', fields=['citta', 'codice_cliente', 'missing'])
+
+    assert list(payload.heat.columns) == ['lon', 'lat', 'weight']
+    assert list(payload.points.columns) == ['lon', 'lat', 'color', 'citta', 'codice_cliente']
+    assert payload.points['lon'].iloc[0] == 9.12346
+    assert payload.heat['weight'].tolist() == [10.0, 0.0, 30.0]
+    assert payload.points['color'].iloc[0] == [1, 2, 3, 4]
+
+
+def test_points_serialize_as_short_numbers_and_colour_lists():
+    payload = build_map_payload(_frame(), np.array([[1, 2, 3, 4]] * 3, dtype=np.uint8), 'risk_score')
+    deck = pdk.Deck(layers=[pdk.Layer("ScatterplotLayer", data=payload.points, get_position=['lon', 'lat'])])
+
+    first = json.loads(deck.to_json())["layers"][0]["data"][0]
+    assert first["lon"] == 9.12346 and first["color"] == [1, 2, 3, 4]
+
+
+def test_record_deck_payload_is_off_by_default():
+    reset_render_stats()
+    deck = pdk.Deck(layers=[])
+    assert record_deck_payload("points", deck, 0) is None and render_stats() == {}
+
+
+def test_record_deck_payload_counts_bytes(monkeypatch):
+    monkeypatch.setattr(map_payload, "PAYLOAD_METRICS_ENABLED", True)
+    reset_render_stats()
+    payload = build_map_payload(_frame(), np.zeros((3, 4), dtype=np.uint8), 'risk_score')
+    deck = pdk.Deck(layers=[pdk.Layer("ScatterplotLayer", data=payload.points, get_position=['lon', 'lat'])])
+
+    size = record_deck_payload("points", deck, len(payload.points))
+    stats = render_stats()["points"]
+    assert size == len(deck.to_json().encode("utf-8"))
+    assert stats["renders"] == 1 and stats["rows"] == 3 and stats["last_bytes"] == size
@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+
+from src.nbo.artifact import load_artifact, patch_artifact, read_fingerprints, read_manifest, write_artifact
+from src.nbo.engine import NBOEngine
+from src.utils.versioned_dir import current_dir
+
+WEIGHTS = {'retention': 0.5, 'redditivita': 0.3, 'propensione': 0.2}
+
+
+def _clients():
+    return [
+        {
+            'codice_cliente': code,
+            'timestamp': '2026-01-01T00:00:00Z',
+            'anagrafica': {'nome': f'Nome{code}', 'cognome': 'Rossi', 'citta': 'Città'},
+            'raccomandazioni': [
+                {
+                    'area_bisogno': 'Protezione' if j % 2 else 'Previdenza',
+                    'prodotto': f'Prodotto {j}',
+                    'componenti': {'retention_gain': 10.0 * j + code, 'redditivita': 75.0,
+                                   'propensione': 40.5, 'affinita_cluster': 50.0},
+                    'dettagli': {'delta_churn': 0.0123, 'churn_prima': 0.2, 'churn_dopo': 0.1877},
+                }
+                for j in range(code % 4)
+            ],
+            'metadata': {'clv_stimato': 1000 * code, 'prodotti_posseduti': ['Casa Serena']},
+        }
+        for code in range(1, 13)
+    ]
+
+
+def test_artifact_round_trips_records(tmp_path):
+    clients = _clients()
+    manifest = write_artifact(clients, str(tmp_path))
+    engine = load_artifact(str(tmp_path))
+
+    assert manifest['clients'] == 12 and read_manifest(str(tmp_path))['version'] == engine.version
+    assert isinstance(engine.codes, np.memmap) or isinstance(engine.codes.base, np.memmap)
+    assert list(engine.clients) == json.loads(json.dumps(clients, ensure_ascii=False))
+
+
+def test_artifact_engine_ranks_like_json_engine(tmp_path):
+    clients = _clients()
+    write_artifact(clients, str(tmp_path))
+
+    from_artifact = load_artifact(str(tmp_path)).rank(WEIGHTS)
+    from_json = NBOEngine.from_clients(clients).rank(WEIGHTS)
+    assert from_artifact.client.tolist() == from_json.client.tolist()
+    assert from_artifact.rec.tolist() == from_json.rec.tolist()
+
+
+def test_missing_or_inconsistent_artifact_is_ignored(tmp_path):
+    assert load_artifact(str(tmp_path / 'missing')) is None
+
+    write_artifact(_clients(), str(tmp_path))
+    manifest = read_manifest(str(tmp_path))
+    manifest['clients'] += 1
+    with open(f"{current_dir(str(tmp_path))}/manifest.json", 'w') as f:
+        f.write(json.dumps(manifest))
+    assert load_artifact(str(tmp_path)) is None
+
+
+def test_rewrite_swaps_the_whole_artifact(tmp_path):
+    clients = _clients()
+    write_artifact(clients[:6], str(tmp_path))
+    first = current_dir(str(tmp_path))
+    opened = load_artifact(str(tmp_path))
+
+    write_artifact(clients, str(tmp_path))
+    assert current_dir(str(tmp_path)) != first and len(load_artifact(str(tmp_path)).clients) == 12
+    # The replaced build stays intact for readers that opened it
+    assert list(opened.clients) == json.loads(json.dumps(clients[:6], ensure_ascii=False))
+
+    write_artifact(clients[:3], str(tmp_path))
+    builds = sorted(p.name for p in tmp_path.iterdir() if p.is_dir())
+    assert len(builds) == 2 and first.rsplit('/', 1)[-1] not in builds
+
+
+def test_flat_artifact_is_still_read(tmp_path):
+    clients = _clients()
+    write_artifact(clients, str(tmp_path))
+    for f in (tmp_path / current_dir(str(tmp_path))).iterdir():
+        f.rename(tmp_path / f.name)
+    (tmp_path / 'current').unlink()
+
+    assert list(load_artifact(str(tmp_path)).clients) == json.loads(json.dumps(clients, ensure_ascii=False))
+    write_artifact(clients[:2], str(tmp_path))
+    write_artifact(clients[:4], str(tmp_path))
+    assert not (tmp_path / 'manifest.json').exists() and len(load_artifact(str(tmp_path)).clients) == 4
+
+
+def test_patch_replaces_changed_clients_only(tmp_path):
+    clients = _clients()
+    write_artifact(clients, str(tmp_path), fingerprints=np.arange(12, dtype=np.uint64))
+
+    changed_client = dict(clients[4], anagrafica={'nome': 'Nuovo'}, raccomandazioni=[
+        dict(clients[2]['raccomandazioni'][0], prodotto='Prodotto nuovo', area_bisogno='Nuova area'),
+    ])
+    new_client = dict(clients[0], codice_cliente=99)
+    expected = [c for c in clients if c['codice_cliente'] != 3]  # client 3 dropped
+    expected = [changed_client if c['codice_cliente'] == 5 else c for c in expected] + [new_client]
+    codes = [c['codice_cliente'] for c in expected]
+    changed = np.isin(codes, [5, 99])
+
+    patch_artifact(str(tmp_path), codes, changed, [changed_client, new_client],
+                   fingerprints=np.arange(len(codes), dtype=np.uint64))
+    engine = load_artifact(str(tmp_path))
+
+    assert list(engine.clients) == json.loads(json.dumps(expected, ensure_ascii=False))
+    assert read_fingerprints(str(tmp_path))[0].tolist() == codes
+    assert engine.rank(WEIGHTS).client.tolist() == NBOEngine.from_clients(expected).rank(WEIGHTS).client.tolist()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from src.nbo.eligibility import EligibilityOverlay, pack_indicators, unpack_indicators
+
+
+class _Fetch:
+    """Interaction check stub: client 30 has an open complaint."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, codes):
+        self.calls.append(list(codes))
+        return {cc: {'open_complaint': cc == 30} for cc in codes}
+
+
+def test_pack_roundtrip():
+    indicators = {'email_last_5_days': False, 'call_last_10_days': True, 'new_policy_last_30_days': False,
+                  'open_complaint': True, 'claim_last_60_days': False}
+    assert pack_indicators(indicators) == 0b01010
+    assert unpack_indicators(pack_indicators(indicators)) == indicators
+
+
+def test_check_fetches_only_stale_clients():
+    overlay = EligibilityOverlay(np.array([50, 10, 30, 20, 40]))
+    fetch = _Fetch()
+
+    assert overlay.check(np.array([10, 30]), fetch).tolist() == [True, False]
+    assert overlay.check(np.array([30, 20, 10, 99]), fetch).tolist() == [False, True, True, True]
+    assert fetch.calls == [[10, 30], [20]]
+    assert overlay.indicators(30)['open_complaint']
+    assert overlay.indicators(40) == {}
+
+    # Expired checks are fetched again
+    overlay.checked_at[:] -= overlay.max_age
+    overlay.check(np.array([10]), fetch)
+    assert fetch.calls[-1] == [10]
+
+
+def test_logging_a_call_flips_one_bit():
+    overlay = EligibilityOverlay(np.array([1, 2, 3]))
+    fetch = _Fetch()
+    assert overlay.check(np.array([1, 2, 3]), fetch).all()
+
+    assert overlay.set_indicator(2, 'call_last_10_days')
+    assert not overlay.set_indicator(7, 'call_last_10_days')
+    assert overlay.check(np.array([1, 2, 3]), fetch).tolist() == [True, False, True]
+    assert overlay.indicators(2)['call_last_10_days']
+    assert len(fetch.calls) == 1
+
+
+def test_unanswered_clients_stay_unchecked():
+    overlay = EligibilityOverlay(np.array([1, 2]))
+    calls = []
+
+    def offline(codes):
+        calls.append(codes)
+        return {}
+
+    assert overlay.check(np.array([1, 2]), offline).all()
+    overlay.check(np.array([1, 2]), offline)
+    assert len(calls) == 2
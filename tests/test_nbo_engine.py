@@ -0,0 +1,104 @@
+import random
+
+import numpy as np
+
+from src.nbo.engine import NBOEngine, recommendation_score
+
+WEIGHTS = {'retention': 0.5, 'redditivita': 0.3, 'propensione': 0.2}
+
+
+def _clients(n=60, seed=0):
+    rng = random.Random(seed)
+    clients = []
+    for code in range(1, n + 1):
+        recs = [
+            {
+                'prodotto': f'P{j}',
+                'area_bisogno': 'Protezione',
+                'componenti': {
+                    'retention_gain': rng.choice([10.0, 50.0, rng.uniform(0, 100)]),
+                    'redditivita': rng.choice([63.0, 75.0, 100.0]),
+                    'propensione': round(rng.uniform(0, 100), 1),
+                },
+            }
+            for j in range(rng.randint(0, 5))
+        ]
+        clients.append({'codice_cliente': code, 'raccomandazioni': recs})
+    return clients
+
+
+def _reference_ranking(clients, weights):
+    """The original per-client Python ranking (sort, swap, global sort)."""
+    out = []
+    for ci, client in enumerate(clients):
+        recs = [(j, recommendation_score(r, weights)) for j, r in enumerate(client['raccomandazioni'])]
+        recs.sort(key=lambda x: x[1], reverse=True)
+        swap = client['codice_cliente'] % 5
+        if len(recs) > 1:
+            top = recs[0][1]
+            k = 1 if swap in (1, 3) else 2 if swap == 2 and len(recs) > 2 else 0
+            if k:
+                swapped = recs[k][0]
+                recs[k] = (recs[0][0], recs[k][1])
+                recs[0] = (swapped, top)
+        out.extend((ci, j, s) for j, s in recs)
+    out.sort(key=lambda x: x[2], reverse=True)
+    return out
+
+
+def test_rank_matches_reference_ordering():
+    clients = _clients()
+    ranking = NBOEngine.from_clients(clients).rank(WEIGHTS)
+    expected = _reference_ranking(clients, WEIGHTS)
+
+    assert ranking.client.tolist() == [e[0] for e in expected]
+    assert ranking.rec.tolist() == [e[1] for e in expected]
+    assert np.allclose(ranking.score, [e[2] for e in expected])
+
+
+def test_reweighting_changes_order():
+    engine = NBOEngine.from_clients(_clients())
+    retention_first = engine.rank({'retention': 1.0, 'redditivita': 0.0, 'propensione': 0.0})
+    propensity_first = engine.rank({'retention': 0.0, 'redditivita': 0.0, 'propensione': 1.0})
+    assert retention_first.client.tolist() != propensity_first.client.tolist()
+    assert np.all(np.diff(propensity_first.score) <= 0)
+
+
+def test_empty_inputs():
+    assert len(NBOEngine.from_clients([]).rank(WEIGHTS).client) == 0
+    ranking = NBOEngine.from_clients([{'codice_cliente': 7, 'raccomandazioni': []}]).rank(WEIGHTS)
+    assert len(ranking.score) == 0
+
+
+def _first_per_client(ranking):
+    seen, rows = set(), []
+    for c, r, s in zip(ranking.client.tolist(), ranking.rec.tolist(), ranking.score.tolist()):
+        if c not in seen:
+            seen.add(c)
+            rows.append((c, r, s))
+    return rows
+
+
+def test_top_clients_is_prefix_of_full_ranking():
+    engine = NBOEngine.from_clients(_clients(n=200, seed=3))
+    expected = _first_per_client(engine.rank(WEIGHTS))
+    top = engine.top_clients(WEIGHTS, 25)
+
+    assert list(zip(top.client.tolist(), top.rec.tolist())) == [(c, r) for c, r, _ in expected[:25]]
+    assert np.allclose(top.score, [s for _, _, s in expected[:25]])
+
+
+def test_top_clients_widens_window_when_filtered():
+    engine = NBOEngine.from_clients(_clients(n=200, seed=3))
+    batches = []
+
+    def only_even(codes):
+        batches.append(len(codes))
+        return codes % 2 == 0
+
+    top = engine.top_clients(WEIGHTS, 10, eligible=only_even)
+    expected = [c for c, _, _ in _first_per_client(engine.rank(WEIGHTS)) if engine.codes[c] % 2 == 0][:10]
+
+    assert top.client.tolist() == expected
+    assert batches[0] == 20 and len(batches) >= 1
+    assert sum(batches) < engine.n_clients  # never checks every client
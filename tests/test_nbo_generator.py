@@ -0,0 +1,104 @@
+import math
+from concurrent.futures import Future
+
+from src.nbo import generator
+from src.nbo.artifact import load_artifact, write_artifact
+from src.nbo.generator import (
+    AREA_KEYWORDS, AREAS, CHURN_MODEL_PARAMS, PRODUCTS, build_records, feature_matrix, generate_records,
+    input_fingerprints, score_portfolio,
+)
+
+TIMESTAMP = '2026-01-01T00:00:00Z'
+
+
+def _portfolio(n=11):
+    clienti = [
+        {'codice_cliente': i, 'nome': f'Nome{i}', 'cognome': 'Rossi', 'eta': 30 + i, 'cluster_nba': i % 9,
+         'reddito': None if i % 3 else 20000 + i, 'reddito_stimato': 41000, 'satisfaction_score': 60 + i}
+        for i in range(1, n + 1)
+    ]
+    prodotti = [list(PRODUCTS[:i % 4]) for i in range(1, n + 1)]
+    abitazioni = [{'citta': 'Milano', 'latitudine': 45.46} if i % 2 else None for i in range(1, n + 1)]
+    return clienti, prodotti, abitazioni
+
+
+def test_churn_matches_scalar_logit():
+    clienti, prodotti, _ = _portfolio()
+    churn = score_portfolio(feature_matrix(clienti, prodotti))['churn']
+
+    p = CHURN_MODEL_PARAMS
+    c = clienti[1]  # no direct reddito: falls back to reddito_stimato
+    logit = (p['intercept'] + p['coef_num_polizze'] * len(prodotti[1]) + p['coef_anzianita'] * 5 +
+             p['coef_satisfaction'] * c['satisfaction_score'] + p['coef_eta'] * c['eta'] +
+             p['coef_reddito'] * 41000 + p['coef_engagement'] * 50)
+    for area, coef in zip(AREAS, ('coef_protezione', 'coef_risparmio', 'coef_previdenza')):
+        if any(k in prod for prod in prodotti[1] for k in AREA_KEYWORDS[area]):
+            logit += p[coef]
+    assert math.isclose(churn[1], 1 / (1 + math.exp(-logit)), rel_tol=1e-9)
+
+
+def test_records_skip_owned_products_and_sort_by_score():
+    clienti, prodotti, abitazioni = _portfolio()
+    records = build_records(clienti, prodotti, abitazioni, timestamp=TIMESTAMP)
+
+    for record, owned in zip(records, prodotti):
+        recs = record['raccomandazioni']
+        assert len(recs) == len(PRODUCTS) - len(owned)
+        assert not {r['prodotto'] for r in recs} & set(owned)
+        totals = [sum(r['componenti'].values()) for r in recs]
+        assert all(a >= b - 0.2 for a, b in zip(totals, totals[1:]))  # components are rounded
+        assert record['metadata']['prodotti_posseduti'] == owned
+
+
+def test_parallel_generation_streams_into_artifact(tmp_path):
+    clienti, prodotti, abitazioni = _portfolio()
+    expected = build_records(clienti, prodotti, abitazioni, timestamp=TIMESTAMP)
+
+    records = generate_records(clienti, prodotti, abitazioni, chunk_size=3, workers=2)
+    manifest = write_artifact(records, str(tmp_path))
+
+    loaded = list(load_artifact(str(tmp_path)).clients)
+    assert manifest['clients'] == len(expected)
+    assert [dict(r, timestamp=TIMESTAMP) for r in loaded] == expected
+
+
+def test_parallel_generation_keeps_a_bounded_window(monkeypatch):
+    submitted = []
+
+    class _Executor:
+        def __init__(self, max_workers):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def submit(self, fn, chunk):
+            submitted.append(len(chunk[0]))
+            future = Future()
+            future.set_result(fn(chunk))
+            return future
+
+    monkeypatch.setattr(generator, "ProcessPoolExecutor", _Executor)
+    clienti, prodotti, abitazioni = _portfolio(40)
+    records = generate_records(clienti, prodotti, abitazioni, chunk_size=2, workers=2)
+
+    first = next(records)
+    assert first['codice_cliente'] == 1 and len(submitted) == 4  # 2 x workers chunks in flight
+    assert [r['codice_cliente'] for r in records] == list(range(2, 41))
+    assert len(submitted) == 20
+
+
+def test_fingerprints_change_with_client_inputs_only():
+    clienti, prodotti, abitazioni = _portfolio(4)
+    before = input_fingerprints(clienti, prodotti, abitazioni)
+
+    clienti[0] = dict(clienti[0], eta=99)
+    prodotti[1] = prodotti[1] + [PRODUCTS[-1]]
+    abitazioni[2] = {'citta': 'Roma'}
+    after = input_fingerprints(clienti, prodotti, abitazioni)
+
+    assert (before != after).tolist() == [True, True, True, False]
+    assert input_fingerprints(clienti, prodotti, abitazioni).tolist() == after.tolist()
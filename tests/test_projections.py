@@ -0,0 +1,61 @@
+"""
+Tests for the column projection registry and payload accounting.
+"""
+
+import pytest
+
+from src.data import projections
+from src.data.projections import (
+    PROJECTIONS,
+    projection,
+    projection_columns,
+    record_payload,
+    payload_stats,
+    reset_payload_stats,
+)
+
+
+def test_no_projection_reads_embeddings():
+    for table, views in PROJECTIONS.items():
+        for view, columns in views.items():
+            assert "embedding" not in columns, f"{table}.{view}"
+            assert "text_embedded" not in columns, f"{table}.{view}"
+
+
+def test_only_reference_tables_select_everything():
+    for table, views in PROJECTIONS.items():
+        for view, columns in views.items():
+            if "*" in columns:
+                assert table.startswith("ref_"), f"{table}.{view}"
+
+
+def test_iris_explorer_tables_are_registered():
+    for table in ["clienti", "abitazioni", "polizze", "sinistri", "interactions"]:
+        assert projection_columns(table, "iris")
+
+
+def test_projection_string_and_unknown_view():
+    assert projection("clienti", "kpi").startswith("codice_cliente,nome,cognome")
+    assert "citta" not in projection_columns("clienti", "kpi")
+    with pytest.raises(KeyError):
+        projection("clienti", "nope")
+
+
+def test_record_payload_accumulates_per_view(monkeypatch):
+    monkeypatch.setattr(projections, "PAYLOAD_METRICS_ENABLED", True)
+    reset_payload_stats()
+    size = record_payload("clienti", "kpi", [{"codice_cliente": 1}, {"codice_cliente": 2}])
+    record_payload("clienti", "kpi", {"codice_cliente": 3})
+    record_payload("clienti", "kpi", None)
+
+    stats = payload_stats()["clienti.kpi"]
+    assert size == len('[{"codice_cliente":1},{"codice_cliente":2}]')
+    assert stats["queries"] == 3
+    assert stats["rows"] == 3
+
+
+def test_record_payload_is_free_when_disabled(monkeypatch):
+    monkeypatch.setattr(projections, "PAYLOAD_METRICS_ENABLED", False)
+    reset_payload_stats()
+    assert record_payload("clienti", "kpi", [{"codice_cliente": 1}]) == 0
+    assert payload_stats() == {}
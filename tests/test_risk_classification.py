@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.risk_classification import (
+    classify,
+    level_codes,
+    level_counts,
+    LEVEL_MISSING,
+    MODE_COMPOSITE,
+    MODE_SEISMIC,
+    MODE_HYDRO,
+    MODE_FLOOD,
+    SEVERITY_PALETTES,
+)
+
+
+def _frame():
+    return pd.DataFrame({
+        'risk_category': ['Critico', 'Alto', 'Medio', 'Basso', 'Non valutato'],
+        'zona_sismica': [1, 2, 3, 4, np.nan],
+        'hydro_risk_p3': [0.0, 5.0, 19.9, 20.0, np.nan],
+        'flood_risk_p3': [np.nan, 9.9, 10.0, 30.0, 100.0],
+    })
+
+
+def test_level_codes_thresholds_and_missing():
+    codes = level_codes([4.9, 5.0, 19.9, 20.0, None, 'n/d'], (5.0, 20.0))
+    assert codes.dtype == np.uint8
+    assert codes.tolist() == [0, 1, 1, 2, LEVEL_MISSING, LEVEL_MISSING]
+    assert level_counts(codes, ['Basso', 'Medio', 'Alto']) == {'Basso': 1, 'Medio': 2, 'Alto': 1}
+
+
+def test_colors_match_previous_per_row_mapping():
+    result = classify(_frame())
+    green, amber, orange, red = [22, 163, 74, 180], [202, 138, 4, 180], [234, 88, 12, 200], [220, 38, 38, 200]
+
+    assert result.colors(MODE_COMPOSITE).tolist() == [red, orange, amber, green, green]
+    assert result.colors(MODE_SEISMIC).tolist() == [red, orange, amber, green, green]
+    # Missing P3 values are drawn as low risk (formerly fillna(0))
+    assert result.colors(MODE_HYDRO).tolist() == [green, amber, amber, red, green]
+    assert result.colors(MODE_FLOOD).tolist() == [green, green, amber, red, red]
+    assert result.colors(MODE_FLOOD).dtype == np.uint8
+
+
+def test_unknown_seismic_zone_is_grey_and_chart_mode_keeps_missing():
+    df = _frame().assign(zona_sismica=[1, 7, 3, 4, 2])
+    result = classify(df, missing_levels_as_low=False)
+
+    assert result.colors(MODE_SEISMIC)[1].tolist() == [200, 200, 200, 100]
+    assert result.hydro[-1] == LEVEL_MISSING
+    with pytest.raises(ValueError):
+        result.colors("Rischio Vulcanico")
+
+
+def test_severity_palettes_reproduce_mode_colors():
+    result = classify(_frame(), missing_levels_as_low=False)
+    for mode in (MODE_COMPOSITE, MODE_SEISMIC, MODE_HYDRO, MODE_FLOOD):
+        via_severity = SEVERITY_PALETTES[mode][result.severity(mode)]
+        assert (via_severity == result.colors(mode)).all()
+    # Worst composite category ranks highest
+    assert result.severity(MODE_COMPOSITE).argmax() == 0
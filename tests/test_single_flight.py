@@ -0,0 +1,151 @@
+"""
+Tests for the single-flight / stale-while-revalidate cache.
+"""
+
+import time
+import threading
+
+import pytest
+
+from src.data import single_flight
+from src.data.single_flight import SingleFlight, StaleWhileRevalidateCache, shared_cache
+
+
+def test_concurrent_callers_share_one_load():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow_load():
+        calls.append(1)
+        release.wait(2)
+        return "frame"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow_load))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["frame"] * 8
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", boom)
+    assert not flight.in_flight("k")
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_stale_value_is_served_while_refreshing():
+    cache = StaleWhileRevalidateCache(ttl=0.05)
+    versions = iter(["v1", "v2"])
+    refreshed = threading.Event()
+
+    def loader():
+        value = next(versions)
+        if value == "v2":
+            refreshed.set()
+        return value
+
+    assert cache.get("k", loader) == "v1"
+    time.sleep(0.1)
+    assert cache.get("k", loader) == "v1"   # stale, refresh kicked off
+    assert refreshed.wait(2)
+    time.sleep(0.05)
+    assert cache.get("k", loader) == "v2"
+
+
+def test_concurrent_stale_hits_start_one_refresh(monkeypatch):
+    executor = single_flight._refresh_executor
+
+    class _SlowSubmit:
+        def submit(self, *args):
+            time.sleep(0.05)  # widen the window between the check and the refresh starting
+            return executor.submit(*args)
+
+    monkeypatch.setattr(single_flight, "_refresh_executor", _SlowSubmit())
+    cache = StaleWhileRevalidateCache(ttl=0.05)
+    cache.get("k", lambda: "v1")
+    time.sleep(0.1)
+
+    refreshes = []
+    release = threading.Event()
+
+    def loader():
+        refreshes.append(1)
+        release.wait(2)
+        return "v2"
+
+    start = threading.Barrier(16)
+
+    def hit():
+        start.wait()
+        return cache.get("k", loader)
+
+    threads = [threading.Thread(target=hit) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    release.set()
+    time.sleep(0.1)
+
+    assert len(refreshes) == 1
+    assert cache.get("k", loader) == "v2"
+
+
+def test_cache_if_skips_failed_results():
+    cache = StaleWhileRevalidateCache(ttl=60, cache_if=bool)
+    results = iter(["", "ok"])
+    assert cache.get("k", lambda: next(results)) == ""
+    assert cache.get("k", lambda: next(results)) == "ok"
+
+
+def test_failures_are_cached_briefly_and_never_replace_good_values():
+    cache = StaleWhileRevalidateCache(ttl=60, cache_if=bool, failure_ttl=0.05)
+    calls = []
+
+    def loader(value):
+        def load():
+            calls.append(value)
+            return value
+        return load
+
+    assert cache.get("k", loader(None)) is None
+    assert cache.get("k", loader("ok")) is None      # failure cached briefly
+    time.sleep(0.1)
+    assert cache.get("k", loader("ok")) is None      # expired: stale failure served, refresh started
+    time.sleep(0.1)
+    assert cache.get("k", loader(None)) == "ok"
+    assert calls == [None, "ok"]
+
+    cache.ttl = 0
+    cache.get("k", loader(None))                     # failed refresh keeps the good value
+    time.sleep(0.1)
+    cache.ttl = 60
+    assert cache.get("k", loader(None)) == "ok"
+
+
+def test_decorator_keys_on_arguments_and_clears():
+    calls = []
+
+    @shared_cache(ttl=60)
+    def fetch(lite=True):
+        calls.append(lite)
+        return len(calls)
+
+    assert fetch(lite=True) == 1
+    assert fetch(lite=True) == 1
+    assert fetch(lite=False) == 2
+    fetch.clear()
+    assert fetch(lite=True) == 3
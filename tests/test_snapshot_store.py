@@ -0,0 +1,70 @@
+"""
+Tests for the local Parquet snapshot store.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from src.data.snapshot_store import SnapshotStore, merge_delta, compute_watermark
+
+pytest.importorskip("pyarrow")
+
+COLUMNS = ["id", "citta", "updated_at"]
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def test_write_and_read_roundtrip(tmp_path):
+    store = SnapshotStore(root=str(tmp_path))
+    df = _frame([(1, "Roma", "2026-01-01T10:00:00"), (2, "Milano", "2026-01-02T10:00:00")])
+
+    assert store.write("abitazioni.lite", df, COLUMNS, compute_watermark(df, "updated_at"), full_sync=True)
+
+    loaded = store.read("abitazioni.lite", COLUMNS)
+    assert loaded["id"].tolist() == [1, 2]
+    assert store.read_meta("abitazioni.lite")["watermark"] == "2026-01-02T10:00:00"
+    assert not store.needs_full_resync("abitazioni.lite")
+
+
+def test_read_rejects_different_projection(tmp_path):
+    store = SnapshotStore(root=str(tmp_path))
+    df = _frame([(1, "Roma", "2026-01-01T10:00:00")])
+    store.write("abitazioni.lite", df, COLUMNS, None, full_sync=True)
+
+    assert store.read("abitazioni.lite", ["id", "citta"]) is None
+
+
+def test_missing_snapshot_needs_full_resync(tmp_path):
+    store = SnapshotStore(root=str(tmp_path))
+    assert store.read("clienti.lite", COLUMNS) is None
+    assert store.needs_full_resync("clienti.lite")
+
+
+def test_incremental_write_keeps_full_sync_time(tmp_path):
+    store = SnapshotStore(root=str(tmp_path))
+    df = _frame([(1, "Roma", "2026-01-01T10:00:00")])
+    store.write("t", df, COLUMNS, None, full_sync=True)
+    first = store.read_meta("t")["full_synced_at"]
+
+    store.write("t", df, COLUMNS, None, full_sync=False)
+    meta = json.loads((tmp_path / "t.meta.json").read_text())
+    assert meta["full_synced_at"] == first
+
+
+def test_merge_delta_upserts_by_key():
+    base = _frame([(1, "Roma", "t1"), (2, "Milano", "t1")])
+    delta = _frame([(2, "Torino", "t2"), (3, "Napoli", "t2")])
+
+    merged = merge_delta(base, delta, "id").sort_values("id")
+    assert merged["id"].tolist() == [1, 2, 3]
+    assert merged.set_index("id").loc[2, "citta"] == "Torino"
+
+
+def test_compute_watermark_ignores_nulls():
+    df = _frame([(1, "Roma", None), (2, "Milano", "2026-01-03T00:00:00")])
+    assert compute_watermark(df, "updated_at") == "2026-01-03T00:00:00"
+    assert compute_watermark(df.iloc[0:0], "updated_at") is None
@@ -0,0 +1,139 @@
+"""
+Tests for the keyset-paginated table reader, against an in-memory fake client.
+"""
+
+import csv
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from src.data.table_reader import iter_table_pages, read_table, _top_level_columns
+
+
+class FakeQuery:
+    """Tiny subset of the postgrest query builder used by the reader."""
+
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+        self.filters = []
+        self.order_key = None
+        self.limit_n = None
+        self.offset_range = None
+        self.columns = None
+        self.as_csv = False
+
+    def select(self, columns):
+        self.log.append(("select", columns))
+        self.columns = columns
+        return self
+
+    def csv(self):
+        self.as_csv = True
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(lambda r: r[col] > value)
+        return self
+
+    def gte(self, col, value):
+        self.filters.append(lambda r: r[col] >= value)
+        return self
+
+    def order(self, col):
+        self.order_key = col
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset_range = (start, end)
+        return self
+
+    def execute(self):
+        rows = [r for r in self.rows if all(f(r) for f in self.filters)]
+        if self.order_key:
+            rows = sorted(rows, key=lambda r: r[self.order_key])
+        if self.offset_range:
+            rows = rows[self.offset_range[0]:self.offset_range[1] + 1]
+        if self.limit_n is not None:
+            rows = rows[:self.limit_n]
+        self.log.append(("execute", len(rows), "csv" if self.as_csv else "json"))
+        if self.as_csv:
+            fields = self.columns.split(",")
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+            return SimpleNamespace(data=buffer.getvalue().rstrip("\n"))
+        return SimpleNamespace(data=rows)
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.log = []
+
+    def table(self, name):
+        return FakeQuery(self.rows, self.log)
+
+
+ROWS = [{"id": i, "updated_at": f"2026-01-{i % 28 + 1:02d}"} for i in range(10, 0, -1)]
+
+
+def test_pages_follow_primary_key():
+    client = FakeClient(ROWS)
+    pages = list(iter_table_pages(client, "t", "id,updated_at", page_size=4))
+
+    assert [len(p) for p in pages] == [4, 4, 2]
+    assert [r["id"] for p in pages for r in p] == list(range(1, 11))
+
+
+def test_key_column_is_added_to_projection():
+    client = FakeClient(ROWS)
+    list(iter_table_pages(client, "t", "updated_at", page_size=20))
+    assert ("select", "updated_at,id") in client.log
+
+
+def test_where_filter_and_frame_concat():
+    client = FakeClient(ROWS)
+    df = read_table(client, "t", "id,updated_at", page_size=3, where=lambda q: q.gte("id", 5))
+
+    assert df["id"].tolist() == [5, 6, 7, 8, 9, 10]
+
+
+def test_offset_fallback_without_key():
+    client = FakeClient(ROWS)
+    df = read_table(client, "t", "id,updated_at", key=None, page_size=4)
+    assert len(df) == 10
+
+
+def test_empty_table_returns_empty_frame():
+    assert read_table(FakeClient([]), "t").empty
+
+
+def test_top_level_columns_ignores_embedded_commas():
+    assert _top_level_columns("id,citta,clienti(nome,cognome)") == ["id", "citta", "clienti(nome,cognome)"]
+
+
+def test_csv_wire_format_matches_json():
+    json_df = read_table(FakeClient(ROWS), "t", "id,updated_at", page_size=4)
+    client = FakeClient(ROWS)
+    csv_df = read_table(client, "t", "id,updated_at", page_size=4, wire_format="csv")
+
+    assert csv_df.equals(json_df)
+    assert all(entry[2] == "csv" for entry in client.log if entry[0] == "execute")
+
+
+def test_csv_falls_back_to_json_for_embedded_selects():
+    client = FakeClient(ROWS)
+    read_table(client, "t", "id,clienti(nome)", page_size=20, wire_format="csv")
+    assert all(entry[2] == "json" for entry in client.log if entry[0] == "execute")
+
+
+def test_unknown_wire_format_is_rejected():
+    with pytest.raises(ValueError):
+        read_table(FakeClient(ROWS), "t", wire_format="arrow")
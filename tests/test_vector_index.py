@@ -0,0 +1,191 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.iris import engine as iris_engine
+from src.iris import vector_index
+from src.iris.engine import IrisEngine
+from src.iris.vector_index import get_vector_index, load_vector_index, write_vector_index
+from src.utils.versioned_dir import current_dir
+
+MODEL = "openai/text-embedding-3-small"
+
+
+def _rows(n=600, dim=32, clients=40, seed=7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    rows = [
+        {"id": i, "codice_cliente": int(rng.integers(1, clients + 1)), "tipo_interazione": "Telefonata",
+         "data_interazione": "2025-01-01", "esito": "Positivo", "note": f"nota {i}",
+         "created_at": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}",
+         "embedding": "[" + ",".join(f"{x:.6f}" for x in v) + "]"}
+        for i, v in enumerate(vectors)
+    ]
+    rows.append({"id": n, "codice_cliente": 1, "embedding": None})  # not embedded yet
+    return rows, vectors
+
+
+def _cosine(vectors, query):
+    return vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+
+def test_client_search_matches_exact_cosine_ranking(tmp_path):
+    rows, vectors = _rows()
+    manifest = write_vector_index(rows, str(tmp_path), MODEL)
+    index = load_vector_index(str(tmp_path))
+    assert manifest["rows"] == len(vectors) and index.model == MODEL
+
+    query = vectors[5] + 0.5 * vectors[9]
+    client = rows[5]["codice_cliente"]
+    mine = [r["id"] for r in rows[:-1] if r["codice_cliente"] == client]
+    exact = sorted(mine, key=lambda i: -_cosine(vectors[[i]], query)[0])[:3]
+
+    results = index.search(query, client_id=client, count=3)
+    assert [r["id"] for r in results] == exact
+    assert results[0]["note"] == "nota 5" and abs(results[0]["similarity"] - _cosine(vectors[[5]], query)[0]) < 0.01
+    assert all(r["similarity"] > 0.99 for r in index.search(query, client_id=client, threshold=0.99))
+    assert index.search(query, client_id=999) == [] and not index.has_client(999)
+
+
+def test_portfolio_search_with_ivf(tmp_path):
+    rows, vectors = _rows(seed=3)
+    manifest = write_vector_index(rows, str(tmp_path), MODEL, dtype="float16", nlist=None)
+    index = load_vector_index(str(tmp_path))
+    assert manifest["nlist"] == int(np.sqrt(len(vectors))) and index.has_ivf
+
+    for target in (0, 123, 599):
+        assert index.search(vectors[target], count=1)[0]["id"] == target
+    exact = np.argsort(-_cosine(vectors, vectors[42]), kind="stable")[:5].tolist()
+    scanned = [r["id"] for r in index.search(vectors[42], count=5, nprobe=manifest["nlist"])]
+    assert scanned == exact
+
+
+def test_missing_index_and_rebuilds(tmp_path, monkeypatch):
+    assert load_vector_index(str(tmp_path / "missing")) is None
+
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_CHECK_SECONDS", 0)
+    rows, _ = _rows(n=50)
+    write_vector_index(rows[:20], str(tmp_path), MODEL)
+    first = get_vector_index(str(tmp_path))
+    assert get_vector_index(str(tmp_path)) is first and len(first) == 20
+
+    write_vector_index(rows, str(tmp_path), MODEL)
+    assert len(get_vector_index(str(tmp_path))) == 50
+
+
+def test_rebuild_swaps_the_whole_index(tmp_path):
+    rows, vectors = _rows(n=80)
+    write_vector_index(rows[:30], str(tmp_path), MODEL, nlist=None)
+    first, opened = current_dir(str(tmp_path)), load_vector_index(str(tmp_path))
+
+    write_vector_index(rows, str(tmp_path), MODEL)
+    index = load_vector_index(str(tmp_path))
+    assert current_dir(str(tmp_path)) != first and len(index) == 80 and not index.has_ivf
+    # The replaced build stays intact for readers that opened it
+    assert len(opened) == 30 and opened.has_ivf and opened.search(vectors[3], count=1)[0]["id"] == 3
+
+
+class _Supabase:
+    """Answers the vector_delta query with `newer` rows and records RPC calls."""
+
+    def __init__(self, newer=(), release=None):
+        self.newer = [{"id": 1000 + i, "codice_cliente": cc} for i, cc in enumerate(newer)]
+        self.rpc_calls = []
+        self.delta_filters = []
+        self.release = release  # optional Event the delta query waits for
+
+    def table(self, name):
+        supabase = self
+
+        class _Query:
+            not_ = property(lambda self: self)
+
+            def select(self, columns):
+                return self
+
+            def gt(self, col, value):
+                supabase.delta_filters.append((col, value))
+                return self
+
+            def is_(self, col, value):
+                return self
+
+            def limit(self, n):
+                return self
+
+            def execute(self):
+                if supabase.release is not None:
+                    supabase.release.wait(5)
+                return SimpleNamespace(data=supabase.newer)
+
+        return _Query()
+
+    def rpc(self, name, params):
+        self.rpc_calls.append(params["filter_client_id"])
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[{"id": -1, "similarity": 0.5}]))
+
+
+def _rag(tmp_path, monkeypatch, supabase, built_at=None):
+    rows, vectors = _rows(n=100)
+    write_vector_index(rows, str(tmp_path), MODEL)
+    index = load_vector_index(str(tmp_path))
+    if built_at is not None:
+        index.built_at = built_at
+    monkeypatch.setattr(iris_engine, "get_vector_index", lambda: index)
+    monkeypatch.setattr(iris_engine, "_vector_delta", {"version": None, "checked_at": 0.0, "clients": None})
+
+    engine = IrisEngine(supabase_client=supabase)
+    monkeypatch.setattr(engine, "_embed_query", lambda text: vectors[10].tolist())
+    monkeypatch.setattr(iris_engine._embedding_cache, "get_or_compute",
+                        lambda model, query, compute: np.asarray(compute(query), dtype=np.float32))
+    client = rows[10]["codice_cliente"]
+    return engine.tool_rag_retriever(client, "reclami"), client, index
+
+
+def test_rag_tool_uses_local_index_before_the_rpc(tmp_path, monkeypatch):
+    supabase = _Supabase(newer=[999])
+    result, client, index = _rag(tmp_path, monkeypatch, supabase)
+
+    assert result["search_type"] == "vector" and result["documents"][0]["id"] == 10
+    assert supabase.rpc_calls == []
+    assert supabase.delta_filters == [("created_at", index.watermark)]
+
+
+def test_rag_tool_uses_the_rpc_for_clients_with_newer_interactions(tmp_path, monkeypatch):
+    rows, _ = _rows(n=100)
+    supabase = _Supabase(newer=[rows[10]["codice_cliente"]])
+    result, client, _ = _rag(tmp_path, monkeypatch, supabase)
+
+    assert supabase.rpc_calls == [client] and result["documents"][0]["id"] == -1
+
+
+def test_rag_tool_ignores_an_outdated_index(tmp_path, monkeypatch):
+    supabase = _Supabase()
+    result, client, _ = _rag(tmp_path, monkeypatch, supabase,
+                             built_at=time.time() - iris_engine.VECTOR_INDEX_MAX_AGE_SECONDS - 1)
+
+    assert supabase.rpc_calls == [client] and supabase.delta_filters == []
+
+
+def test_delta_check_runs_once_without_blocking_other_sessions(tmp_path, monkeypatch):
+    rows, _ = _rows(n=100)
+    write_vector_index(rows, str(tmp_path), MODEL)
+    index = load_vector_index(str(tmp_path))
+    monkeypatch.setattr(iris_engine, "_vector_delta", {"version": None, "checked_at": 0.0, "clients": None})
+    supabase = _Supabase(newer=[7], release=threading.Event())
+    engine = IrisEngine(supabase_client=supabase)
+
+    slow = threading.Thread(target=engine._clients_newer_than, args=(index,))
+    slow.start()
+    while not supabase.delta_filters:
+        time.sleep(0.01)
+
+    # The query is in flight: other callers fall back to the RPC at once
+    start = time.time()
+    assert engine._clients_newer_than(index) is None and time.time() - start < 1
+    supabase.release.set()
+    slow.join()
+
+    assert engine._clients_newer_than(index) == {7} and len(supabase.delta_filters) == 1